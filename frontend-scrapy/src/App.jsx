@@ -12,15 +12,18 @@ function App() {
   const [cargando, setCargando] = useState(true);
   const [query, setQuery] = useState(''); // Para guardar el nombre del producto
   const [maxProducts, setMaxProducts] = useState(50); // Valor por defecto
+  const [siguiente, setSiguiente] = useState(null); // Cursor de la siguiente página
+  const [forzar, setForzar] = useState(false); // Crawlear aunque haya resultados recientes
 
   // --- FUNCIONES ---
 
-  // Obtiene los productos desde el API
+  // Obtiene la primera página de productos desde el API
   const fetchProductos = async () => {
     setCargando(true);
     try {
-      const response = await axios.get(`${API_URL}/api/productos`);
-      setProductos(response.data);
+      const response = await axios.get(`${API_URL}/api/productos`, { params: { limite: 50 } });
+      setProductos(response.data.productos);
+      setSiguiente(response.data.siguiente);
     } catch (error) {
       console.error("Error al cargar los productos:", error);
       setMensaje("Error al cargar los productos. ¿Está el API corriendo?");
@@ -28,6 +31,56 @@ function App() {
     setCargando(false);
   };
 
+  // Agrega la siguiente página usando el cursor que devolvió el API
+  const fetchMasProductos = async () => {
+    if (!siguiente) return;
+    try {
+      const response = await axios.get(`${API_URL}/api/productos`, { params: { limite: 50, cursor: siguiente } });
+      setProductos(prev => [...prev, ...response.data.productos]);
+      setSiguiente(response.data.siguiente);
+    } catch (error) {
+      console.error("Error al cargar más productos:", error);
+      setMensaje("Error al cargar más productos.");
+    }
+  };
+
+  // Sigue el avance de un job por Server-Sent Events: contadores en el mensaje
+  // y los productos nuevos se agregan arriba de la tabla sin volver a pedirla
+  const seguirTrabajo = (jobId, nombreSpider) => {
+    const eventos = new EventSource(`${API_URL}/api/trabajos/${jobId}/eventos`);
+
+    eventos.addEventListener('progreso', (e) => {
+      const p = JSON.parse(e.data);
+      setMensaje(`${nombreSpider}: ${p.items} productos, ${p.paginas} páginas, ${p.descartados} descartados, ${p.errores} errores...`);
+    });
+
+    eventos.addEventListener('productos', (e) => {
+      const { productos: nuevos } = JSON.parse(e.data);
+      setProductos(prev => {
+        const vistos = new Set(nuevos.map(p => p.Clave));
+        return [...nuevos, ...prev.filter(p => !vistos.has(p.Clave))];
+      });
+    });
+
+    eventos.addEventListener('estado', (e) => {
+      const job = JSON.parse(e.data);
+      if (job.estado === 'terminado') {
+        setMensaje(`El spider ${nombreSpider} terminó: ${job.items} productos.`);
+        eventos.close();
+      } else if (job.estado === 'fallido' || job.estado === 'cancelado') {
+        setMensaje(`El crawl del spider ${nombreSpider} quedó ${job.estado}.`);
+        eventos.close();
+      }
+    });
+
+    eventos.onerror = () => {
+      // EventSource reconecta solo; si el job ya no existe, dejamos de escuchar
+      if (eventos.readyState === EventSource.CLOSED) {
+        console.error("Se perdió la conexión de eventos del job", jobId);
+      }
+    };
+  };
+
   // Envía la orden de iniciar un spider
   const handleIniciarSpider = async (nombreSpider) => {
     if (!query.trim()) {
@@ -40,15 +93,20 @@ function App() {
       const response = await axios.post(`${API_URL}/api/iniciar-spider`, { 
         spider: nombreSpider,
         query: query,
-        max_products: maxProducts
+        max_products: maxProducts,
+        forzar: forzar
       });
       setMensaje(response.data.mensaje);
 
-      // Después de un tiempo, actualiza la tabla automáticamente
-      setTimeout(() => {
-        setMensaje('Actualizando lista de productos...');
-        fetchProductos();
-      }, 30000); // Aumentado a 30 segundos para dar más tiempo al spider
+      // La búsqueda se hizo hace poco: el API ya devolvió esos resultados
+      if (response.data.fresco) {
+        setProductos(response.data.productos);
+        setSiguiente(null);
+        return;
+      }
+
+      // El avance y los productos nuevos llegan por SSE
+      seguirTrabajo(response.data.job.id, nombreSpider);
 
     } catch (error) {
       console.error("Error al iniciar el spider:", error);
@@ -92,6 +150,17 @@ function App() {
               min="1"
             />
           </div>
+          <div className="form-group">
+            <label htmlFor="forzar">
+              <input
+                type="checkbox"
+                id="forzar"
+                checked={forzar}
+                onChange={(e) => setForzar(e.target.checked)}
+              />
+              Forzar actualización (ignorar resultados recientes)
+            </label>
+          </div>
 
           <div className="botones-spider">
             <button onClick={() => handleIniciarSpider('heb')}>Buscar en HEB</button>
@@ -119,7 +188,7 @@ function App() {
                 </thead>
                 <tbody>
                   {productos.map(producto => (
-                    <tr key={producto.Id}>
+                    <tr key={producto.Id ?? producto.Clave}>
                       <td>
                         <img src={producto.UrlImagen} alt={producto.Titulo} className="producto-imagen" />
                       </td>
@@ -132,6 +201,9 @@ function App() {
                 </tbody>
               </table>
             )}
+            {!cargando && siguiente && (
+              <button onClick={fetchMasProductos} className="btn-refrescar">Cargar más</button>
+            )}
         </div>
       </main>
     </div>
@@ -1,115 +1,786 @@
-# --- AÑADE ESTAS DOS LÍNEAS AL INICIO DEL ARCHIVO ---
-import asyncio
-asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-# ----
-
-
 # 1. Importar las librerías necesarias
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
-import pyodbc
-import subprocess 
 import os 
+import argparse
+import base64
+import csv
+import io
+import json
+import re
+import zlib
+from datetime import datetime
+from decimal import Decimal
+from functools import wraps
+
+from rivalwatch.asgi import WSGIApp, serve
+from rivalwatch.cache import ResponseCache
+from rivalwatch.crawls import last_crawl
+from rivalwatch.db import get_pool
+from rivalwatch.jobs import FINALES, DaemonBackend, DockerBackend, JobQueue
+from rivalwatch.matching import normalize_title, store_of
 
 # 2. Configuración inicial de Flask
 app = Flask(__name__)
 
 CORS(app) 
 
-# 3. Función para conectar a la Base de Datos
+# 3. Pool de conexiones a la Base de Datos (compartido por todos los endpoints)
+
+DB_CONNECTION_STRING = (
+    'DRIVER={ODBC Driver 17 for SQL Server};'
+    'SERVER=localhost;'
+    'DATABASE=BASE_SCRAPY;'
+    'UID=sa;'
+    'PWD=prointernet;'
+)
+
+db_pool = get_pool(
+    DB_CONNECTION_STRING,
+    size=int(os.environ.get("RIVALWATCH_DB_POOL_SIZE", 5)),
+    timeout=float(os.environ.get("RIVALWATCH_DB_POOL_TIMEOUT", 30)),
+    recycle=float(os.environ.get("RIVALWATCH_DB_POOL_RECYCLE", 1800)),
+)
+
+# 4. Caché de respuestas: se invalida cuando un crawl termina de escribir
+# (POST /api/cache/invalidar); el TTL es solo una red de seguridad
+
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("RIVALWATCH_CACHE_MAX_ENTRIES", 256)),
+    ttl=float(os.environ.get("RIVALWATCH_CACHE_TTL", 300)),
+)
+
+
+def cacheado(vista):
+    """Sirve la respuesta desde la caché (clave: ruta + query string) con ETag.
 
-def get_db_connection():
-   
-    connection = pyodbc.connect(
-        'DRIVER={ODBC Driver 17 for SQL Server};'
-        'SERVER=localhost;'                 
-        'DATABASE=BASE_SCRAPY;'         
-        'UID=sa;'                    
-        'PWD=prointernet;'              
-    )
-    return connection
+    Si el cliente manda ``If-None-Match`` con el ETag vigente se responde 304
+    sin cuerpo. Solo se guardan respuestas 200.
+    """
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        clave = (request.path, tuple(sorted(request.args.items(multi=True))))
+        encontrado = response_cache.get(clave)
+        if encontrado is None:
+            generacion = response_cache.generation
+            respuesta = app.make_response(vista(*args, **kwargs))
+            if respuesta.status_code != 200:
+                return respuesta
+            etag = response_cache.put(clave, respuesta.get_data(), generacion)
+            respuesta.headers["X-Cache"] = "MISS"
+        else:
+            cuerpo, etag = encontrado
+            respuesta = app.response_class(cuerpo, mimetype="application/json")
+            respuesta.headers["X-Cache"] = "HIT"
+        respuesta.set_etag(etag)
+        # El navegador puede guardar la respuesta pero debe revalidarla siempre
+        respuesta.headers["Cache-Control"] = "no-cache"
+        return respuesta.make_conditional(request)
+    return envoltura
 
 
 
 # --- ENDPOINT PARA OBTENER LOS PRODUCTOS DE LA BASE DE DATOS ---
+
+# Campo de la respuesta -> (columna SQL, conversión). "Id" y "FechaScraping"
+# siempre se leen porque forman el cursor de paginación.
+CAMPOS_PRODUCTO = {
+    "Id": ("a.ID_PRODUCTO", None),
+    "Titulo": ("p.TITULO", None),
+    "Precio": ("a.PRECIO", None),
+    "UrlImagen": ("p.URL_IMG", None),
+    "Tienda": ("a.TIENDA", None),
+    "FechaScraping": ("a.ULTIMA_VEZ", lambda v: v.isoformat()), # Convertir fecha a texto
+    # Misma clave que traen los productos nuevos por SSE (/api/trabajos/<id>/eventos)
+    "Clave": ("p.TIENDA + ':' + p.CLAVE", None),
+}
+LIMITE_DEFAULT = 50
+LIMITE_MAXIMO = 500
+
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+def _parse_fecha(valor, nombre):
+    try:
+        return datetime.fromisoformat(valor)
+    except ValueError:
+        raise ParametroInvalido(f"'{nombre}' debe ser una fecha ISO (p.ej. 2025-09-01 o 2025-09-01T10:30:00)")
+
+
+def _parse_numero(valor, nombre):
+    try:
+        return float(valor)
+    except ValueError:
+        raise ParametroInvalido(f"'{nombre}' debe ser un número")
+
+
+def _encode_cursor(id_producto):
+    return base64.urlsafe_b64encode(str(id_producto).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor):
+    try:
+        # Los cursores de antes traían "fecha|id": solo cuenta el id
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        return int(raw.split("|")[-1])
+    except Exception:
+        raise ParametroInvalido("'cursor' inválido")
+
+
+def filtros_productos(args, tienda="a.TIENDA", fecha="a.ULTIMA_VEZ", precio="a.PRECIO"):
+    """Traduce los filtros de la query string a condiciones WHERE con parámetros."""
+    condiciones, params = [], []
+
+    tiendas = [t.strip() for t in args.get("tienda", "").split(",") if t.strip()]
+    if tiendas:
+        condiciones.append(f"{tienda} IN ({', '.join('?' for _ in tiendas)})")
+        params.extend(tiendas)
+    if args.get("desde"):
+        condiciones.append(f"{fecha} >= ?")
+        params.append(_parse_fecha(args["desde"], "desde"))
+    if args.get("hasta"):
+        condiciones.append(f"{fecha} < ?")
+        params.append(_parse_fecha(args["hasta"], "hasta"))
+    if args.get("precio_min"):
+        condiciones.append(f"{precio} >= ?")
+        params.append(_parse_numero(args["precio_min"], "precio_min"))
+    if args.get("precio_max"):
+        condiciones.append(f"{precio} <= ?")
+        params.append(_parse_numero(args["precio_max"], "precio_max"))
+    # Texto: todas las palabras deben aparecer en el título
+    for palabra in args.get("q", "").split():
+        condiciones.append("p.TITULO LIKE ?")
+        escapada = palabra.replace("[", "[[]").replace("%", "[%]").replace("_", "[_]")
+        params.append(f"%{escapada}%")
+    return condiciones, params
+
+
+def _campos_pedidos(args):
+    pedidos = [c.strip() for c in args.get("campos", "").split(",") if c.strip()]
+    desconocidos = [c for c in pedidos if c not in CAMPOS_PRODUCTO]
+    if desconocidos:
+        raise ParametroInvalido(f"Campos desconocidos: {', '.join(desconocidos)}")
+    return pedidos or list(CAMPOS_PRODUCTO)
+
+
+def _parse_limite(args):
+    try:
+        limite = int(args.get("limite", LIMITE_DEFAULT))
+    except ValueError:
+        raise ParametroInvalido("'limite' debe ser un entero")
+    return max(1, min(limite, LIMITE_MAXIMO))
+
+
+def _fila_a_producto(row, campos):
+    producto = {}
+    for campo in campos:
+        valor = getattr(row, campo)
+        convertir = CAMPOS_PRODUCTO[campo][1]
+        producto[campo] = convertir(valor) if convertir and valor is not None else valor
+    return producto
+
+
 @app.route('/api/productos', methods=['GET'])
+@cacheado
 def get_productos():
+    """Una página de productos (último precio), en orden de alta: primero los que se
+    vieron por primera vez más recientemente (Id descendente), no los crawleados más
+    recientemente.
+
+    Paginación por keyset sobre Id, que no cambia: un producto que se vuelve a
+    crawlear mientras se pagina no se salta ni se repite (con FechaScraping
+    brincaba al principio de la lista). La respuesta trae ``siguiente``, que se
+    manda como ``cursor`` para pedir la página que sigue.
+    Filtros: tienda (lista separada por comas), desde/hasta, precio_min/precio_max,
+    q (palabras del título). ``campos`` limita las columnas devueltas.
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        limite = _parse_limite(request.args)
+        campos = _campos_pedidos(request.args)
+        condiciones, params = filtros_productos(request.args)
+        if request.args.get("cursor"):
+            condiciones.append("a.ID_PRODUCTO < ?")
+            params.append(_decode_cursor(request.args["cursor"]))
+    except ParametroInvalido as e:
+        return jsonify({"error": str(e)}), 400
+
+    leer = list(dict.fromkeys(["Id", *campos]))
+    columnas = ", ".join(f"{CAMPOS_PRODUCTO[c][0]} AS {c}" for c in leer)
+    # El JOIN con la dimensión solo hace falta si se piden o filtran columnas de ahí
+    necesita_producto = any(CAMPOS_PRODUCTO[c][0].startswith("p.") for c in leer) or request.args.get("q")
+    join = "JOIN PRODUCTO_T p ON p.ID_PRODUCTO = a.ID_PRODUCTO" if necesita_producto else ""
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+
+    # Pedimos una fila de más para saber si hay otra página; el índice clustered
+    # (ID_PRODUCTO) o IX_PRECIO_ACTUAL_TIENDA_ID (migración 0007) con tienda
+    # resuelven el ORDER BY sin ordenar toda la tabla
+    sql = f"""
+        SELECT TOP ({limite + 1}) {columnas}
+        FROM PRECIO_ACTUAL_T a
+        {join}
+        {where}
+        ORDER BY a.ID_PRODUCTO DESC
+    """
 
-        # Query SQL usando los nombres de tu tabla y columnas
-        cursor.execute("""
-            SELECT 
-                ID_PROD, 
-                TITULOS_PROD, 
-                PRECIO_PROD, 
-                URL_IMG_PROD, 
-                TIENDA_PROD, 
-                FECHA_SCRAPING_PROD 
-            FROM PRODUCTOS_T 
-            ORDER BY FECHA_SCRAPING_PROD DESC
-        """)
-        
-        # Convertimos los resultados a una lista de diccionarios para enviarlos como JSON
-        productos = []
-        for row in cursor.fetchall():
-            productos.append({
-                "Id": row.ID_PROD,
-                "Titulo": row.TITULOS_PROD,
-                "Precio": row.PRECIO_PROD,
-                "UrlImagen": row.URL_IMG_PROD,
-                "Tienda": row.TIENDA_PROD,
-                "FechaScraping": row.FECHA_SCRAPING_PROD.isoformat() # Convertir fecha a texto
-            })
-            
-        conn.close()
-        return jsonify(productos)
+    try:
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            cursor.close()
+        # La conexión vuelve al pool al salir del bloque, no se cierra
     except Exception as e:
         # Si algo sale mal, devolvemos un error claro
         return jsonify({"error": f"Error al conectar o consultar la base de datos: {str(e)}"}), 500
 
+    siguiente = None
+    if len(rows) > limite:
+        rows = rows[:limite]
+        siguiente = _encode_cursor(rows[-1].Id)
+
+    productos = [_fila_a_producto(row, campos) for row in rows]
+    return jsonify({"productos": productos, "siguiente": siguiente})
+
+
+# --- HISTORIAL DE PRECIOS (ROLLUPS DIARIOS Y SEMANALES) ---
+
+# granularidad -> (tabla de rollup, columna del bucket); ver migración 0004
+ROLLUPS = {
+    "dia": ("PRECIO_DIA_T", "DIA"),
+    "semana": ("PRECIO_SEMANA_T", "SEMANA"),
+}
+PUNTOS_DEFAULT = 200
+PUNTOS_MAXIMO = 2000
+PRODUCTOS_MAXIMO = 50
+
+
+def reducir_serie(buckets, puntos):
+    """Junta buckets consecutivos hasta dejar a lo más ``puntos`` por serie.
+
+    Cada bucket es ``(fecha, minimo, maximo, suma, observaciones, ultimo)``;
+    los grupos conservan mínimo y máximo reales y el promedio ponderado.
+    """
+    tamano = max(1, -(-len(buckets) // puntos))  # división hacia arriba
+    serie = []
+    for inicio in range(0, len(buckets), tamano):
+        grupo = buckets[inicio:inicio + tamano]
+        observaciones = sum(b[4] for b in grupo)
+        serie.append({
+            "Fecha": grupo[0][0].isoformat(),
+            "Min": float(min(b[1] for b in grupo)),
+            "Max": float(max(b[2] for b in grupo)),
+            "Promedio": round(float(sum(b[3] for b in grupo)) / observaciones, 2) if observaciones else None,
+            "Ultimo": float(grupo[-1][5]),
+            "Observaciones": observaciones,
+        })
+    return serie
+
+
+@app.route('/api/historial', methods=['GET'])
+@cacheado
+def get_historial():
+    """Tendencia de precio por producto: mínimo, máximo, promedio y último por día o semana.
+
+    Parámetros: ``productos`` (ids separados por comas), ``granularidad``
+    (dia|semana), ``desde``/``hasta`` y ``puntos`` (máximo de puntos por serie;
+    si el rango trae más buckets se agrupan en el servidor).
+    """
+    try:
+        try:
+            ids = [int(i) for i in request.args.get("productos", "").split(",") if i.strip()]
+        except ValueError:
+            raise ParametroInvalido("'productos' debe ser una lista de ids separados por comas")
+        if not ids:
+            raise ParametroInvalido("'productos' es requerido")
+        if len(ids) > PRODUCTOS_MAXIMO:
+            raise ParametroInvalido(f"A lo más {PRODUCTOS_MAXIMO} productos por consulta")
+        granularidad = request.args.get("granularidad", "dia")
+        if granularidad not in ROLLUPS:
+            raise ParametroInvalido("'granularidad' debe ser dia o semana")
+        try:
+            puntos = int(request.args.get("puntos", PUNTOS_DEFAULT))
+        except ValueError:
+            raise ParametroInvalido("'puntos' debe ser un entero")
+        puntos = max(1, min(puntos, PUNTOS_MAXIMO))
+
+        tabla, columna = ROLLUPS[granularidad]
+        condiciones = [f"r.ID_PRODUCTO IN ({', '.join('?' for _ in ids)})"]
+        params = list(ids)
+        if request.args.get("desde"):
+            condiciones.append(f"r.{columna} >= ?")
+            params.append(_parse_fecha(request.args["desde"], "desde").date())
+        if request.args.get("hasta"):
+            condiciones.append(f"r.{columna} < ?")
+            params.append(_parse_fecha(request.args["hasta"], "hasta").date())
+    except ParametroInvalido as e:
+        return jsonify({"error": str(e)}), 400
+
+    # El PK (ID_PRODUCTO, bucket) de la tabla de rollup resuelve filtro y orden
+    sql = f"""
+        SELECT r.ID_PRODUCTO, r.{columna}, r.PRECIO_MIN, r.PRECIO_MAX, r.SUMA, r.OBSERVACIONES, r.PRECIO_ULTIMO
+        FROM {tabla} r
+        WHERE {' AND '.join(condiciones)}
+        ORDER BY r.ID_PRODUCTO, r.{columna}
+    """
+    try:
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT ID_PRODUCTO, TIENDA, TITULO FROM PRODUCTO_T WHERE ID_PRODUCTO IN ({', '.join('?' for _ in ids)})",
+                ids,
+            )
+            productos = {row.ID_PRODUCTO: row for row in cursor.fetchall()}
+            cursor.execute(sql, params)
+            buckets = {}
+            for row in cursor.fetchall():
+                buckets.setdefault(row[0], []).append(tuple(row[1:]))
+            cursor.close()
+    except Exception as e:
+        return jsonify({"error": f"Error al conectar o consultar la base de datos: {str(e)}"}), 500
+
+    series = []
+    for id_producto in ids:
+        producto = productos.get(id_producto)
+        if producto is None:
+            continue
+        series.append({
+            "Id": id_producto,
+            "Tienda": producto.TIENDA,
+            "Titulo": producto.TITULO,
+            "puntos": reducir_serie(buckets.get(id_producto, []), puntos),
+        })
+    return jsonify({"granularidad": granularidad, "series": series})
+
+
+# --- GRUPOS: EL MISMO PRODUCTO EN VARIAS TIENDAS ---
+
+# Los grupos los arma rivalwatch.matching al cerrar cada crawl (ver migración 0005)
+GRUPOS_QUERY = """
+    SELECT g.ID_GRUPO, g.NOMBRE, g.UNIDAD, gp.SCORE, p.ID_PRODUCTO, p.TIENDA, p.TITULO, p.URL,
+           p.URL_IMG, a.PRECIO, a.ULTIMA_VEZ
+    FROM GRUPO_T g
+    JOIN GRUPO_PRODUCTO_T gp ON gp.ID_GRUPO = g.ID_GRUPO
+    JOIN PRODUCTO_T p ON p.ID_PRODUCTO = gp.ID_PRODUCTO
+    LEFT JOIN PRECIO_ACTUAL_T a ON a.ID_PRODUCTO = p.ID_PRODUCTO
+    WHERE g.ID_GRUPO IN ({marcas})
+    ORDER BY g.ID_GRUPO DESC, a.PRECIO
+"""
+
+
+def _grupos(cursor, ids):
+    """Grupos con sus productos ordenados por precio, y el mínimo/máximo entre tiendas."""
+    if not ids:
+        return []
+    cursor.execute(GRUPOS_QUERY.format(marcas=", ".join("?" for _ in ids)), ids)
+    grupos = {}
+    for row in cursor.fetchall():
+        grupo = grupos.setdefault(row.ID_GRUPO, {
+            "Id": row.ID_GRUPO, "Nombre": row.NOMBRE, "Unidad": row.UNIDAD, "productos": [],
+        })
+        grupo["productos"].append({
+            "Id": row.ID_PRODUCTO,
+            "Tienda": row.TIENDA,
+            "Titulo": row.TITULO,
+            "Url": row.URL,
+            "UrlImagen": row.URL_IMG,
+            "Precio": float(row.PRECIO) if row.PRECIO is not None else None,
+            "FechaScraping": row.ULTIMA_VEZ.isoformat() if row.ULTIMA_VEZ else None,
+            "Score": float(row.SCORE),
+        })
+    for grupo in grupos.values():
+        precios = [p["Precio"] for p in grupo["productos"] if p["Precio"] is not None]
+        grupo["PrecioMin"] = min(precios) if precios else None
+        grupo["PrecioMax"] = max(precios) if precios else None
+        grupo["Diferencia"] = round(grupo["PrecioMax"] - grupo["PrecioMin"], 2) if precios else None
+    return [grupos[i] for i in ids if i in grupos]
+
+
+@app.route('/api/grupos', methods=['GET'])
+@cacheado
+def get_grupos():
+    """Grupos de productos equivalentes entre tiendas, del más nuevo al más viejo.
+
+    Filtros: ``q`` (palabras del nombre normalizado), ``tienda`` (lista separada
+    por comas; el grupo debe tener producto en todas) y ``producto`` (el grupo
+    de ese id). Paginación por ``cursor`` con el valor de ``siguiente``.
+    """
+    try:
+        limite = _parse_limite(request.args)
+        condiciones, params = [], []
+        # El nombre guarda los tokens del matching: la búsqueda se normaliza igual ("Galletas" -> "galleta")
+        for palabra in normalize_title(request.args.get("q", "")).tokens:
+            condiciones.append("g.NOMBRE LIKE ?")
+            escapada = palabra.replace("[", "[[]").replace("%", "[%]").replace("_", "[_]")
+            params.append(f"%{escapada}%")
+        for tienda in [t.strip() for t in request.args.get("tienda", "").split(",") if t.strip()]:
+            condiciones.append("EXISTS (SELECT 1 FROM GRUPO_PRODUCTO_T t WHERE t.ID_GRUPO = g.ID_GRUPO AND t.TIENDA = ?)")
+            params.append(store_of(tienda))
+        try:
+            if request.args.get("producto"):
+                condiciones.append("g.ID_GRUPO IN (SELECT ID_GRUPO FROM GRUPO_PRODUCTO_T WHERE ID_PRODUCTO = ?)")
+                params.append(int(request.args["producto"]))
+            if request.args.get("cursor"):
+                condiciones.append("g.ID_GRUPO < ?")
+                params.append(int(request.args["cursor"]))
+        except ValueError:
+            raise ParametroInvalido("'producto' y 'cursor' deben ser enteros")
+    except ParametroInvalido as e:
+        return jsonify({"error": str(e)}), 400
+
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    try:
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT TOP ({limite + 1}) g.ID_GRUPO FROM GRUPO_T g {where} ORDER BY g.ID_GRUPO DESC",
+                           params)
+            ids = [row[0] for row in cursor.fetchall()]
+            siguiente = None
+            if len(ids) > limite:
+                ids = ids[:limite]
+                siguiente = str(ids[-1])
+            grupos = _grupos(cursor, ids)
+            cursor.close()
+    except Exception as e:
+        return jsonify({"error": f"Error al conectar o consultar la base de datos: {str(e)}"}), 500
+    return jsonify({"grupos": grupos, "siguiente": siguiente})
+
+
+@app.route('/api/grupos/<int:grupo_id>', methods=['GET'])
+@cacheado
+def get_grupo(grupo_id):
+    try:
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            grupos = _grupos(cursor, [grupo_id])
+            cursor.close()
+    except Exception as e:
+        return jsonify({"error": f"Error al conectar o consultar la base de datos: {str(e)}"}), 500
+    if not grupos:
+        return jsonify({"error": "Grupo no encontrado"}), 404
+    return jsonify(grupos[0])
+
+
+# --- EXPORTACIÓN MASIVA DEL HISTORIAL DE PRECIOS ---
+
+COLUMNAS_EXPORTACION = ["IdProducto", "Tienda", "Sku", "Url", "Titulo", "Precio", "Fecha"]
+FILAS_POR_LOTE = 2000
+
+
+def _filas_exportacion(sql, params):
+    # El cursor se lee por lotes con fetchmany: en memoria solo hay un lote a la vez
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            while True:
+                filas = cursor.fetchmany(FILAS_POR_LOTE)
+                if not filas:
+                    break
+                yield filas
+        finally:
+            cursor.close()
+
+
+def _valor_exportable(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    return valor
+
+
+def _ndjson(lotes):
+    for filas in lotes:
+        yield "".join(
+            json.dumps(dict(zip(COLUMNAS_EXPORTACION, map(_valor_exportable, fila))), ensure_ascii=False) + "\n"
+            for fila in filas
+        )
+
+
+def _csv(lotes):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNAS_EXPORTACION)
+    for filas in lotes:
+        writer.writerows([_valor_exportable(v) for v in fila] for fila in filas)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits=31 -> formato gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@app.route('/api/productos/exportar', methods=['GET'])
+def exportar_productos():
+    """Historial completo de precios en streaming, como NDJSON (default) o CSV.
+
+    Acepta los mismos filtros que /api/productos (aplicados a la fecha y precio
+    de cada observación) y ``gzip=1`` para comprimir la respuesta. La memoria
+    del proceso no depende del tamaño del resultado.
+    """
+    formato = request.args.get("formato", "ndjson").lower()
+    if formato not in ("ndjson", "csv"):
+        return jsonify({"error": "'formato' debe ser ndjson o csv"}), 400
+    try:
+        condiciones, params = filtros_productos(request.args, tienda="p.TIENDA", fecha="o.FECHA", precio="o.PRECIO")
+    except ParametroInvalido as e:
+        return jsonify({"error": str(e)}), 400
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+
+    # Orden del índice clustered de PRECIO_T: el servidor no tiene que ordenar nada
+    sql = f"""
+        SELECT o.ID_PRODUCTO, p.TIENDA, p.SKU, p.URL, p.TITULO, o.PRECIO, o.FECHA
+        FROM PRECIO_T o
+        JOIN PRODUCTO_T p ON p.ID_PRODUCTO = o.ID_PRODUCTO
+        {where}
+        ORDER BY o.ID_PRODUCTO, o.FECHA
+    """
+
+    lotes = _filas_exportacion(sql, params)
+    if formato == "csv":
+        cuerpo, mimetype = _csv(lotes), "text/csv"
+    else:
+        cuerpo, mimetype = _ndjson(lotes), "application/x-ndjson"
+
+    headers = {"Content-Disposition": f"attachment; filename=precios.{formato}"}
+    if request.args.get("gzip", "").lower() in ("1", "true", "si"):
+        cuerpo = _gzip(cuerpo)
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(stream_with_context(cuerpo), mimetype=mimetype, headers=headers)
+
+
+# --- MÉTRICAS DEL POOL DE CONEXIONES ---
+@app.route('/api/pool', methods=['GET'])
+def get_pool_metrics():
+    return jsonify(db_pool.metrics())
+
+
+# --- CACHÉ DE RESPUESTAS ---
+@app.route('/api/cache', methods=['GET'])
+def get_cache_metrics():
+    return jsonify(response_cache.metrics())
 
 
+@app.route('/api/cache/invalidar', methods=['POST'])
+def invalidar_cache():
+    # Lo llama el pipeline al cerrar un spider que escribió filas (y replay_spool)
+    response_cache.invalidate()
+    return jsonify({"mensaje": "Caché invalidada", "generacion": response_cache.generation})
 
 
 
 
 
 
+
+
+
+# --- COLA DE CRAWLS ---
+
+# Backend: "docker" (un contenedor por crawl) o "daemon" (`scrapy crawld` residente)
+if os.environ.get("RIVALWATCH_CRAWL_BACKEND", "docker") == "daemon":
+    crawl_backend = DaemonBackend(os.environ.get("RIVALWATCH_DAEMON_URL", "http://127.0.0.1:6810"))
+else:
+    crawl_backend = DockerBackend(image=os.environ.get("RIVALWATCH_DOCKER_IMAGE", "rivalwatch-app"))
+
+# Workers acotados y a lo más N crawls simultáneos por tienda; los pedidos
+# iguales que siguen pendientes se fusionan en un solo job
+job_queue = JobQueue(
+    crawl_backend,
+    workers=int(os.environ.get("RIVALWATCH_JOB_WORKERS", 2)),
+    per_store=int(os.environ.get("RIVALWATCH_JOB_PER_STORE", 1)),
+)
+
+NOMBRE_SPIDER = re.compile(r"^[A-Za-z0-9_]+$")
+
+# Una búsqueda repetida dentro de esta ventana se contesta con lo que trajo
+# el último crawl en vez de lanzar otro (0 = siempre crawlear)
+FRESCURA_SEGUNDOS = int(os.environ.get("RIVALWATCH_FRESHNESS_SECONDS", 600))
+
+
+def crawl_reciente(tienda, query, max_products):
+    """``(crawl, productos)`` del último crawl fresco de (tienda, búsqueda), o None."""
+    if FRESCURA_SEGUNDOS <= 0:
+        return None
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            crawl = last_crawl(cursor, tienda, query, FRESCURA_SEGUNDOS, max_products)
+            if crawl is None:
+                return None
+            columnas = ", ".join(f"{columna} AS {campo}" for campo, (columna, _) in CAMPOS_PRODUCTO.items())
+            cursor.execute(f"""
+                SELECT TOP ({max(1, max_products)}) {columnas}
+                FROM CRAWL_PRODUCTO_T c
+                JOIN PRECIO_ACTUAL_T a ON a.ID_PRODUCTO = c.ID_PRODUCTO
+                JOIN PRODUCTO_T p ON p.ID_PRODUCTO = c.ID_PRODUCTO
+                WHERE c.ID_CRAWL = ?
+                ORDER BY a.ULTIMA_VEZ DESC, a.ID_PRODUCTO DESC
+            """, crawl.ID_CRAWL)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+    return crawl, [_fila_a_producto(row, list(CAMPOS_PRODUCTO)) for row in rows]
+
+
 @app.route('/api/iniciar-spider', methods=['POST'])
 def iniciar_spider():
-    data = request.json
+    data = request.json or {}
     nombre_spider = data.get('spider')
     query = data.get('query')
     max_products = data.get('max_products', 100)
 
     if not nombre_spider or not query:
         return jsonify({"error": "El nombre del spider y el término de búsqueda son requeridos"}), 400
+    if not NOMBRE_SPIDER.match(str(nombre_spider)):
+        return jsonify({"error": "Nombre de spider inválido"}), 400
+    query = str(query).strip()
+    try:
+        max_products = int(max_products)
+    except (TypeError, ValueError):
+        return jsonify({"error": "'max_products' debe ser un entero"}), 400
+
+    # Con forzar=true se crawlea aunque haya resultados recientes
+    if not data.get('forzar'):
+        try:
+            reciente = crawl_reciente(nombre_spider, query, max_products)
+        except Exception as e:
+            # Sin base no hay con qué responder: se crawlea como siempre
+            app.logger.warning(f"No se pudo revisar la frescura de '{query}' en {nombre_spider}: {e}")
+            reciente = None
+        if reciente is not None:
+            crawl, productos = reciente
+            mensaje = (f"'{query}' en {nombre_spider} se buscó hace {crawl.EDAD // 60} min; "
+                       f"se muestran esos {len(productos)} resultados (usa forzar para actualizar).")
+            return jsonify({
+                "mensaje": mensaje,
+                "fresco": True,
+                "crawl": {"id": crawl.ID_CRAWL, "fin": crawl.FIN.isoformat(), "items": crawl.ITEMS},
+                "productos": productos,
+            }), 200
 
     try:
-        # Construimos el comando de Docker
-        comando = (
-            f"docker run --rm rivalwatch-app "
-            f"scrapy crawl {nombre_spider} "
-            f"-a query=\"{query}\" "
-            f"-a max_products={max_products}"
-        )
-        
-        print(f"Ejecutando comando: {comando}") # Añadimos un print para depurar
+        # forzar también salta el caché HTTP: todo se vuelve a bajar
+        job, nuevo = job_queue.submit(nombre_spider, {"query": query, "max_products": max_products},
+                                      {"HTTPCACHE_TTL": 0} if data.get('forzar') else None)
+    except RuntimeError as e:
+        # El servidor se está apagando
+        return jsonify({"error": str(e)}), 503
+    if nuevo:
+        mensaje = f"Crawl del spider '{nombre_spider}' en cola (job {job.id})."
+    else:
+        mensaje = f"Ya había un crawl igual en cola para '{nombre_spider}' (job {job.id})."
+    return jsonify({"mensaje": mensaje, "fresco": False, "job": job.to_dict()}), 202
 
-        # Ejecutamos el comando de Docker en segundo plano
-        subprocess.Popen(comando, shell=True)
 
-        mensaje = f"Contenedor Docker iniciado para el spider '{nombre_spider}'."
-        return jsonify({"mensaje": mensaje}), 200
-        
-    except Exception as e:
-        return jsonify({"error": f"Error al intentar ejecutar el contenedor Docker: {str(e)}"}), 500
+@app.route('/api/trabajos', methods=['GET'])
+def listar_trabajos():
+    return jsonify({"trabajos": [job.to_dict() for job in job_queue.list()], "cola": job_queue.metrics()})
+
+
+@app.route('/api/trabajos/<job_id>', methods=['GET'])
+def estado_trabajo(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job no encontrado"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/api/trabajos/<job_id>/cancelar', methods=['POST'])
+def cancelar_trabajo(job_id):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job no encontrado"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/api/trabajos/<job_id>/eventos', methods=['GET'])
+def eventos_trabajo(job_id):
+    """Avance del job como Server-Sent Events.
+
+    Eventos: ``estado`` (pendiente/corriendo/terminado...), ``progreso`` (items,
+    descartados, páginas, errores), ``productos`` (filas nuevas con la forma de
+    /api/productos) y ``fin``. El stream se cierra cuando el job termina; al
+    reconectar, ``Last-Event-ID`` retoma desde el último evento recibido.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job no encontrado"}), 404
+    try:
+        desde = int(request.headers.get("Last-Event-ID") or request.args.get("desde", 0))
+    except ValueError:
+        desde = 0
+
+    def stream():
+        ultimo = desde
+        if ultimo == 0:
+            yield _sse("estado", {"estado": job.estado, "items": job.items})
+        while True:
+            eventos = job_queue.wait_events(job, ultimo, timeout=15)
+            for ultimo, evento in eventos:
+                yield _sse(evento.get("tipo", "mensaje"), evento, ultimo)
+            if not eventos:
+                if job.estado in FINALES:
+                    return
+                yield ": ping\n\n"  # comentario SSE para que proxies no corten la conexión
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(stream()), mimetype="text/event-stream", headers=headers)
+
+
+def _sse(tipo, datos, id_evento=None):
+    cabecera = f"id: {id_evento}\n" if id_evento is not None else ""
+    return f"{cabecera}event: {tipo}\ndata: {json.dumps(datos, ensure_ascii=False, default=str)}\n\n"
+
+
+@app.route('/api/trabajos/<job_id>/resultados', methods=['GET'])
+def resultados_trabajo(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job no encontrado"}), 404
+    # items es None mientras el crawl no haya volcado sus stats
+    return jsonify({"id": job.id, "estado": job.estado, "items": job.items})
+
+
+
+# 5. Modo producción: la misma app detrás de uvicorn (ASGI), cada petición en un
+# hilo de un pool acotado. `python api.py --produccion` o `uvicorn api:asgi_app`.
+# Un solo proceso: la cola de crawls, sus eventos SSE y la caché viven en memoria,
+# así que la concurrencia viene de los hilos (pyodbc suelta el GIL mientras espera a la base)
+
+SHUTDOWN_TIMEOUT = float(os.environ.get("RIVALWATCH_SHUTDOWN_TIMEOUT", 30))
 
+asgi_app = WSGIApp(
+    app,
+    threads=int(os.environ.get("RIVALWATCH_THREADS", 64)),
+    # Al apagar: los crawls en curso tienen SHUTDOWN_TIMEOUT para terminar, luego se cierra el pool
+    on_shutdown=[lambda: job_queue.close(SHUTDOWN_TIMEOUT), db_pool.close],
+)
 
 
-# 5. Punto de entrada para ejecutar el servidor Flask
+# 6. Punto de entrada para ejecutar el servidor
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="API de RivalWatch")
+    parser.add_argument("--produccion", action="store_true",
+                        help="Servir con uvicorn (sin debugger, peticiones concurrentes, apagado ordenado)")
+    parser.add_argument("--host", default=os.environ.get("RIVALWATCH_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("RIVALWATCH_PORT", 5000)))
+    opciones = parser.parse_args()
 
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    if opciones.produccion:
+        serve(asgi_app, host=opciones.host, port=opciones.port, shutdown_timeout=SHUTDOWN_TIMEOUT)
+    else:
+        # Desarrollo: servidor de Flask con debugger y recarga
+        app.run(debug=True, host=opciones.host, port=opciones.port)
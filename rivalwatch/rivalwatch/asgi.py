@@ -0,0 +1,225 @@
+# asgi.py — modo producción del API: la app WSGI (Flask) detrás de un servidor ASGI
+import asyncio
+import concurrent.futures
+import io
+import logging
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Cuerpo máximo de una petición (los POST del API son JSON chicos)
+MAX_BODY = 1024 * 1024
+
+
+class _Disconnected(Exception):
+    pass
+
+
+class WSGIApp:
+    """Sirve una app WSGI desde un servidor ASGI (uvicorn) sin bloquear el event loop.
+
+    Cada petición corre en un hilo de un pool acotado (``threads``), así que una
+    consulta lenta ocupa un hilo y una conexión del pool de la base, no el
+    servidor. El event loop solo mueve bytes: las respuestas en streaming
+    (exportaciones, SSE) salen por una cola chica, de modo que un cliente lento
+    frena a su hilo y no acumula la respuesta en memoria. Si el cliente se
+    desconecta, el iterador WSGI se cierra en el siguiente fragmento.
+
+    ``on_shutdown`` son funciones que se llaman al apagar (lifespan), después de
+    que el servidor dejó de aceptar conexiones y terminó las que tenía.
+    """
+
+    def __init__(self, app, threads=64, on_shutdown=(), queue_size=8):
+        self.app = app
+        self.threads = int(threads)
+        self.on_shutdown = list(on_shutdown)
+        self.queue_size = queue_size
+        self.executor = concurrent.futures.ThreadPoolExecutor(self.threads, thread_name_prefix="api")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            await self._http(scope, receive, send)
+        elif scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                loop = asyncio.get_running_loop()
+                for callback in self.on_shutdown:
+                    try:
+                        await loop.run_in_executor(None, callback)
+                    except Exception as e:
+                        logger.error(f"Error al apagar ({getattr(callback, '__qualname__', callback)}): {e}")
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if len(body) > MAX_BODY:
+                await _plain(send, 413, b"Request Entity Too Large")
+                return
+            if not message.get("more_body"):
+                break
+
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue(self.queue_size)
+        gone = threading.Event()
+        environ = self._environ(scope, bytes(body))
+        worker = loop.run_in_executor(self.executor, self._run, environ, loop, chunks, gone)
+        watcher = asyncio.ensure_future(self._watch(receive, gone))
+        started = False
+        try:
+            while True:
+                getter = asyncio.ensure_future(chunks.get())
+                await asyncio.wait({getter, watcher}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    # El cliente se fue: el hilo lo nota en su siguiente fragmento
+                    getter.cancel()
+                    return
+                item = getter.result()
+                if item is None:
+                    break
+                kind, value = item
+                if kind == "start":
+                    status, headers = value
+                    await send({"type": "http.response.start", "status": status, "headers": headers})
+                    started = True
+                elif kind == "body":
+                    await send({"type": "http.response.body", "body": value, "more_body": True})
+                else:
+                    logger.error("Error no manejado en la petición %s %s", environ["REQUEST_METHOD"],
+                                 environ["PATH_INFO"], exc_info=value)
+                    if not started:
+                        await _plain(send, 500, b"Internal Server Error")
+                    return
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            gone.set()
+            watcher.cancel()
+            # Si el hilo espera lugar en la cola, se le libera para que termine
+            # (no se le espera: un SSE puede tardar hasta su siguiente ping en notarlo)
+            while not chunks.empty():
+                chunks.get_nowait()
+
+    @staticmethod
+    async def _watch(receive, gone):
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                gone.set()
+                return
+
+    def _run(self, environ, loop, chunks, gone):
+        """Corre en un hilo del pool: ejecuta la app y pasa los fragmentos al event loop."""
+        state = {}
+
+        def put(item):
+            if gone.is_set():
+                raise _Disconnected
+            future = asyncio.run_coroutine_threadsafe(chunks.put(item), loop)
+            while True:
+                try:
+                    return future.result(timeout=1.0)
+                except concurrent.futures.TimeoutError:
+                    if gone.is_set():
+                        future.cancel()
+                        raise _Disconnected
+
+        def emit(data):
+            if "sent" not in state:
+                put(("start", state["start"]))
+                state["sent"] = True
+            if data:
+                put(("body", bytes(data)))
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and "sent" in state:
+                raise exc_info[1].with_traceback(exc_info[2])
+            state["start"] = (
+                int(status.split(" ", 1)[0]),
+                [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+            )
+            return emit
+
+        try:
+            result = self.app(environ, start_response)
+            try:
+                for data in result:
+                    emit(data)
+                emit(b"")
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+            put(None)
+        except _Disconnected:
+            pass
+        except Exception as e:
+            try:
+                put(("error", e))
+            except _Disconnected:
+                pass
+
+    @staticmethod
+    def _environ(scope, body):
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            # WSGI pide la ruta como bytes leídos en latin-1
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": str(server[0]),
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": client[0],
+            "REMOTE_PORT": str(client[1]),
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for raw_name, raw_value in scope.get("headers", []):
+            name = raw_name.decode("latin-1").upper().replace("-", "_")
+            value = raw_value.decode("latin-1")
+            if name == "CONTENT_TYPE":
+                environ["CONTENT_TYPE"] = value
+                continue
+            if name == "CONTENT_LENGTH":
+                continue
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+
+async def _plain(send, status, body):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"text/plain; charset=utf-8")]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def serve(app, host="127.0.0.1", port=5000, shutdown_timeout=30.0, **options):
+    """Levanta uvicorn con la app ASGI; SIGINT/SIGTERM la apagan en orden.
+
+    Al recibir la señal uvicorn deja de aceptar conexiones, espera hasta
+    ``shutdown_timeout`` segundos a las que siguen abiertas (exportaciones,
+    SSE) y luego corre el shutdown de la app.
+    """
+    import uvicorn
+    uvicorn.run(app, host=host, port=port, lifespan="on", timeout_graceful_shutdown=shutdown_timeout,
+                **options)
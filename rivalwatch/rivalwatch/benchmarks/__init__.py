@@ -0,0 +1 @@
+# Benchmarks de las partes calientes del crawl: python -m rivalwatch.benchmarks.<módulo>
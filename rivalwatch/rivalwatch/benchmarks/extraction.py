@@ -0,0 +1,163 @@
+# extraction.py — benchmark de rivalwatch.extraction contra la extracción anterior del spider de Walmart
+#
+#   python -m rivalwatch.benchmarks.extraction                  # páginas sintéticas de 1 y 4 MB
+#   python -m rivalwatch.benchmarks.extraction pagina.html ...  # páginas guardadas
+import argparse
+import json
+import random
+import re
+import time
+from urllib.parse import urljoin
+
+from parsel import Selector
+
+from rivalwatch.extraction import find_price, iter_product_links, stock_hint
+
+BASE_URL = "https://super.walmart.com.mx/search?q=harina"
+
+
+# ---- Implementación anterior (WalmartMxSpider), como referencia -------------
+
+def legacy_find_price(html):
+    snippets = []
+    for kw in ("price", "Precio", "precio", "sales", "offer", "Oferta", "oferta"):
+        for m in re.finditer(r".{0,80}" + re.escape(kw) + r".{0,80}", html, flags=re.I | re.S):
+            snippets.append(m.group(0))
+    if not snippets:
+        snippets = [html[:50000]]
+
+    price_re = re.compile(
+        r"\$?\s*([0-9]{1,3}(?:[.,][0-9]{3})*(?:[.,][0-9]{2})|[0-9]+(?:[.,][0-9]{2})?)",
+        flags=re.M,
+    )
+    for chunk in snippets:
+        for m in price_re.finditer(chunk):
+            raw = m.group(1)
+            if raw.count(",") > 1 and "." not in raw:
+                raw = raw.replace(".", "").replace(",", ".")
+            return raw
+    return None
+
+
+def legacy_product_links(html, base_url):
+    sel = Selector(text=html)
+    product_urls = set()
+    for href in sel.css('a[href$="/p"]::attr(href)').getall():
+        product_urls.add(urljoin(base_url, href))
+    next_data = sel.css('script#__NEXT_DATA__::text').get()
+    if next_data:
+        try:
+            data = json.loads(next_data)
+
+            def walk(obj):
+                if isinstance(obj, dict):
+                    for k, v in obj.items():
+                        if k in ("link", "url") and isinstance(v, str) and v.endswith("/p"):
+                            product_urls.add(urljoin(base_url, v))
+                        else:
+                            walk(v)
+                elif isinstance(obj, list):
+                    for it in obj:
+                        walk(it)
+
+            walk(data)
+        except Exception:
+            pass
+    if not product_urls:
+        for m in re.finditer(r'"/([^"]+?/p)"', html):
+            product_urls.add(urljoin(base_url, m.group(1)))
+    return product_urls
+
+
+def legacy_stock(html):
+    txt = html.lower()
+    if "agotado" in txt or "sin existencias" in txt:
+        return False
+    if "agregar al carrito" in txt or "añadir al carrito" in txt:
+        return True
+    return None
+
+
+# ---- Páginas sintéticas -----------------------------------------------------
+
+def synthetic_page(size, price_at=0.9, seed=1):
+    """HTML tipo Next.js de ~``size`` bytes: un ``__NEXT_DATA__`` grande con
+    productos anidados, anchors al final y el precio de la ficha en ``price_at``
+    (fracción del documento). Lo demás es ruido sin palabras clave."""
+    rnd = random.Random(seed)
+    products = []
+    n = 0
+    while len(json.dumps(products)) < size * 0.6:
+        n += 1
+        products.append({
+            "id": n,
+            "name": f"Producto {n} " + "x" * rnd.randint(10, 60),
+            "link": f"/ip/producto-{n}/{100000 + n}/p",
+            "tracking": {"pos": n, "tags": ["a", "b", "c"] * 5, "attrs": {"w": rnd.random(), "h": rnd.random()}},
+        })
+    next_data = json.dumps({"props": {"pageProps": {"initialData": {"searchResult": {"itemStacks": [{"items": products}]}}}}})
+    filler_unit = "<div class=\"card\"><span>Texto de relleno sin cifras</span></div>\n"
+    filler = filler_unit * max(0, int((size - len(next_data)) / len(filler_unit)))
+    cut = int(len(filler) * price_at)
+    anchors = "".join(f'<a href="/ip/producto-{i}/{100000 + i}/p">p{i}</a>' for i in range(1, 41))
+    return (
+        "<html><head><title>Resultados</title></head><body>"
+        f"{filler[:cut]}<span class=\"price\">$1,234.50</span>{filler[cut:]}"
+        f"{anchors}<button>Agregar al carrito</button>"
+        f'<script id="__NEXT_DATA__" type="application/json">{next_data}</script>'
+        "</body></html>"
+    )
+
+
+def timed(fn, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench(name, html, repeat, first_links=24):
+    rows = [
+        ("precio", lambda: legacy_find_price(html), lambda: find_price(html)),
+        ("links (todos)", lambda: legacy_product_links(html, BASE_URL),
+         lambda: list(iter_product_links(html, BASE_URL))),
+        (f"links (primeros {first_links})", lambda: legacy_product_links(html, BASE_URL),
+         lambda: [u for _, u in zip(range(first_links), iter_product_links(html, BASE_URL))]),
+        ("disponibilidad", lambda: legacy_stock(html), lambda: stock_hint(html)),
+    ]
+    print(f"\n{name}  ({len(html) / 1e6:.1f} MB)")
+    print(f"  {'':22} {'anterior':>10} {'nuevo':>10} {'x':>7}")
+    for label, old, new in rows:
+        # El precio anterior tarda segundos por MB: una sola vez
+        t_old, r_old = timed(old, repeat=1 if label == "precio" else repeat)
+        t_new, r_new = timed(new, repeat=repeat)
+        same = ""
+        if label == "links (todos)" and set(r_new) != set(r_old):
+            same = f"  (distintos: {len(set(r_old) ^ set(r_new))})"
+        elif label in ("precio", "disponibilidad") and r_new != r_old:
+            same = f"  (anterior {r_old!r}, nuevo {r_new!r})"
+        print(f"  {label:22} {t_old * 1000:9.1f}ms {t_new * 1000:9.1f}ms {t_old / max(t_new, 1e-9):6.1f}x{same}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("pages", nargs="*", help="HTML guardados (default: páginas sintéticas)")
+    parser.add_argument("--sizes", default="1,4", help="Tamaños sintéticos en MB (default: 1,4)")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones; se reporta la mejor")
+    args = parser.parse_args(argv)
+
+    if args.pages:
+        for path in args.pages:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                bench(path, f.read(), args.repeat)
+        return
+    for mb in [float(s) for s in args.sizes.split(",") if s.strip()]:
+        bench(f"sintética {mb:g} MB, precio al 90%", synthetic_page(int(mb * 1e6)), args.repeat)
+        bench(f"sintética {mb:g} MB, precio al 5%", synthetic_page(int(mb * 1e6), price_at=0.05), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# blocker.py — bloqueo de recursos en Playwright (tipos y hosts) con stats por crawl
+import logging
+import weakref
+from urllib.parse import urlsplit
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+logger = logging.getLogger(__name__)
+
+# Tamaño típico por tipo, para estimar lo ahorrado mientras no se haya visto uno real
+DEFAULT_AVG_BYTES = {
+    "image": 40_000,
+    "media": 500_000,
+    "font": 30_000,
+    "stylesheet": 25_000,
+    "script": 60_000,
+    "ping": 500,
+}
+
+
+def host_matches(host, hosts):
+    """``True`` si ``host`` o alguno de sus dominios padre está en ``hosts``.
+
+    ``a.b.doubleclick.net`` se busca como ``a.b.doubleclick.net``,
+    ``b.doubleclick.net``, ``doubleclick.net`` y ``net``: tantas búsquedas en
+    el set como etiquetas tenga el host, sin importar cuántos hosts haya.
+    """
+    while host:
+        if host in hosts:
+            return True
+        _, _, host = host.partition(".")
+    return False
+
+
+class ResourceBlocker:
+    """Decide qué subpeticiones de una página se abortan y lleva la cuenta.
+
+    Se bloquea por host (``block_hosts``, incluye subdominios) o por tipo de
+    recurso de Playwright (``block_types``: image, media, font, stylesheet,
+    ping —los beacons—, ...). ``allow_hosts`` y ``allow_types`` ganan sobre
+    ambos. El documento principal nunca se bloquea.
+    """
+
+    def __init__(self, block_types=(), block_hosts=(), allow_hosts=(), allow_types=(), stats=None,
+                 avg_bytes=None, cache_size=4096):
+        self.block_types = frozenset(block_types) - frozenset(allow_types) - {"document"}
+        self.block_hosts = frozenset(h.lower().lstrip(".") for h in block_hosts)
+        self.allow_hosts = frozenset(h.lower().lstrip(".") for h in allow_hosts)
+        self.stats = stats
+        self.avg_bytes = dict(DEFAULT_AVG_BYTES, **(avg_bytes or {}))
+        # Bytes reales de lo que sí se bajó, por tipo: [peticiones, bytes]
+        self.seen_bytes = {}
+        self.cache_size = cache_size
+        self._hosts = {}
+        self._pages = weakref.WeakSet()
+
+    def _host_rule(self, host):
+        rule = self._hosts.get(host)
+        if rule is None:
+            if host_matches(host, self.allow_hosts):
+                rule = "allow"
+            elif host_matches(host, self.block_hosts):
+                rule = "block"
+            else:
+                rule = ""
+            if len(self._hosts) >= self.cache_size:
+                self._hosts.clear()
+            self._hosts[host] = rule
+        return rule
+
+    def should_block(self, url, resource_type):
+        """``"host"`` o ``"type"`` si se bloquea (el motivo), ``None`` si pasa."""
+        if resource_type == "document":
+            return None
+        rule = self._host_rule((urlsplit(url).hostname or "").lower())
+        if rule == "allow":
+            return None
+        if rule == "block":
+            return "host"
+        if resource_type in self.block_types:
+            return "type"
+        return None
+
+    def estimated_bytes(self, resource_type):
+        count, total = self.seen_bytes.get(resource_type, (0, 0))
+        if count:
+            return total // count
+        return self.avg_bytes.get(resource_type, 0)
+
+    def _inc(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+    # ---- Playwright ---------------------------------------------------------
+
+    async def init_page(self, page, request):
+        """``playwright_page_init_callback``: corre antes de navegar, así que la
+        ruta cubre todo lo que pida la página, desde el primer script."""
+        # scrapy-playwright registra su ruta en cada petición y la última registrada
+        # es la primera en correr: en una página reutilizada (rivalwatch.pagepool)
+        # la nuestra se vuelve a poner encima
+        await page.unroute("**/*", self.route)
+        await page.route("**/*", self.route)
+        if page not in self._pages:
+            self._pages.add(page)
+            page.on("requestfinished", self.request_finished)
+
+    async def route(self, route, request):
+        resource_type = request.resource_type
+        reason = self.should_block(request.url, resource_type)
+        if reason is None:
+            self._inc("blocker/allowed")
+            # Sigue a la ruta de scrapy-playwright (headers, método y cuerpo de la petición)
+            return await route.fallback()
+        self._inc("blocker/blocked")
+        self._inc(f"blocker/blocked/{reason}")
+        self._inc(f"blocker/blocked/resource_type/{resource_type}")
+        self._inc("blocker/bytes_saved_estimate", self.estimated_bytes(resource_type))
+        return await route.abort()
+
+    async def request_finished(self, request):
+        try:
+            size = (await request.sizes()).get("responseBodySize") or 0
+        except Exception:
+            # La página pudo cerrarse antes de pedir los tamaños
+            return
+        counts = self.seen_bytes.setdefault(request.resource_type, [0, 0])
+        counts[0] += 1
+        counts[1] += size
+        self._inc("blocker/allowed_bytes", size)
+        self._inc(f"blocker/allowed_bytes/resource_type/{request.resource_type}", size)
+
+
+class ResourceBlockerMiddleware:
+    """Pone el ``ResourceBlocker`` del crawl en toda petición con ``playwright``.
+
+    La configuración sale de ``RESOURCE_BLOCKER_*``; cada spider puede agregar
+    ``blocker_allow_hosts`` y ``blocker_allow_types`` (p. ej. si necesita las
+    imágenes de su CDN). Con ``meta["block_resources"] = False`` una petición
+    no se toca.
+    """
+
+    def __init__(self, stats, block_types, block_hosts, allow_hosts=(), avg_bytes=None):
+        self.stats = stats
+        self.block_types = list(block_types)
+        self.block_hosts = list(block_hosts)
+        self.allow_hosts = list(allow_hosts)
+        self.avg_bytes = avg_bytes
+        self.blocker = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("RESOURCE_BLOCKER_ENABLED", True):
+            raise NotConfigured
+        middleware = cls(
+            crawler.stats,
+            block_types=settings.getlist("RESOURCE_BLOCKER_TYPES"),
+            block_hosts=settings.getlist("RESOURCE_BLOCKER_HOSTS"),
+            allow_hosts=settings.getlist("RESOURCE_BLOCKER_ALLOW_HOSTS"),
+            avg_bytes=settings.getdict("RESOURCE_BLOCKER_AVG_BYTES"),
+        )
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        return middleware
+
+    def spider_opened(self, spider):
+        self.blocker = ResourceBlocker(
+            block_types=self.block_types,
+            block_hosts=self.block_hosts,
+            allow_hosts=self.allow_hosts + list(getattr(spider, "blocker_allow_hosts", ())),
+            allow_types=getattr(spider, "blocker_allow_types", ()),
+            stats=self.stats,
+            avg_bytes=self.avg_bytes,
+        )
+        logger.debug(f"Bloqueo de recursos para {spider.name}: tipos {sorted(self.blocker.block_types)}, "
+                     f"{len(self.blocker.block_hosts)} hosts")
+
+    def process_request(self, request, spider):
+        if self.blocker is None or not request.meta.get("playwright"):
+            return None
+        if request.meta.get("block_resources") is False:
+            return None
+        request.meta.setdefault("playwright_page_init_callback", self.blocker.init_page)
+        return None
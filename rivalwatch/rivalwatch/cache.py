@@ -0,0 +1,87 @@
+# cache.py — caché de respuestas del API e invalidación al terminar un crawl
+import hashlib
+import json
+import logging
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Caché en memoria de respuestas ya serializadas, con TTL y desalojo LRU.
+
+    Cada entrada guarda el cuerpo y su ETag. ``invalidate()`` vacía todo y sube
+    la generación: una respuesta que se calculó con datos de antes de la
+    invalidación ya no se guarda aunque termine después.
+    """
+
+    def __init__(self, max_entries=256, ttl=300.0):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.generation = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    def get(self, key):
+        """Devuelve ``(body, etag)`` o None; si falta, el llamador calcula y guarda con la generación."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[3] <= time.monotonic():
+                del self.entries[key]
+                self.stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[0], entry[1]
+
+    def put(self, key, body, generation):
+        etag = etag_for(body)
+        with self.lock:
+            if generation != self.generation:
+                return etag
+            self.entries[key] = (body, etag, generation, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+        return etag
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+            self.stats["invalidations"] += 1
+
+    def metrics(self):
+        with self.lock:
+            data = dict(self.stats)
+            data.update(entries=len(self.entries), max_entries=self.max_entries, ttl=self.ttl,
+                        generation=self.generation)
+        return data
+
+
+def etag_for(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def notify_invalidation(api_url, tienda=None, timeout=5.0):
+    """Avisa al API que hay datos nuevos en la base. Los errores solo se registran."""
+    if not api_url:
+        return False
+    url = api_url.rstrip("/") + "/api/cache/invalidar"
+    data = json.dumps({"tienda": tienda}).encode("utf-8")
+    req = urllib.request.Request(url, data=data, method="POST", headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout):
+            pass
+    except Exception as e:
+        logger.warning(f"No se pudo invalidar la caché del API en {url}: {e}")
+        return False
+    return True
@@ -0,0 +1,45 @@
+# crawld.py — scrapy crawld
+from scrapy.commands import ScrapyCommand
+
+from rivalwatch.daemon import BrowserPool, serve
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    # El avance llega al job por la señal progress_event, no por stdout
+    default_settings = {"PROGRESS_STDOUT": False}
+
+    def syntax(self):
+        return "[options]"
+
+    def short_desc(self):
+        return "Servicio residente que recibe crawls por HTTP con el reactor y los navegadores ya levantados"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument("--port", dest="port", type=int, default=None,
+                            help="Puerto HTTP (default: CRAWL_DAEMON_PORT)")
+        parser.add_argument("--host", dest="host", default=None,
+                            help="Interfaz donde escuchar (default: CRAWL_DAEMON_HOST)")
+        parser.add_argument("--browsers", dest="browsers", type=int, default=None,
+                            help="Navegadores Chromium pre-lanzados (default: CRAWL_DAEMON_BROWSERS, 0 = ninguno)")
+
+    def run(self, args, opts):
+        settings = self.settings
+        size = opts.browsers if opts.browsers is not None else settings.getint("CRAWL_DAEMON_BROWSERS", 2)
+        browsers = None
+        if size:
+            launch = settings.getdict("PLAYWRIGHT_LAUNCH_OPTIONS")
+            browsers = BrowserPool(
+                size=size,
+                base_port=settings.getint("CRAWL_DAEMON_CDP_PORT", 9222),
+                executable=launch.get("executable_path"),
+                headless=launch.get("headless", True),
+                args=launch.get("args", ()),
+            )
+        serve(
+            self.crawler_process,
+            port=opts.port or settings.getint("CRAWL_DAEMON_PORT", 6810),
+            host=opts.host or settings.get("CRAWL_DAEMON_HOST", "127.0.0.1"),
+            browsers=browsers,
+        )
@@ -0,0 +1,42 @@
+# match.py — scrapy match
+import pyodbc
+from scrapy.commands import ScrapyCommand
+
+from rivalwatch.matching import Matcher
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    default_settings = {"LOG_LEVEL": "INFO"}
+
+    def syntax(self):
+        return "[options]"
+
+    def short_desc(self):
+        return "Indexa los productos pendientes y los agrupa con su equivalente en las otras tiendas"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument("--rebuild", dest="rebuild", action="store_true",
+                            help="Descartar índice y grupos y procesar todo el catálogo")
+        parser.add_argument("--threshold", dest="threshold", type=float, default=None,
+                            help="Similitud mínima para agrupar (default: MATCHING_THRESHOLD)")
+        parser.add_argument("--batch-size", dest="batch_size", type=int, default=500,
+                            help="Productos por lote/commit (default: 500)")
+        parser.add_argument("--limit", dest="limit", type=int, default=None,
+                            help="Procesar a lo más N productos")
+
+    def run(self, args, opts):
+        threshold = opts.threshold if opts.threshold is not None else self.settings.getfloat("MATCHING_THRESHOLD", 0.55)
+        connection = pyodbc.connect(self.settings.get("SQLSERVER_CONNECTION_STRING"))
+        try:
+            cursor = connection.cursor()
+            matcher = Matcher(cursor, threshold=threshold)
+            if opts.rebuild:
+                matcher.rebuild()
+            stats = matcher.update(batch_size=opts.batch_size, limit=opts.limit)
+            cursor.close()
+        finally:
+            connection.close()
+        print(f"{stats['indexados']} productos indexados, {stats['asignados']} asignados a grupos, "
+              f"{stats['grupos_nuevos']} grupos nuevos")
@@ -0,0 +1,44 @@
+# migrate.py — scrapy migrate
+import pyodbc
+from scrapy.commands import ScrapyCommand
+
+from rivalwatch import migrations
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    default_settings = {"LOG_ENABLED": False}
+
+    def syntax(self):
+        return "[options]"
+
+    def short_desc(self):
+        return "Aplica las migraciones pendientes del esquema de SQL Server"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument("--target", dest="target", type=int, default=None,
+                            help="Migrar solo hasta esta versión")
+        parser.add_argument("--status", dest="status", action="store_true",
+                            help="Solo mostrar la versión actual y las pendientes")
+
+    def run(self, args, opts):
+        connection = pyodbc.connect(self.settings.get("SQLSERVER_CONNECTION_STRING"))
+        try:
+            cursor = connection.cursor()
+            version = migrations.current_version(cursor)
+            cursor.close()
+            pending = [m for m in migrations.available() if m[0] > version]
+            if opts.status:
+                print(f"Versión actual: {version}")
+                for number, name, _ in pending:
+                    print(f"  pendiente: {number:04d} {name}")
+                return
+
+            applied = migrations.migrate(connection, target=opts.target)
+            if applied:
+                print(f"Esquema actualizado a la versión {applied[-1]}")
+            else:
+                print(f"El esquema ya está en la versión {version}")
+        finally:
+            connection.close()
@@ -0,0 +1,62 @@
+# recrawl_plan.py — scrapy recrawl_plan
+import os
+
+import pyodbc
+from scrapy.commands import ScrapyCommand
+
+from rivalwatch.recrawl import STORES_QUERY, build_plan, load_history, write_plan
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    default_settings = {"LOG_LEVEL": "INFO"}
+
+    def syntax(self):
+        return "[options]"
+
+    def short_desc(self):
+        return "Arma por tienda la lista de productos a re-crawlear, primero los que más cambian de precio"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument("--tienda", dest="tiendas", action="append", default=None,
+                            help="Tienda (nombre del spider) a planear; se puede repetir (default: todas)")
+        parser.add_argument("--budget", dest="budget", type=int, default=None,
+                            help="Peticiones por tienda (default: RECRAWL_BUDGETS / RECRAWL_BUDGET)")
+        parser.add_argument("--output", dest="output", default=None,
+                            help="Carpeta de los planes (default: RECRAWL_PLAN_DIR)")
+
+    def run(self, args, opts):
+        settings = self.settings
+        output = opts.output or settings.get("RECRAWL_PLAN_DIR", "state/recrawl")
+        budgets = settings.getdict("RECRAWL_BUDGETS")
+        window = settings.getint("RECRAWL_WINDOW_DAYS", 30)
+        promo_drop = settings.getfloat("RECRAWL_PROMO_DROP", 0.05)
+        promo_boost = settings.getfloat("RECRAWL_PROMO_BOOST", 2.0)
+
+        connection = pyodbc.connect(settings.get("SQLSERVER_CONNECTION_STRING"))
+        try:
+            cursor = connection.cursor()
+            tiendas = opts.tiendas or [row[0] for row in cursor.execute(STORES_QUERY).fetchall()]
+            for tienda in tiendas:
+                budget = opts.budget or budgets.get(tienda) or settings.getint("RECRAWL_BUDGET", 500)
+                # El presupuesto es de peticiones: los spiders de API piden varios productos en cada una
+                products = budget * self._batch_size(tienda)
+                history = load_history(cursor, tienda, window_days=window)
+                entries = build_plan(history, products, promo_drop=promo_drop, promo_boost=promo_boost)
+                path = os.path.join(output, f"{tienda}.jsonl")
+                write_plan(path, entries)
+                promos = sum(1 for e in entries if e["promocion"])
+                print(f"{tienda}: {len(entries)} de {len(history)} productos ({promos} en promoción) -> {path}")
+                if entries:
+                    print(f"    scrapy crawl {tienda} -a plan={path}")
+            cursor.close()
+        finally:
+            connection.close()
+
+    def _batch_size(self, tienda):
+        try:
+            spidercls = self.crawler_process.spider_loader.load(tienda)
+        except KeyError:
+            return 1
+        return max(1, int(getattr(spidercls, "plan_batch_size", 1)))
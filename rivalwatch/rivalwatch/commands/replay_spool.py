@@ -0,0 +1,61 @@
+# replay_spool.py — scrapy replay_spool
+import pyodbc
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from rivalwatch.cache import notify_invalidation
+from rivalwatch.pipelines import SqlServerPipeline
+from rivalwatch.spool import pending_files, replay_file
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    default_settings = {"LOG_LEVEL": "INFO"}
+
+    def syntax(self):
+        return "[options]"
+
+    def short_desc(self):
+        return "Carga en bloque en las tablas de precios las filas guardadas en el spool local"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument("--dir", dest="spool_dir", help="Carpeta del spool (default: SPOOL_DIR)")
+        parser.add_argument("--batch-size", dest="batch_size", type=int, default=1000,
+                            help="Filas por INSERT/commit (default: 1000)")
+        parser.add_argument("--include-partial", dest="include_partial", action="store_true",
+                            help="Incluir archivos .part de crawls que no cerraron (solo sin crawls corriendo)")
+
+    def run(self, args, opts):
+        spool_dir = opts.spool_dir or self.settings.get("SPOOL_DIR")
+        if not spool_dir:
+            raise UsageError("No hay carpeta de spool: define SPOOL_DIR o usa --dir")
+
+        connection_string = self.settings.get("SQLSERVER_CONNECTION_STRING")
+        files = pending_files(spool_dir, include_partial=opts.include_partial)
+        if not files:
+            print(f"No hay archivos pendientes en {spool_dir}")
+            return
+
+        total = 0
+        for path in files:
+            try:
+                loaded = replay_file(
+                    path,
+                    connect=lambda: pyodbc.connect(connection_string),
+                    write=SqlServerPipeline.write_rows,
+                    prepare=SqlServerPipeline.prepare,
+                    decode=SqlServerPipeline.decode_spooled,
+                    batch_size=opts.batch_size,
+                )
+            except Exception as e:
+                # El progreso queda guardado; la siguiente corrida retoma este archivo
+                print(f"Error cargando {path}: {e}")
+                self.exitcode = 1
+                break
+            print(f"{path}: {loaded} filas cargadas")
+            total += loaded
+
+        print(f"Total: {total} filas cargadas")
+        if total:
+            notify_invalidation(self.settings.get("RIVALWATCH_API_URL"))
@@ -0,0 +1,48 @@
+# crawls.py — registro de crawls terminados y consulta de frescura
+import re
+import unicodedata
+
+RECORD_QUERY = """
+    INSERT INTO CRAWL_T (ID_CRAWL, TIENDA, CONSULTA, MAX_PRODUCTOS, INICIO, FIN, ITEMS, RAZON)
+    VALUES (?, ?, ?, ?, DATEADD(SECOND, -?, SYSDATETIME()), SYSDATETIME(), ?, ?)
+"""
+
+# Solo cuentan crawls que terminaron solos (o por su propio límite) y trajeron algo.
+# Las fechas salen del reloj de SQL Server: el contenedor del crawl y el API
+# pueden estar en zonas horarias distintas. La edad cuenta desde INICIO, que es
+# la observación más vieja del crawl (una página del caché HTTP puede ser anterior al crawl).
+LAST_CRAWL_QUERY = """
+    SELECT TOP (1) ID_CRAWL, FIN, ITEMS, MAX_PRODUCTOS,
+           DATEDIFF(SECOND, INICIO, SYSDATETIME()) AS EDAD
+    FROM CRAWL_T
+    WHERE TIENDA = ? AND CONSULTA = ? AND INICIO >= DATEADD(SECOND, -?, SYSDATETIME()) AND ITEMS > 0
+      AND (RAZON = 'finished' OR RAZON LIKE 'closespider%')
+      AND (MAX_PRODUCTOS IS NULL OR MAX_PRODUCTOS >= ?)
+    ORDER BY FIN DESC
+"""
+
+
+def normalize_query(query):
+    """Búsqueda canónica: sin acentos, minúsculas y espacios simples ("Harína  " == "harina")."""
+    if not query:
+        return ""
+    text = unicodedata.normalize("NFKD", str(query))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", text).strip().lower()[:400]
+
+
+def spider_query(spider):
+    # La mayoría de los spiders guardan el -a query tal cual; Walmart GraphQL lo renombra
+    return getattr(spider, "query", None) or getattr(spider, "search_query", None)
+
+
+def record_crawl(cursor, crawl_id, tienda, consulta, max_productos, duracion, items, razon):
+    """Registra un crawl que termina ahora y duró ``duracion`` segundos."""
+    cursor.execute(RECORD_QUERY, (crawl_id, tienda, normalize_query(consulta), max_productos,
+                                  int(duracion), items, str(razon)[:100]))
+
+
+def last_crawl(cursor, tienda, consulta, max_age, max_productos=0):
+    """Último crawl válido de (tienda, búsqueda) con menos de ``max_age`` segundos, o None."""
+    return cursor.execute(LAST_CRAWL_QUERY, (tienda, normalize_query(consulta), int(max_age),
+                                             max_productos or 0)).fetchone()
@@ -0,0 +1,270 @@
+# daemon.py — servicio de crawls residente: reactor caliente y navegadores ya lanzados
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from scrapy.crawler import Crawler
+
+from rivalwatch.extensions import progress_event
+from rivalwatch.jobs import CANCELADO, CORRIENDO, FALLIDO, FINALES, TERMINADO, Job
+
+logger = logging.getLogger(__name__)
+
+
+def chromium_executable():
+    """Ruta del Chromium que instaló ``playwright install``."""
+    from playwright.sync_api import sync_playwright
+    with sync_playwright() as p:
+        return p.chromium.executable_path
+
+
+class BrowserPool:
+    """Procesos de Chromium con ``--remote-debugging-port`` que viven lo que vive el daemon.
+
+    Cada crawl se conecta a uno por CDP (``PLAYWRIGHT_CDP_URL``) en vez de lanzar
+    su propio navegador; al cerrar el crawl scrapy-playwright cierra sus
+    contextos y se desconecta, pero el proceso sigue corriendo para el siguiente.
+    """
+
+    def __init__(self, size=2, base_port=9222, executable=None, headless=True, args=()):
+        self.size = max(0, int(size))
+        self.base_port = int(base_port)
+        self.executable = executable
+        self.headless = headless
+        self.args = list(args)
+        self.processes = [None] * self.size
+        self.profiles = [None] * self.size
+        self.in_use = [0] * self.size
+
+    def start(self):
+        if not self.size:
+            return
+        if not self.executable:
+            self.executable = chromium_executable()
+        for slot in range(self.size):
+            self._launch(slot)
+
+    def acquire(self):
+        """Devuelve ``(slot, cdp_url)`` del navegador menos ocupado, relanzándolo si murió."""
+        if not self.size:
+            return None, None
+        slot = min(range(self.size), key=lambda i: self.in_use[i])
+        if self.processes[slot] is None or self.processes[slot].poll() is not None:
+            logger.warning(f"El navegador {slot} no estaba corriendo; se relanza")
+            self._launch(slot)
+        self.in_use[slot] += 1
+        return slot, f"http://127.0.0.1:{self.base_port + slot}"
+
+    def release(self, slot):
+        if slot is not None:
+            self.in_use[slot] -= 1
+
+    def stop(self):
+        for slot, process in enumerate(self.processes):
+            if process is not None and process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+            if self.profiles[slot]:
+                shutil.rmtree(self.profiles[slot], ignore_errors=True)
+
+    def metrics(self):
+        return [
+            {"puerto": self.base_port + slot, "vivo": p is not None and p.poll() is None, "crawls": n}
+            for slot, (p, n) in enumerate(zip(self.processes, self.in_use))
+        ]
+
+    def _launch(self, slot):
+        if self.profiles[slot] is None:
+            self.profiles[slot] = tempfile.mkdtemp(prefix=f"rivalwatch-chromium-{slot}-")
+        command = [
+            self.executable,
+            f"--remote-debugging-port={self.base_port + slot}",
+            "--remote-debugging-address=127.0.0.1",
+            f"--user-data-dir={self.profiles[slot]}",
+            "--no-first-run",
+            "--no-default-browser-check",
+            *self.args,
+        ]
+        if self.headless:
+            command.append("--headless=new")
+        self.processes[slot] = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        logger.info(f"Chromium {slot} escuchando CDP en el puerto {self.base_port + slot}")
+
+
+class CrawlDaemon:
+    """Recibe crawls por HTTP y los corre en el reactor que ya está levantado.
+
+    Los spiders, settings, pools de SQL Server y navegadores se cargan una sola
+    vez; un crawl nuevo solo paga por crear su ``Crawler``.
+    """
+
+    def __init__(self, runner, browsers=None, history=500):
+        self.runner = runner
+        self.browsers = browsers
+        self.history = history
+        self.jobs = {}
+        self.crawlers = {}
+
+    def submit(self, spider, args, settings=None):
+        if spider not in self.runner.spider_loader.list():
+            raise KeyError(spider)
+        # Igual que con -a: los spiders reciben los argumentos como texto
+        job = Job(spider, {k: str(v) for k, v in args.items()}, settings)
+        self.jobs[job.id] = job
+        self._trim()
+
+        settings = self.runner.settings.copy()
+        slot, cdp_url = self.browsers.acquire() if self.browsers else (None, None)
+        if cdp_url:
+            settings.set("PLAYWRIGHT_CDP_URL", cdp_url, priority="cmdline")
+        # Igual que con -s: por encima de los custom_settings del spider
+        for name, value in job.settings.items():
+            settings.set(name, value, priority="cmdline")
+        crawler = Crawler(self.runner.spider_loader.load(spider), settings)
+        # La señal guarda una referencia débil: el método ligado vive lo que vive el job
+        crawler.signals.connect(job.add_event, signal=progress_event)
+        self.crawlers[job.id] = crawler
+
+        job.estado = CORRIENDO
+        job.iniciado = time.time()
+        d = self.runner.crawl(crawler, **job.args)
+        d.addCallbacks(self._finished, self._failed, callbackArgs=(job,), errbackArgs=(job,))
+        d.addBoth(self._cleanup, job, slot)
+        return job
+
+    def get(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is not None and job.estado == CORRIENDO:
+            self._update_items(job)
+        return job
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None or job.estado in FINALES:
+            return job
+        job.cancelar = True
+        self._stop_crawler(job_id)
+        return job
+
+    def metrics(self):
+        return {
+            "corriendo": sum(1 for j in self.jobs.values() if j.estado == CORRIENDO),
+            "navegadores": self.browsers.metrics() if self.browsers else [],
+        }
+
+    def _stop_crawler(self, job_id):
+        crawler = self.crawlers.get(job_id)
+        if crawler is None or not crawler.crawling:
+            return
+        if crawler.engine is None or not crawler.engine.running:
+            # El crawl todavía está arrancando: se reintenta cuando el engine corra
+            from twisted.internet import reactor
+            reactor.callLater(0.2, self._stop_crawler, job_id)
+            return
+        crawler.stop()
+
+    def _update_items(self, job):
+        crawler = self.crawlers.get(job.id)
+        if crawler is not None and crawler.stats:
+            job.items = crawler.stats.get_value("item_scraped_count", 0)
+
+    def _finished(self, _, job):
+        self._update_items(job)
+        job.estado = CANCELADO if job.cancelar else TERMINADO
+
+    def _failed(self, failure, job):
+        logger.error(f"El crawl {job.id} ({job.spider}) falló: {failure.getErrorMessage()}")
+        self._update_items(job)
+        job.error = failure.getErrorMessage()
+        job.estado = FALLIDO
+
+    def _cleanup(self, _, job, slot):
+        job.terminado = time.time()
+        self.crawlers.pop(job.id, None)
+        if self.browsers:
+            self.browsers.release(slot)
+
+    def _trim(self):
+        finished = [i for i, j in self.jobs.items() if j.estado in FINALES]
+        for job_id in finished[:max(0, len(self.jobs) - self.history)]:
+            del self.jobs[job_id]
+
+
+def make_site(daemon):
+    """Interfaz HTTP local del daemon (JSON).
+
+    - ``POST /crawl`` con ``{"spider": ..., "args": {...}}``
+    - ``GET /crawl/<id>`` y ``POST /crawl/<id>/cancel``
+    - ``GET /crawl/<id>/eventos?desde=N``: eventos de avance con número mayor a N
+    - ``GET /status``
+    """
+    from twisted.web import resource, server
+
+    class Api(resource.Resource):
+        isLeaf = True
+
+        def render_GET(self, request):
+            path = [p.decode() for p in request.postpath if p]
+            if path == ["status"]:
+                return _json(request, 200, daemon.metrics())
+            if len(path) in (2, 3) and path[0] == "crawl":
+                job = daemon.get(path[1])
+                if job is None:
+                    return _json(request, 404, {"error": "Job no encontrado"})
+                if len(path) == 3 and path[2] == "eventos":
+                    try:
+                        desde = int(request.args.get(b"desde", [b"0"])[0])
+                    except ValueError:
+                        desde = 0
+                    return _json(request, 200, {**job.to_dict(), "eventos": job.events_after(desde)})
+                return _json(request, 200, job.to_dict())
+            return _json(request, 404, {"error": "Ruta no encontrada"})
+
+        def render_POST(self, request):
+            path = [p.decode() for p in request.postpath if p]
+            if path == ["crawl"]:
+                try:
+                    data = json.loads(request.content.read() or b"{}")
+                    job = daemon.submit(data["spider"], data.get("args") or {}, data.get("settings"))
+                except KeyError:
+                    return _json(request, 400, {"error": "Spider inválido o no indicado"})
+                except ValueError:
+                    return _json(request, 400, {"error": "JSON inválido"})
+                return _json(request, 202, job.to_dict())
+            if len(path) == 3 and path[0] == "crawl" and path[2] == "cancel":
+                job = daemon.cancel(path[1])
+                if job is None:
+                    return _json(request, 404, {"error": "Job no encontrado"})
+                return _json(request, 200, job.to_dict())
+            return _json(request, 404, {"error": "Ruta no encontrada"})
+
+    return server.Site(Api())
+
+
+def _json(request, code, data):
+    request.setResponseCode(code)
+    request.setHeader(b"Content-Type", b"application/json")
+    return json.dumps(data).encode("utf-8")
+
+
+def serve(process, port=6810, host="127.0.0.1", browsers=None):
+    """Levanta el daemon sobre un ``CrawlerProcess`` y bloquea hasta que se detenga."""
+    from scrapy.utils.reactor import install_reactor
+    install_reactor(process.settings["TWISTED_REACTOR"], process.settings["ASYNCIO_EVENT_LOOP"])
+    from twisted.internet import reactor
+
+    if browsers is not None:
+        browsers.start()
+        reactor.addSystemEventTrigger("after", "shutdown", browsers.stop)
+
+    daemon = CrawlDaemon(process, browsers)
+    reactor.listenTCP(port, make_site(daemon), interface=host)
+    logger.info(f"Daemon de crawls escuchando en http://{host}:{port} (pid {os.getpid()})")
+    process.start(stop_after_crawl=False)
@@ -0,0 +1,191 @@
+# db.py — pool de conexiones pyodbc compartido por el API y el pipeline
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pyodbc
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class _Entry:
+    __slots__ = ("connection", "created", "last_used")
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created = time.monotonic()
+        self.last_used = self.created
+
+
+class ConnectionPool:
+    """Pool acotado de conexiones, seguro entre hilos.
+
+    - ``size``: máximo de conexiones abiertas; si todas están en uso, el
+      checkout espera hasta ``timeout`` segundos.
+    - ``recycle``: las conexiones con más de esos segundos se cierran y se
+      reemplazan al sacarlas del pool.
+    - ``ping_idle``: si una conexión estuvo ociosa más de esos segundos se
+      valida con ``SELECT 1`` antes de entregarla (0 = validar siempre).
+    """
+
+    def __init__(self, connect, size=5, timeout=30.0, recycle=1800.0, ping_idle=10.0):
+        self.connect = connect
+        self.size = max(1, int(size))
+        self.timeout = float(timeout)
+        self.recycle = float(recycle)
+        self.ping_idle = float(ping_idle)
+
+        self.lock = threading.Condition()
+        self.idle = deque()
+        self.open = 0
+        self.in_use = 0
+        self.stats = {
+            "created": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "recycled": 0,
+            "discarded": 0,
+            "health_check_failures": 0,
+        }
+
+    @contextmanager
+    def connection(self):
+        entry = self._checkout()
+        try:
+            yield entry.connection
+        except BaseException:
+            self._release(entry, healthy=self._rollback(entry))
+            raise
+        else:
+            self._release(entry, healthy=self._rollback(entry))
+
+    def metrics(self):
+        with self.lock:
+            data = dict(self.stats)
+            data.update(size=self.size, open=self.open, in_use=self.in_use, idle=len(self.idle))
+        checkouts = data["checkouts"] or 1
+        data["wait_time_avg"] = data["wait_time_total"] / checkouts
+        return data
+
+    def close(self):
+        with self.lock:
+            entries, self.idle = list(self.idle), deque()
+            self.open -= len(entries)
+        for entry in entries:
+            self._close(entry)
+
+    # ---- Internos -----------------------------------------------------------
+
+    def _checkout(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        with self.lock:
+            while not self.idle and self.open >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats["timeouts"] += 1
+                    raise PoolTimeout(f"No hubo conexión libre en {self.timeout:g}s ({self.size} en uso)")
+                waited = True
+                self.lock.wait(remaining)
+            entry = self.idle.pop() if self.idle else None
+            if entry is None:
+                self.open += 1
+            self.in_use += 1
+
+        # Crear o validar la conexión fuera del lock: puede tardar
+        try:
+            if entry is None:
+                entry = self._create()
+            elif not self._usable(entry):
+                self._close(entry)
+                entry = self._create()
+        except BaseException:
+            with self.lock:
+                self.open -= 1
+                self.in_use -= 1
+                self.lock.notify()
+            raise
+
+        waited_for = time.monotonic() - started
+        with self.lock:
+            self.stats["checkouts"] += 1
+            if waited:
+                self.stats["waits"] += 1
+            self.stats["wait_time_total"] += waited_for
+            self.stats["wait_time_max"] = max(self.stats["wait_time_max"], waited_for)
+        return entry
+
+    def _create(self):
+        entry = _Entry(self.connect())
+        with self.lock:
+            self.stats["created"] += 1
+        return entry
+
+    def _usable(self, entry):
+        now = time.monotonic()
+        if self.recycle and now - entry.created > self.recycle:
+            with self.lock:
+                self.stats["recycled"] += 1
+            return False
+        if now - entry.last_used >= self.ping_idle:
+            try:
+                cursor = entry.connection.cursor()
+                cursor.execute("SELECT 1").fetchone()
+                cursor.close()
+            except Exception as e:
+                logger.warning(f"Conexión del pool descartada por health check fallido: {e}")
+                with self.lock:
+                    self.stats["health_check_failures"] += 1
+                return False
+        return True
+
+    def _rollback(self, entry):
+        # Cerramos cualquier transacción abierta; si ni eso funciona, la conexión está rota
+        try:
+            entry.connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _release(self, entry, healthy=True):
+        entry.last_used = time.monotonic()
+        with self.lock:
+            self.in_use -= 1
+            if healthy:
+                self.idle.append(entry)
+            else:
+                self.open -= 1
+                self.stats["discarded"] += 1
+            self.lock.notify()
+        if not healthy:
+            self._close(entry)
+
+    def _close(self, entry):
+        try:
+            entry.connection.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(connection_string, **options):
+    """Pool compartido del proceso para esa cadena de conexión (se crea con las opciones del primer llamado)."""
+    with _pools_lock:
+        pool = _pools.get(connection_string)
+        if pool is None:
+            pool = ConnectionPool(lambda: pyodbc.connect(connection_string), **options)
+            _pools[connection_string] = pool
+        return pool
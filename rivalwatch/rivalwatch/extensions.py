@@ -0,0 +1,104 @@
+# extensions.py — avance del crawl como eventos JSON (para el dashboard vía API)
+import datetime as dt
+import json
+import sys
+
+from itemadapter import ItemAdapter
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from rivalwatch.pipelines import item_key
+
+# Señal propia: la recibe el daemon para guardar los eventos del job
+progress_event = object()
+
+# Prefijo de las líneas de avance en stdout; jobs.DockerBackend las reconoce
+PROGRESS_PREFIX = "@@progreso "
+
+
+class CrawlProgress:
+    """Cada ``PROGRESS_INTERVAL`` segundos publica un evento ``progreso`` con los
+    contadores del crawl y un evento ``productos`` con los items nuevos desde el
+    anterior, ya con la forma de /api/productos. Al cerrar publica ``fin``.
+
+    Los eventos salen por la señal ``progress_event`` y, con ``PROGRESS_STDOUT``,
+    como líneas ``@@progreso {json}`` en stdout (así los lee el API cuando el
+    crawl corre en un contenedor).
+    """
+
+    def __init__(self, crawler, interval=1.0, stdout=True, max_products=100):
+        self.crawler = crawler
+        self.interval = interval
+        self.stdout = stdout
+        self.max_products = max_products
+        self.nuevos = []
+        self.task = None
+        self.ultimo = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("PROGRESS_ENABLED", True):
+            raise NotConfigured
+        ext = cls(
+            crawler,
+            interval=settings.getfloat("PROGRESS_INTERVAL", 1.0),
+            stdout=settings.getbool("PROGRESS_STDOUT", True),
+            max_products=settings.getint("PROGRESS_MAX_PRODUCTS", 100),
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        from twisted.internet import task
+        self.task = task.LoopingCall(self.flush, spider)
+        self.task.start(self.interval, now=False)
+
+    def item_scraped(self, item, spider):
+        adapter = ItemAdapter(item)
+        precio = adapter.get("precio")
+        try:
+            precio = float(precio)
+        except (TypeError, ValueError):
+            pass
+        self.nuevos.append({
+            "Clave": f"{spider.name}:{item_key(adapter)}",
+            "Titulo": adapter.get("titulo"),
+            "Precio": precio,
+            "UrlImagen": adapter.get("url_imagen"),
+            "Tienda": spider.name,
+            "FechaScraping": dt.datetime.now().isoformat(),
+        })
+
+    def spider_closed(self, spider, reason):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+        self.flush(spider)
+        self.emit({"tipo": "fin", "razon": reason, **self.counters()})
+
+    def counters(self):
+        stats = self.crawler.stats
+        return {
+            "items": stats.get_value("item_scraped_count", 0),
+            "descartados": stats.get_value("item_dropped_count", 0),
+            "paginas": stats.get_value("response_received_count", 0),
+            "errores": stats.get_value("log_count/ERROR", 0),
+        }
+
+    def flush(self, spider):
+        nuevos, self.nuevos = self.nuevos, []
+        for start in range(0, len(nuevos), self.max_products):
+            self.emit({"tipo": "productos", "productos": nuevos[start:start + self.max_products]})
+        # Solo se manda avance si algo cambió
+        counters = self.counters()
+        if counters != self.ultimo:
+            self.ultimo = counters
+            self.emit({"tipo": "progreso", **counters})
+
+    def emit(self, event):
+        self.crawler.signals.send_catch_log(progress_event, event=event)
+        if self.stdout:
+            sys.stdout.write(PROGRESS_PREFIX + json.dumps(event, ensure_ascii=False, default=str) + "\n")
+            sys.stdout.flush()
@@ -0,0 +1,160 @@
+# extraction.py — precios, links de producto y disponibilidad en una sola pasada sobre el HTML
+#
+# Todo se busca con str.find sobre el texto (o su versión en minúsculas, que se saca
+# una vez): es búsqueda en C, mucho más rápida que una regex con re.I o con ".{0,80}"
+# al frente, y cada función se detiene en cuanto tiene su respuesta.
+# Benchmark: python -m rivalwatch.benchmarks.extraction
+import heapq
+import html as htmllib
+import json
+import re
+from urllib.parse import urljoin
+
+# Palabras que anuncian un precio (en minúsculas)
+PRICE_KEYWORDS = ("price", "precio", "sales", "offer", "oferta")
+PRICE_RE = re.compile(r"\$?\s*([0-9]{1,3}(?:[.,][0-9]{3})*(?:[.,][0-9]{2})|[0-9]+(?:[.,][0-9]{2})?)")
+# Contexto alrededor de la palabra clave donde se busca el número
+PRICE_WINDOW = 80
+
+OUT_OF_STOCK = ("agotado", "sin existencias")
+IN_STOCK = ("agregar al carrito", "añadir al carrito")
+BOT_WALL = ("captcha", "verify you are human", "acceso denegado")
+
+# Más largo que esto entre comillas no es un link
+_MAX_LINK = 2048
+_HREF_RE = re.compile(r"[^\"'<>\s]+?/p")
+_BARE_RE = re.compile(r"/[^\"\s<>]+?/p")
+_JSON_KEY_RE = re.compile(r'"(?:link|url)"\s*:\s*$')
+
+
+def _normalize_price(raw):
+    # "1.234,50" -> "1234.50"; los demás formatos se dejan como vienen
+    if raw.count(",") > 1 and "." not in raw:
+        raw = raw.replace(".", "").replace(",", ".")
+    return raw
+
+
+def iter_keywords(lowered, keywords):
+    """Posiciones ``(inicio, fin)`` de todas las ``keywords`` en orden de aparición.
+
+    Un ``find`` por palabra y un heap para mezclarlas: cada carácter se revisa
+    una vez por palabra, sin retroceder, y se puede dejar de pedir en cualquier
+    momento.
+    """
+    heap = []
+    for keyword in keywords:
+        pos = lowered.find(keyword)
+        if pos >= 0:
+            heap.append((pos, keyword))
+    heapq.heapify(heap)
+    while heap:
+        pos, keyword = heap[0]
+        yield pos, pos + len(keyword)
+        nxt = lowered.find(keyword, pos + 1)
+        if nxt >= 0:
+            heapq.heapreplace(heap, (nxt, keyword))
+        else:
+            heapq.heappop(heap)
+
+
+def find_price(text, window=PRICE_WINDOW, fallback_chars=50_000):
+    """Primer número con forma de precio cerca de una palabra clave, o ``None``.
+
+    Recorre las palabras clave en orden de aparición y prueba la regex de
+    precio solo en ``window`` caracteres alrededor de cada una; se detiene en el
+    primer precio. Si no hay ninguna palabra clave se busca en los primeros
+    ``fallback_chars`` caracteres.
+    """
+    lowered = text.lower()
+    found_keyword = False
+    for start, end in iter_keywords(lowered, PRICE_KEYWORDS):
+        found_keyword = True
+        price = PRICE_RE.search(lowered, max(0, start - window), end + window)
+        if price:
+            return _normalize_price(price.group(1))
+    if not found_keyword:
+        price = PRICE_RE.search(lowered, 0, fallback_chars)
+        if price:
+            return _normalize_price(price.group(1))
+    return None
+
+
+def _link_at(text, end):
+    """El link entre comillas que termina en ``end`` (justo antes de la comilla de
+    cierre): ``(tipo, valor)`` con tipo ``href``, ``json`` o ``bare``, o ``None``."""
+    quote = text[end]
+    start = text.rfind(quote, max(0, end - _MAX_LINK), end)
+    if start < 0:
+        return None
+    value = text[start + 1:end]
+    if quote == '"' and text.endswith("\\", 0, start):
+        # Comilla escapada dentro de un string JSON: no es el inicio del valor
+        return None
+    if text.endswith("href=", 0, start):
+        return ("href", value) if _HREF_RE.fullmatch(value) else None
+    if quote != '"':
+        return None
+    if _JSON_KEY_RE.search(text, max(0, start - 32), start):
+        return "json", value
+    return ("bare", value) if _BARE_RE.fullmatch(value) else None
+
+
+def iter_product_links(text, base_url):
+    """Links absolutos a ficha de producto (``.../p``), sin repetir, en orden de aparición.
+
+    Anchors (``href="..."``) y llaves ``link``/``url`` del JSON embebido
+    (``__NEXT_DATA__``) salen de la misma pasada, sin parsear el HTML ni el
+    JSON. Es un generador: quien lo consume puede dejar de pedir cuando tenga
+    suficientes y el resto del texto no se recorre. Las rutas sueltas entre
+    comillas (``"/.../p"``) solo se usan si no apareció ninguna de las otras.
+    """
+    seen = set()
+    bare = []
+    pos = text.find("/p")
+    while pos >= 0:
+        end = pos + 2
+        if text[end:end + 1] in ('"', "'"):
+            found = _link_at(text, end)
+            if found is not None:
+                kind, link = found
+                if kind == "bare":
+                    if not seen:
+                        bare.append(link)
+                else:
+                    if kind == "href":
+                        link = htmllib.unescape(link)
+                    elif "\\" in link:
+                        try:
+                            link = json.loads(f'"{link}"')
+                        except ValueError:
+                            pass
+                    url = urljoin(base_url, link)
+                    if url not in seen:
+                        seen.add(url)
+                        yield url
+        pos = text.find("/p", end)
+    if seen:
+        return
+    for link in bare:
+        url = urljoin(base_url, link)
+        if url not in seen:
+            seen.add(url)
+            yield url
+
+
+def stock_hint(text):
+    """``False`` si el texto dice agotado, ``True`` si ofrece agregar al carrito, ``None`` si ninguno.
+
+    "Agotado" gana aunque también aparezca el botón.
+    """
+    lowered = text.lower()
+    if any(phrase in lowered for phrase in OUT_OF_STOCK):
+        return False
+    if any(phrase in lowered for phrase in IN_STOCK):
+        return True
+    return None
+
+
+def looks_like_bot_wall(text):
+    lowered = text.lower()
+    return any(phrase in lowered for phrase in BOT_WALL)
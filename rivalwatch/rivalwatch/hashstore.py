@@ -0,0 +1,61 @@
+# hashstore.py — último hash de contenido visto por producto
+import os
+import sqlite3
+
+
+class HashStore:
+    """Mapa (tienda, clave) -> hash del contenido que se escribió la última vez.
+
+    Vive en un SQLite local para sobrevivir entre crawls. Al abrir un spider
+    se cargan a memoria solo las claves de su tienda; los cambios se guardan
+    de una sola vez al cerrar.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hashes = {}
+        self.dirty = {}
+        self.tienda = None
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self.path)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            " tienda TEXT NOT NULL, clave TEXT NOT NULL, hash TEXT NOT NULL,"
+            " PRIMARY KEY (tienda, clave))"
+        )
+        return db
+
+    def load(self, tienda):
+        self.tienda = tienda
+        db = self._connect()
+        try:
+            rows = db.execute("SELECT clave, hash FROM hashes WHERE tienda = ?", (tienda,))
+            self.hashes = dict(rows)
+        finally:
+            db.close()
+
+    def get(self, clave):
+        return self.hashes.get(clave)
+
+    def set(self, clave, value):
+        self.hashes[clave] = value
+        self.dirty[clave] = value
+
+    def save(self):
+        if not self.dirty:
+            return
+        db = self._connect()
+        try:
+            with db:
+                db.executemany(
+                    "INSERT INTO hashes (tienda, clave, hash) VALUES (?, ?, ?)"
+                    " ON CONFLICT (tienda, clave) DO UPDATE SET hash = excluded.hash",
+                    [(self.tienda, clave, value) for clave, value in self.dirty.items()],
+                )
+        finally:
+            db.close()
+        self.dirty = {}
@@ -0,0 +1,251 @@
+# httpcache.py — caché HTTP local con revalidación condicional y TTL por spider
+import datetime as dt
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from email.utils import formatdate
+
+from scrapy.downloadermiddlewares.httpcache import HttpCacheMiddleware
+from scrapy.extensions.httpcache import RFC2616Policy, rfc1123_to_epoch
+from scrapy.http import Headers, TextResponse
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+
+logger = logging.getLogger(__name__)
+
+
+def page_signature(request):
+    """Huella de cómo se renderiza una petición de Playwright ("" si no usa Playwright).
+
+    La misma URL con otros ``playwright_page_methods`` (otra espera, otro
+    scroll) puede dar otro HTML, así que es otra entrada del caché. Las
+    funciones cuentan por su nombre, no por su identidad.
+    """
+    if not request.meta.get("playwright"):
+        return ""
+
+    def describe(value):
+        if callable(value):
+            return getattr(value, "__qualname__", type(value).__name__)
+        if isinstance(value, (list, tuple)):
+            return [describe(v) for v in value]
+        if isinstance(value, dict):
+            return {str(k): describe(v) for k, v in sorted(value.items())}
+        if hasattr(value, "method") and hasattr(value, "args"):
+            # scrapy_playwright.page.PageMethod
+            return [value.method, describe(list(value.args)), describe(dict(value.kwargs))]
+        return value
+
+    spec = [
+        describe(request.meta.get("playwright_page_methods") or []),
+        describe(request.meta.get("playwright_page_goto_kwargs") or {}),
+    ]
+    return hashlib.sha1(json.dumps(spec, sort_keys=True, default=repr).encode("utf-8")).hexdigest()[:16]
+
+
+class SqliteCacheStorage:
+    """``HTTPCACHE_STORAGE`` en un SQLite por spider (``HTTPCACHE_DIR/<spider>.sqlite3``).
+
+    El cuerpo se guarda comprimido con zlib. La llave es el fingerprint de la
+    petición más ``page_signature``. Al leer, el header ``Date`` de la respuesta
+    es la hora en que se guardó o se revalidó por última vez, que es con lo que
+    ``CachePolicy`` calcula su edad. ``HTTPCACHE_EXPIRATION_SECS`` (0 = nunca)
+    borra al abrir las entradas más viejas que eso.
+    """
+
+    COMMIT_EVERY = 100
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings["HTTPCACHE_DIR"], createdir=True)
+        self.expiration_secs = settings.getint("HTTPCACHE_EXPIRATION_SECS")
+        self.compression = settings.getint("HTTPCACHE_COMPRESSION_LEVEL", 6)
+        self.db = None
+        self.pending = 0
+        self._fingerprinter = None
+
+    def open_spider(self, spider):
+        path = os.path.join(self.cachedir, f"{spider.name}.sqlite3")
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS respuestas ("
+            " clave TEXT PRIMARY KEY, url TEXT NOT NULL, status INTEGER NOT NULL,"
+            " headers TEXT NOT NULL, body BLOB NOT NULL, guardado REAL NOT NULL)"
+        )
+        if self.expiration_secs > 0:
+            with self.db:
+                self.db.execute("DELETE FROM respuestas WHERE guardado < ?", (time.time() - self.expiration_secs,))
+        self._fingerprinter = spider.crawler.request_fingerprinter
+        logger.debug(f"Caché HTTP en {path}", extra={"spider": spider})
+
+    def close_spider(self, spider):
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+    def _key(self, request):
+        return self._fingerprinter.fingerprint(request).hex() + page_signature(request)
+
+    def retrieve_response(self, spider, request):
+        row = self.db.execute(
+            "SELECT url, status, headers, body, guardado FROM respuestas WHERE clave = ?", (self._key(request),)
+        ).fetchone()
+        if row is None:
+            return None
+        url, status, raw_headers, body, guardado = row
+        headers = Headers({k: v for k, v in json.loads(raw_headers).items()})
+        headers["Date"] = formatdate(guardado, usegmt=True)
+        headers.pop("Age", None)
+        body = zlib.decompress(body)
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider, request, response):
+        headers = {
+            k.decode("latin-1"): [v.decode("latin-1") for v in values]
+            for k, values in response.headers.items()
+        }
+        self.db.execute(
+            "INSERT OR REPLACE INTO respuestas (clave, url, status, headers, body, guardado)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (self._key(request), response.url, response.status, json.dumps(headers),
+             zlib.compress(response.body, self.compression), time.time()),
+        )
+        self._maybe_commit()
+
+    def discard(self, spider, request):
+        self.db.execute("DELETE FROM respuestas WHERE clave = ?", (self._key(request),))
+        self._maybe_commit()
+
+    def touch(self, spider, request):
+        """La entrada sigue vigente (el servidor dijo 304): vuelve a contar su TTL desde ahora."""
+        self.db.execute("UPDATE respuestas SET guardado = ? WHERE clave = ?", (time.time(), self._key(request)))
+        self._maybe_commit()
+
+    def _maybe_commit(self):
+        self.pending += 1
+        if self.pending >= self.COMMIT_EVERY:
+            self.db.commit()
+            self.pending = 0
+
+
+class CachePolicy(RFC2616Policy):
+    """Política de caché para precios: manda el TTL de rivalwatch, no el del sitio.
+
+    Una entrada más nueva que su TTL (``meta["httpcache_ttl"]`` o
+    ``HTTPCACHE_TTL``, que cada spider ajusta en ``custom_settings``) se usa sin
+    tocar la red. Pasado el TTL se revalida con ``If-None-Match`` /
+    ``If-Modified-Since`` si la respuesta guardada trae ``ETag`` /
+    ``Last-Modified``; si el servidor contesta 304 se usa la guardada. Las
+    páginas de Playwright no se revalidan (el navegador no sabe qué hacer con un
+    304 en la navegación): pasado el TTL se vuelven a renderizar.
+
+    Se guarda todo 200/203 (y 206 de las ventanas de VTEX) aunque el sitio diga
+    ``no-cache``: la frescura la decide el TTL. ``no-store`` en la petición,
+    ``meta["httpcache_store"] = False`` o ``playwright_include_page`` (el callback
+    quiere la página viva) no se cachean.
+    """
+
+    CACHEABLE_STATUS = (200, 203, 206)
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.ttl = settings.getfloat("HTTPCACHE_TTL", 0)
+
+    def should_cache_request(self, request):
+        if request.meta.get("playwright_include_page"):
+            return False
+        return super().should_cache_request(request)
+
+    def should_cache_response(self, response, request):
+        if not request.meta.get("httpcache_store", True):
+            return False
+        if response.status not in self.CACHEABLE_STATUS:
+            return False
+        if response.status == 206 and b"Range" in request.headers:
+            return False
+        return True
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        ttl = float(request.meta.get("httpcache_ttl", self.ttl))
+        if self._compute_current_age(cachedresponse, request, time.time()) < ttl:
+            return True
+        if not request.meta.get("playwright"):
+            self._set_conditional_validators(request, cachedresponse)
+        return False
+
+
+class CacheMiddleware(HttpCacheMiddleware):
+    """``HttpCacheMiddleware`` que además renueva la entrada cuando el servidor contesta 304.
+
+    Si el spider define ``httpcache_reject(response)`` (p.ej. un muro anti-bots que
+    llega como 200), lo que rechaza no se guarda, y una entrada guardada que rechaza
+    se borra y se vuelve a bajar. Stat ``httpcache/rejected``.
+    """
+
+    def _rejected(self, response, spider):
+        reject = getattr(spider, "httpcache_reject", None)
+        if reject is None or not isinstance(response, TextResponse) or not reject(response):
+            return False
+        self.stats.inc_value("httpcache/rejected")
+        return True
+
+    def process_request(self, request, spider):
+        result = super().process_request(request, spider)
+        # Copia vigente (result) o vencida que se va a revalidar (cached_response)
+        cached = result if result is not None else request.meta.get("cached_response")
+        if cached is not None and self._rejected(cached, spider):
+            if hasattr(self.storage, "discard"):
+                self.storage.discard(spider, request)
+            request.meta.pop("cached_response", None)
+            request.headers.pop("If-None-Match", None)
+            request.headers.pop("If-Modified-Since", None)
+            return None
+        return result
+
+    def process_response(self, request, response, spider):
+        if "cached" not in response.flags and self._rejected(response, spider):
+            # Se entrega al spider, pero no se guarda ni reemplaza la copia que hubiera
+            request.meta.pop("cached_response", None)
+            request.meta["_dont_cache"] = True
+        result = super().process_response(request, response, spider)
+        if response.status == 304 and result is not response:
+            # El servidor confirmó la copia: se observó ahora (ver CachedObservationMiddleware)
+            result.headers["Date"] = formatdate(usegmt=True)
+            if hasattr(self.storage, "touch"):
+                self.storage.touch(spider, request)
+        return result
+
+
+def observed_at(response):
+    """Cuándo se bajó (o revalidó) ``response`` si salió del caché, como datetime local; si no, ``None``."""
+    if "cached" not in response.flags:
+        return None
+    epoch = rfc1123_to_epoch(response.headers.get(b"Date"))
+    return dt.datetime.fromtimestamp(epoch) if epoch else None
+
+
+class CachedObservationMiddleware:
+    """Spider middleware: los items de una respuesta del caché llevan ``observado`` con la
+    hora real de la respuesta, que es la que escribe la pipeline en vez de la del callback."""
+
+    def _stamp(self, item, observed):
+        if observed is not None and isinstance(item, dict):
+            item.setdefault("observado", observed)
+        return item
+
+    def process_spider_output(self, response, result, spider):
+        observed = observed_at(response)
+        for item in result:
+            yield self._stamp(item, observed)
+
+    async def process_spider_output_async(self, response, result, spider):
+        observed = observed_at(response)
+        async for item in result:
+            yield self._stamp(item, observed)
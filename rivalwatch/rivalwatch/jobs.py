@@ -0,0 +1,365 @@
+# jobs.py — cola de crawls del API: workers acotados, límite por tienda y fusión de pedidos iguales
+import json
+import logging
+import re
+import subprocess
+import threading
+import time
+import urllib.request
+import uuid
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+PENDIENTE = "pendiente"
+CORRIENDO = "corriendo"
+TERMINADO = "terminado"
+FALLIDO = "fallido"
+CANCELADO = "cancelado"
+FINALES = (TERMINADO, FALLIDO, CANCELADO)
+
+# Línea del volcado de stats de Scrapy al cerrar el spider
+_ITEMS_RE = re.compile(r"'item_scraped_count':\s*(\d+)")
+# Igual que extensions.PROGRESS_PREFIX (sin importar Scrapy en el API)
+_PROGRESS_PREFIX = "@@progreso "
+
+
+# Settings que un job puede cambiar (el daemon ignora cualquier otro)
+JOB_SETTINGS = ("HTTPCACHE_TTL",)
+
+
+class Job:
+    """Un crawl pedido al API: ``spider`` + argumentos (y ``settings`` de ``JOB_SETTINGS``),
+    con su estado y conteo de items."""
+
+    def __init__(self, spider, args, settings=None, max_events=2000):
+        self.id = uuid.uuid4().hex[:12]
+        self.spider = spider
+        self.args = dict(args)
+        self.settings = {k: v for k, v in dict(settings or {}).items() if k in JOB_SETTINGS}
+        self.estado = PENDIENTE
+        self.creado = time.time()
+        self.iniciado = None
+        self.terminado = None
+        self.items = None
+        self.codigo_salida = None
+        self.error = None
+        # Cuántos pedidos iguales se fusionaron en este job
+        self.pedidos = 1
+        self.cancelar = False
+        self.handle = None
+        # Eventos de avance numerados; se guardan los últimos para quien se conecte tarde
+        self.eventos = deque(maxlen=max_events)
+        self.seq = 0
+
+    @property
+    def tienda(self):
+        # walmart_mx y walmart_mx_graphql pegan al mismo sitio: comparten el límite
+        return self.spider.split("_")[0]
+
+    def add_event(self, event):
+        self.seq += 1
+        self.eventos.append((self.seq, event))
+        if event.get("tipo") in ("progreso", "fin") and event.get("items") is not None:
+            self.items = event["items"]
+        return self.seq
+
+    def events_after(self, seq):
+        return [(n, e) for n, e in self.eventos if n > seq]
+
+    def key(self):
+        return (self.spider, tuple(sorted(self.args.items())), tuple(sorted(self.settings.items())))
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "spider": self.spider,
+            "args": self.args,
+            "settings": self.settings,
+            "estado": self.estado,
+            "creado": self.creado,
+            "iniciado": self.iniciado,
+            "terminado": self.terminado,
+            "items": self.items,
+            "codigo_salida": self.codigo_salida,
+            "error": self.error,
+            "pedidos": self.pedidos,
+        }
+
+
+class DockerBackend:
+    """Corre cada job como ``docker run --rm <imagen> scrapy crawl ...``.
+
+    El comando se arma como lista de argumentos (sin shell), así que la
+    búsqueda del usuario nunca se interpreta como parte del comando.
+    """
+
+    def __init__(self, image="rivalwatch-app", docker="docker"):
+        self.image = image
+        self.docker = docker
+
+    def container_name(self, job):
+        return f"rivalwatch-{job.id}"
+
+    def command(self, job):
+        command = [self.docker, "run", "--rm", "--name", self.container_name(job), self.image,
+                   "scrapy", "crawl", job.spider]
+        for name, value in job.args.items():
+            command += ["-a", f"{name}={value}"]
+        for name, value in job.settings.items():
+            command += ["-s", f"{name}={value}"]
+        return command
+
+    def run(self, job, on_event):
+        if job.cancelar:
+            return None
+        process = subprocess.Popen(
+            self.command(job), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, encoding="utf-8", errors="replace",
+        )
+        job.handle = process
+        if job.cancelar:
+            # Se canceló mientras arrancaba: cancel() no tenía a quién detener
+            self.cancel(job)
+        for line in process.stdout:
+            if line.startswith(_PROGRESS_PREFIX):
+                try:
+                    on_event(json.loads(line[len(_PROGRESS_PREFIX):]))
+                except ValueError:
+                    pass
+                continue
+            match = _ITEMS_RE.search(line)
+            if match:
+                job.items = int(match.group(1))
+        return process.wait()
+
+    def cancel(self, job):
+        # Matar el cliente de docker no detiene el contenedor: se le pide a docker
+        # (si el contenedor todavía no existe, docker stop falla y queda terminar el cliente)
+        try:
+            result = subprocess.run([self.docker, "stop", self.container_name(job)],
+                                    capture_output=True, text=True, timeout=30)
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.strip() or f"docker stop salió con {result.returncode}")
+        except Exception as e:
+            logger.warning(f"No se pudo detener el contenedor del job {job.id}: {e}")
+            if job.handle is not None:
+                job.handle.terminate()
+
+
+class DaemonBackend:
+    """Manda cada job al daemon residente (``scrapy crawld``) y sigue su estado por HTTP.
+
+    No hay arranque de Python, Scrapy ni navegador por crawl: el daemon ya los
+    tiene levantados.
+    """
+
+    def __init__(self, url="http://127.0.0.1:6810", poll_interval=1.0, timeout=10.0):
+        self.url = url.rstrip("/")
+        self.poll_interval = float(poll_interval)
+        self.timeout = float(timeout)
+
+    def _call(self, method, path, data=None):
+        body = json.dumps(data).encode("utf-8") if data is not None else None
+        req = urllib.request.Request(self.url + path, data=body, method=method,
+                                     headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def run(self, job, on_event):
+        if job.cancelar:
+            return None
+        remote = self._call("POST", "/crawl", {"spider": job.spider, "args": job.args, "settings": job.settings})
+        job.handle = remote["id"]
+        if job.cancelar:
+            self.cancel(job)
+        seq = 0
+        while True:
+            time.sleep(self.poll_interval)
+            remote = self._call("GET", f"/crawl/{job.handle}/eventos?desde={seq}")
+            for seq, event in remote["eventos"]:
+                on_event(event)
+            job.items = remote.get("items")
+            if remote["estado"] in FINALES:
+                job.error = remote.get("error")
+                return 0 if remote["estado"] == TERMINADO else 1
+
+    def cancel(self, job):
+        if job.handle is None:
+            return
+        try:
+            self._call("POST", f"/crawl/{job.handle}/cancel")
+        except Exception as e:
+            logger.warning(f"No se pudo cancelar el job {job.id} en el daemon: {e}")
+
+
+class JobQueue:
+    """Cola en proceso con ``workers`` hilos y a lo más ``per_store`` crawls por tienda.
+
+    Un pedido igual (mismo spider y argumentos) a uno que sigue pendiente no
+    crea otro job: se devuelve el existente. Se guardan los últimos ``history``
+    jobs terminados para consultar su estado.
+    """
+
+    def __init__(self, backend, workers=2, per_store=1, history=500):
+        self.backend = backend
+        self.per_store = max(1, int(per_store))
+        self.history = max(1, int(history))
+        self.lock = threading.Condition()
+        self.pending = deque()
+        self.jobs = OrderedDict()
+        self.running = {}
+        self.closed = False
+        self.threads = []
+        for n in range(max(1, int(workers))):
+            thread = threading.Thread(target=self._worker, name=f"crawl-worker-{n}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, spider, args, settings=None):
+        """Encola un crawl; devuelve ``(job, nuevo)``."""
+        job = Job(spider, args, settings)
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("La cola de crawls se está cerrando")
+            for pending in self.pending:
+                if pending.key() == job.key():
+                    pending.pedidos += 1
+                    return pending, False
+            self.pending.append(job)
+            self.jobs[job.id] = job
+            self._trim()
+            self.lock.notify_all()
+        return job, True
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return list(reversed(self.jobs.values()))
+
+    def cancel(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.estado in FINALES:
+                return job
+            job.cancelar = True
+            if job.estado == PENDIENTE:
+                self.pending.remove(job)
+                self._finish(job, CANCELADO)
+                return job
+        # Corriendo: el worker marca el estado cuando el proceso termina
+        self.backend.cancel(job)
+        return job
+
+    def close(self, timeout=30.0):
+        """Apagado ordenado: no acepta jobs, cancela los pendientes y espera hasta
+        ``timeout`` segundos a los que corren; los que sigan corriendo se cancelan."""
+        with self.lock:
+            self.closed = True
+            for job in list(self.pending):
+                job.cancelar = True
+                self._finish(job, CANCELADO)
+            self.pending.clear()
+            deadline = time.monotonic() + timeout
+            while any(self.running.values()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.lock.wait(remaining)
+            running = [job for job in self.jobs.values() if job.estado == CORRIENDO]
+        for job in running:
+            logger.warning(f"Se cancela el job {job.id} ({job.spider}) por apagado del API")
+            job.cancelar = True
+            self.backend.cancel(job)
+
+    def publish(self, job, event):
+        with self.lock:
+            job.add_event(event)
+            self.lock.notify_all()
+
+    def wait_events(self, job, after, timeout=15.0):
+        """Eventos del job posteriores a ``after``; espera hasta ``timeout`` si no hay ninguno."""
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            while True:
+                events = job.events_after(after)
+                remaining = deadline - time.monotonic()
+                if events or job.estado in FINALES or remaining <= 0:
+                    return events
+                self.lock.wait(remaining)
+
+    def metrics(self):
+        with self.lock:
+            return {
+                "pendientes": len(self.pending),
+                "corriendo": sum(self.running.values()),
+                "por_tienda": {t: n for t, n in self.running.items() if n},
+                "workers": len(self.threads),
+                "por_tienda_max": self.per_store,
+            }
+
+    # ---- Internos -----------------------------------------------------------
+
+    def _next(self):
+        # El primer pendiente cuya tienda tenga lugar; los demás esperan su turno
+        for job in self.pending:
+            if self.running.get(job.tienda, 0) < self.per_store:
+                self.pending.remove(job)
+                return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self.lock:
+                job = self._next()
+                while job is None:
+                    self.lock.wait()
+                    job = self._next()
+                self.running[job.tienda] = self.running.get(job.tienda, 0) + 1
+                job.estado = CORRIENDO
+                job.iniciado = time.time()
+                job.add_event({"tipo": "estado", "estado": CORRIENDO})
+            try:
+                self._run(job)
+            finally:
+                with self.lock:
+                    self.running[job.tienda] -= 1
+                    self.lock.notify_all()
+
+    def _run(self, job):
+        try:
+            code = self.backend.run(job, lambda event: self.publish(job, event))
+        except Exception as e:
+            logger.error(f"Error al correr el job {job.id} ({job.spider}): {e}")
+            with self.lock:
+                job.error = str(e)
+                self._finish(job, FALLIDO)
+            return
+        with self.lock:
+            job.codigo_salida = code
+            if job.cancelar:
+                estado = CANCELADO
+            elif code == 0:
+                estado = TERMINADO
+                if job.items is None:
+                    job.items = 0
+            else:
+                estado = FALLIDO
+            self._finish(job, estado)
+
+    def _finish(self, job, estado):
+        # Se llama con el lock tomado
+        job.estado = estado
+        job.terminado = time.time()
+        job.handle = None
+        job.add_event({"tipo": "estado", "estado": estado, "items": job.items, "error": job.error})
+        self.lock.notify_all()
+
+    def _trim(self):
+        # Solo se olvidan jobs terminados, nunca uno pendiente o corriendo
+        excess = len(self.jobs) - self.history
+        for job_id in [i for i, j in self.jobs.items() if j.estado in FINALES][:max(0, excess)]:
+            del self.jobs[job_id]
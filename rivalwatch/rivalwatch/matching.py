@@ -0,0 +1,359 @@
+# matching.py — el mismo producto en distintas tiendas (para comparar precios cara a cara)
+import logging
+import math
+import re
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# Alias de unidad -> (unidad base, factor)
+UNIDADES = {
+    "kg": ("g", 1000), "kgs": ("g", 1000), "kilo": ("g", 1000), "kilos": ("g", 1000),
+    "kilogramo": ("g", 1000), "kilogramos": ("g", 1000),
+    "g": ("g", 1), "gr": ("g", 1), "grs": ("g", 1), "gramo": ("g", 1), "gramos": ("g", 1),
+    "mg": ("g", 0.001),
+    "oz": ("g", 28.35), "onza": ("g", 28.35), "onzas": ("g", 28.35),
+    "l": ("ml", 1000), "lt": ("ml", 1000), "lts": ("ml", 1000), "litro": ("ml", 1000), "litros": ("ml", 1000),
+    "ml": ("ml", 1), "mililitro": ("ml", 1), "mililitros": ("ml", 1), "cc": ("ml", 1),
+    "pz": ("pz", 1), "pza": ("pz", 1), "pzas": ("pz", 1), "pzs": ("pz", 1),
+    "pieza": ("pz", 1), "piezas": ("pz", 1),
+}
+
+# Contenido neto con paquete opcional: "1 kg", "6 x 355 ml", "6x355ml", "paquete con 4 de 1 l"
+_CANTIDAD_RE = re.compile(
+    r"(?<![a-z0-9.,])(?:(\d+)\s*(?:x|de|con)\s*)?(\d+(?:[.,]\d+)?)\s*("
+    + "|".join(sorted(map(re.escape, UNIDADES), key=len, reverse=True))
+    + r")(?![a-z0-9])"
+)
+
+# Marcas de varias palabras se vuelven un solo token ("tres estrellas" -> "tres_estrellas")
+MARCAS = (
+    "maseca", "minsa", "selecta", "tres estrellas", "la moderna", "barilla", "nestle", "nescafe",
+    "carnation", "nido", "lala", "alpura", "santa clara", "danone", "yoplait", "philadelphia",
+    "bimbo", "marinela", "tia rosa", "gamesa", "sabritas", "barcel", "kelloggs", "quaker",
+    "coca cola", "pepsi", "jumex", "del valle", "penafiel", "bonafont", "herdez", "la costena",
+    "clemente jacques", "mccormick", "knorr", "la sierra", "isadora", "verde valle", "schettino",
+    "fud", "san rafael", "zwan", "kir", "great value", "members mark", "hill country fare", "heb",
+    "soriana", "colgate", "palmolive", "ariel", "downy", "suavitel", "fabuloso", "pinol", "cloralex",
+    "zote", "roma", "nutrioli", "capullo", "precissimo", "sello rojo",
+)
+
+# Palabras que no distinguen un producto de otro
+STOPWORDS = frozenset((
+    "de", "del", "la", "las", "el", "los", "con", "sin", "en", "y", "para", "por", "a", "al",
+    "e", "o", "u", "un", "una", "x", "paquete", "pack", "bolsa", "caja", "botella", "lata",
+    "frasco", "envase", "sobre", "presentacion", "contenido", "neto", "aprox",
+))
+
+
+def _ascii(text):
+    # Sin acentos ni puntuación ("Coca-Cola" == "coca cola"); el punto y la coma decimales se quedan
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return re.sub(r"[^a-z0-9.,]+|[.,](?!\d)", " ", text)
+
+
+def _marca_re():
+    alias = sorted((_ascii(m) for m in MARCAS), key=len, reverse=True)
+    return re.compile(r"(?<![a-z0-9])(" + "|".join(re.escape(a) for a in alias) + r")(?![a-z0-9])")
+
+
+_MARCA_RE = _marca_re()
+
+
+def _stem(token):
+    # Plural simple: "galletas" == "galleta"; números y palabras cortas quedan igual
+    if len(token) > 3 and token.endswith("s") and not token[-2].isdigit():
+        return token[:-1]
+    return token
+
+
+def parse_unit(text):
+    """Contenido neto en unidad base: ``"Harina 1 kg"`` -> ``(1000.0, "g")``; ``"6 x 355 ml"`` -> ``(2130.0, "ml")``."""
+    text = _ascii(text)
+    for match in _CANTIDAD_RE.finditer(text):
+        base, factor = UNIDADES[match.group(3)]
+        cantidad = float(match.group(2).replace(",", ".")) * factor
+        if match.group(1) and base != "pz":
+            cantidad *= int(match.group(1))
+        if cantidad > 0:
+            return round(cantidad, 2), base
+    return None
+
+
+def format_unit(unit):
+    return f"{unit[0]:g}{unit[1]}" if unit else None
+
+
+def read_unit(text):
+    match = re.fullmatch(r"([\d.]+)([a-z]+)", text or "")
+    return (float(match.group(1)), match.group(2)) if match else None
+
+
+class Signature:
+    """Título normalizado: tokens distintivos, contenido neto y marca."""
+
+    __slots__ = ("tokens", "unidad", "marca")
+
+    def __init__(self, tokens, unidad=None, marca=None):
+        self.tokens = tuple(tokens)
+        self.unidad = unidad
+        self.marca = marca
+
+    def trigrams(self):
+        text = " " + " ".join(self.tokens) + " "
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def normalize_marca(marca):
+    """Marca como token: ``"Coca-Cola®"`` -> ``coca_cola``; ``None`` si viene vacía."""
+    marca = "_".join(_ascii(marca).replace(".", " ").replace(",", " ").split())
+    return marca[:100] or None
+
+
+def normalize_title(titulo, marca=None):
+    """``"Harina de Trigo SELECTA 1 Kg."`` -> tokens ``(harina, trigo, selecta)``, ``1000g``, marca ``selecta``.
+
+    La ``marca`` que reporta la tienda gana sobre la que se reconoce en el título (``MARCAS``).
+    """
+    text = _ascii(titulo)
+    unidad = parse_unit(text)
+    # La cantidad ya está en la firma; como token solo estorba ("1" vs "1000")
+    text = _CANTIDAD_RE.sub(" ", text)
+    marcas = [m.replace(" ", "_") for m in _MARCA_RE.findall(text)]
+    text = _MARCA_RE.sub(lambda m: " " + m.group(1).replace(" ", "_") + " ", text)
+    tokens = []
+    for token in re.findall(r"[a-z0-9_]+", text):
+        if token in STOPWORDS or (len(token) < 2 and not token.isdigit()):
+            continue
+        token = _stem(token)
+        if token not in tokens:
+            tokens.append(token[:100])
+    return Signature(tokens, format_unit(unidad), normalize_marca(marca) or (marcas[0] if marcas else None))
+
+
+def same_unit(a, b, tolerance=0.02):
+    """Dos contenidos netos compatibles; si alguno no se conoce no se descarta el par."""
+    a, b = read_unit(a), read_unit(b)
+    if a is None or b is None:
+        return True
+    return a[1] == b[1] and abs(a[0] - b[0]) <= tolerance * max(a[0], b[0])
+
+
+def similarity(a, b, idf, default_idf):
+    """Jaccard de tokens pesado por IDF (80 %) más Jaccard de trigramas (20 %).
+
+    La marca y el contenido neto son filtros, no puntos: "Maseca 1 kg" y
+    "Maseca 4 kg" no son el mismo producto aunque el texto casi coincida.
+    """
+    if a.marca and b.marca and a.marca != b.marca:
+        return 0.0
+    if not same_unit(a.unidad, b.unidad):
+        return 0.0
+    ta, tb = set(a.tokens), set(b.tokens)
+    union = ta | tb
+    if not union:
+        return 0.0
+    peso = sum(idf.get(t, default_idf) for t in ta & tb) / sum(idf.get(t, default_idf) for t in union)
+    ga, gb = a.trigrams(), b.trigrams()
+    return 0.8 * peso + 0.2 * (len(ga & gb) / len(ga | gb) if ga | gb else 0.0)
+
+
+def store_of(tienda):
+    # Igual que jobs.Job.tienda: walmart_mx y walmart_mx_graphql son la misma tienda
+    return str(tienda).split("_")[0]
+
+
+# PRODUCTO_T.HASH también cambia con el precio; para el matching solo importan título y
+# marca (sin marca el hash es el del título solo, como antes de la migración 0006)
+STALE_QUERY = """
+    SELECT TOP (?) p.ID_PRODUCTO, p.TIENDA, p.TITULO, p.MARCA, h.HASH
+    FROM PRODUCTO_T p
+    CROSS APPLY (SELECT CONVERT(CHAR(32), HASHBYTES('MD5', p.TITULO + COALESCE(NCHAR(31) + p.MARCA, '')), 2) AS HASH) h
+    LEFT JOIN PRODUCTO_INDICE_T i ON i.ID_PRODUCTO = p.ID_PRODUCTO
+    WHERE p.TITULO IS NOT NULL AND (i.ID_PRODUCTO IS NULL OR i.HASH <> h.HASH)
+    ORDER BY p.ID_PRODUCTO
+"""
+
+UPSERT_SIGNATURE_QUERY = """
+    MERGE PRODUCTO_INDICE_T AS t
+    USING (SELECT ? AS ID_PRODUCTO, ? AS TIENDA, ? AS HASH, ? AS TOKENS, ? AS UNIDAD, ? AS MARCA) AS s
+        ON t.ID_PRODUCTO = s.ID_PRODUCTO
+    WHEN MATCHED THEN
+        UPDATE SET TIENDA = s.TIENDA, HASH = s.HASH, TOKENS = s.TOKENS, UNIDAD = s.UNIDAD,
+                   MARCA = s.MARCA, INDEXADO = SYSDATETIME()
+    WHEN NOT MATCHED THEN
+        INSERT (ID_PRODUCTO, TIENDA, HASH, TOKENS, UNIDAD, MARCA, INDEXADO)
+        VALUES (s.ID_PRODUCTO, s.TIENDA, s.HASH, s.TOKENS, s.UNIDAD, s.MARCA, SYSDATETIME());
+"""
+
+
+class Matcher:
+    """Agrupa productos de distintas tiendas, de forma incremental.
+
+    Solo se procesan productos nuevos o cuyo título cambió desde que se
+    indexaron. Los candidatos salen del índice invertido ``PRODUCTO_TOKEN_T``
+    (productos de otras tiendas que comparten algún token poco común), así que
+    cada producto se compara contra unas decenas de candidatos y no contra todo
+    el catálogo. Cada grupo tiene a lo más un producto por tienda.
+    """
+
+    def __init__(self, cursor, threshold=0.55, candidates=50, max_df=0.05):
+        self.cursor = cursor
+        self.threshold = float(threshold)
+        self.candidates = int(candidates)
+        # Tokens presentes en más de esta fracción del catálogo no generan candidatos
+        self.max_df = float(max_df)
+        self.stats = {"indexados": 0, "asignados": 0, "grupos_nuevos": 0}
+        self.total = 1
+
+    def update(self, batch_size=500, limit=None):
+        """Indexa y agrupa lo pendiente; devuelve las estadísticas de la corrida."""
+        cursor = self.cursor
+        while limit is None or self.stats["indexados"] < limit:
+            size = batch_size if limit is None else min(batch_size, limit - self.stats["indexados"])
+            # Dos crawls que cierran a la vez no deben indexar el mismo producto
+            cursor.execute("EXEC sp_getapplock @Resource = 'rivalwatch_matching', @LockMode = 'Exclusive', "
+                           "@LockOwner = 'Transaction', @LockTimeout = 60000")
+            rows = cursor.execute(STALE_QUERY, (size,)).fetchall()
+            if not rows:
+                cursor.connection.commit()
+                break
+            self.total = cursor.execute("SELECT COUNT(*) FROM PRODUCTO_INDICE_T").fetchone()[0] + len(rows)
+            # Primero se indexa todo el lote para que sus productos se vean entre sí
+            pendientes = []
+            for id_producto, tienda, titulo, marca, digest in rows:
+                signature = normalize_title(titulo, marca)
+                self._index(id_producto, store_of(tienda), digest, signature)
+                pendientes.append((id_producto, store_of(tienda), signature))
+            for id_producto, tienda, signature in pendientes:
+                self._assign(id_producto, tienda, signature)
+            self._prune()
+            cursor.connection.commit()
+            self.stats["indexados"] += len(rows)
+        return self.stats
+
+    def rebuild(self):
+        """Descarta índice y grupos; el siguiente ``update`` procesa el catálogo completo."""
+        for table in ("GRUPO_PRODUCTO_T", "GRUPO_T", "PRODUCTO_TOKEN_T", "PRODUCTO_INDICE_T"):
+            self.cursor.execute(f"DELETE FROM {table}")
+        self.cursor.connection.commit()
+
+    def _index(self, id_producto, tienda, digest, signature):
+        cursor = self.cursor
+        # Un título que cambió puede ser otro producto: sale de su grupo y se vuelve a emparejar
+        cursor.execute("DELETE FROM GRUPO_PRODUCTO_T WHERE ID_PRODUCTO = ?", (id_producto,))
+        cursor.execute("DELETE FROM PRODUCTO_TOKEN_T WHERE ID_PRODUCTO = ?", (id_producto,))
+        if signature.tokens:
+            cursor.executemany(
+                "INSERT INTO PRODUCTO_TOKEN_T (TOKEN, ID_PRODUCTO, TIENDA) VALUES (?, ?, ?)",
+                [(token, id_producto, tienda) for token in signature.tokens],
+            )
+        cursor.execute(UPSERT_SIGNATURE_QUERY, (id_producto, tienda, digest, " ".join(signature.tokens)[:1000],
+                                                signature.unidad, signature.marca))
+
+    def _idf(self, tokens):
+        cursor = self.cursor
+        total = max(1, self.total)
+        marks = ", ".join("?" * len(tokens))
+        rows = cursor.execute(
+            f"SELECT TOKEN, COUNT(*) FROM PRODUCTO_TOKEN_T WHERE TOKEN IN ({marks}) GROUP BY TOKEN",
+            tuple(tokens),
+        ).fetchall()
+        df = {token: n for token, n in rows}
+        idf = {token: math.log(1 + total / df.get(token, 1)) for token in tokens}
+        return idf, df, total
+
+    def _candidates(self, id_producto, tienda, signature):
+        """Productos de otras tiendas que comparten tokens distintivos, con su firma y grupo."""
+        cursor = self.cursor
+        idf, df, total = self._idf(signature.tokens)
+        # Los dos tokens más raros siempre cuentan, aunque el catálogo sea chico
+        por_rareza = sorted(signature.tokens, key=lambda t: df.get(t, 0))
+        raros = por_rareza[:2] + [t for t in por_rareza[2:] if df.get(t, 0) <= self.max_df * total]
+        marks = ", ".join("?" * len(raros))
+        rows = cursor.execute(f"""
+            SELECT TOP (?) t.ID_PRODUCTO
+            FROM PRODUCTO_TOKEN_T t
+            WHERE t.TOKEN IN ({marks}) AND t.TIENDA <> ? AND t.ID_PRODUCTO <> ?
+            GROUP BY t.ID_PRODUCTO
+            ORDER BY COUNT(*) DESC, t.ID_PRODUCTO
+        """, (self.candidates, *raros, tienda, id_producto)).fetchall()
+        if not rows:
+            return [], idf
+        ids = [row[0] for row in rows]
+        marks = ", ".join("?" * len(ids))
+        rows = cursor.execute(f"""
+            SELECT i.ID_PRODUCTO, i.TIENDA, i.TOKENS, i.UNIDAD, i.MARCA, g.ID_GRUPO
+            FROM PRODUCTO_INDICE_T i
+            LEFT JOIN GRUPO_PRODUCTO_T g ON g.ID_PRODUCTO = i.ID_PRODUCTO
+            WHERE i.ID_PRODUCTO IN ({marks})
+        """, tuple(ids)).fetchall()
+        # Los tokens de los candidatos que no venían en el producto también pesan en la unión
+        otros = {t for row in rows for t in row[2].split()} - set(idf)
+        if otros:
+            idf.update(self._idf(sorted(otros))[0])
+        return rows, idf
+
+    def _assign(self, id_producto, tienda, signature):
+        cursor = self.cursor
+        if not signature.tokens:
+            return
+        # Pudo quedar agrupado como candidato de otro producto del mismo lote
+        if cursor.execute("SELECT COUNT(*) FROM GRUPO_PRODUCTO_T WHERE ID_PRODUCTO = ?",
+                          (id_producto,)).fetchone()[0]:
+            return
+        rows, idf = self._candidates(id_producto, tienda, signature)
+        default_idf = max(idf.values(), default=1.0)
+        scored = []
+        for candidato, otra_tienda, tokens, unidad, marca, grupo in rows:
+            score = similarity(signature, Signature(tokens.split(), unidad, marca), idf, default_idf)
+            if score >= self.threshold:
+                scored.append((score, candidato, otra_tienda, grupo))
+        for score, candidato, otra_tienda, grupo in sorted(scored, key=lambda s: (-s[0], s[1])):
+            if grupo is None:
+                grupo = self._new_group(signature)
+                self._link(grupo, candidato, otra_tienda, score)
+            elif cursor.execute("SELECT COUNT(*) FROM GRUPO_PRODUCTO_T WHERE ID_GRUPO = ? AND TIENDA = ?",
+                                (grupo, tienda)).fetchone()[0]:
+                # El grupo ya tiene su producto de esta tienda
+                continue
+            self._link(grupo, id_producto, tienda, score)
+            self.stats["asignados"] += 1
+            return
+
+    def _new_group(self, signature):
+        row = self.cursor.execute(
+            "INSERT INTO GRUPO_T (NOMBRE, UNIDAD, CREADO) OUTPUT INSERTED.ID_GRUPO VALUES (?, ?, SYSDATETIME())",
+            (" ".join(signature.tokens)[:1000], signature.unidad),
+        ).fetchone()
+        self.stats["grupos_nuevos"] += 1
+        return row[0]
+
+    def _link(self, grupo, id_producto, tienda, score):
+        self.cursor.execute(
+            "INSERT INTO GRUPO_PRODUCTO_T (ID_PRODUCTO, ID_GRUPO, TIENDA, SCORE, ASIGNADO) "
+            "VALUES (?, ?, ?, ?, SYSDATETIME())",
+            (id_producto, grupo, tienda, round(score, 4)),
+        )
+
+    def _prune(self):
+        # Un producto que cambió de título puede dejar grupos de uno o vacíos
+        self.cursor.execute("""
+            DELETE FROM GRUPO_PRODUCTO_T WHERE ID_GRUPO IN (
+                SELECT ID_GRUPO FROM GRUPO_PRODUCTO_T GROUP BY ID_GRUPO HAVING COUNT(*) < 2);
+            DELETE g FROM GRUPO_T g
+            WHERE NOT EXISTS (SELECT 1 FROM GRUPO_PRODUCTO_T p WHERE p.ID_GRUPO = g.ID_GRUPO);
+        """)
+
+
+def update_matches(connection, threshold=0.55, batch_size=500, limit=None):
+    """Punto de entrada para el pipeline y ``scrapy match``."""
+    cursor = connection.cursor()
+    try:
+        stats = Matcher(cursor, threshold=threshold).update(batch_size=batch_size, limit=limit)
+    finally:
+        cursor.close()
+    logger.info(f"Matching: {stats['indexados']} productos indexados, {stats['asignados']} asignados "
+                f"a grupos, {stats['grupos_nuevos']} grupos nuevos")
+    return stats
@@ -0,0 +1,23 @@
+-- Línea base: PRODUCTOS_T con las columnas de escrituras solo-de-cambios.
+-- Todo es condicional porque en bases existentes la tabla (y a veces las
+-- columnas, agregadas por versiones anteriores del pipeline) ya existen.
+IF OBJECT_ID('PRODUCTOS_T') IS NULL
+    CREATE TABLE PRODUCTOS_T (
+        ID_PROD INT IDENTITY(1, 1) NOT NULL PRIMARY KEY,
+        TITULOS_PROD NVARCHAR(1000) NULL,
+        PRECIO_PROD DECIMAL(18, 2) NULL,
+        URL_IMG_PROD NVARCHAR(2000) NULL,
+        TIENDA_PROD NVARCHAR(100) NULL,
+        FECHA_SCRAPING_PROD DATETIME NOT NULL DEFAULT GETDATE()
+    );
+GO
+IF COL_LENGTH('PRODUCTOS_T', 'CLAVE_PROD') IS NULL
+    ALTER TABLE PRODUCTOS_T ADD CLAVE_PROD NVARCHAR(450) NULL;
+IF COL_LENGTH('PRODUCTOS_T', 'HASH_PROD') IS NULL
+    ALTER TABLE PRODUCTOS_T ADD HASH_PROD CHAR(32) NULL;
+IF COL_LENGTH('PRODUCTOS_T', 'ULTIMA_VEZ_PROD') IS NULL
+    ALTER TABLE PRODUCTOS_T ADD ULTIMA_VEZ_PROD DATETIME2 NULL;
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_PRODUCTOS_TIENDA_CLAVE')
+    CREATE UNIQUE INDEX UX_PRODUCTOS_TIENDA_CLAVE
+        ON PRODUCTOS_T (TIENDA_PROD, CLAVE_PROD) WHERE CLAVE_PROD IS NOT NULL;
@@ -0,0 +1,92 @@
+-- Esquema normalizado:
+--   PRODUCTO_T       dimensión: un renglón por (tienda, sku/url) con título e imagen
+--   PRECIO_T         hechos compactos: solo (producto, fecha, precio) y solo cuando el precio cambia
+--   PRECIO_ACTUAL_T  snapshot del último precio, lo que consulta el dashboard
+CREATE TABLE PRODUCTO_T (
+    ID_PRODUCTO INT IDENTITY(1, 1) NOT NULL,
+    TIENDA NVARCHAR(100) NOT NULL,
+    CLAVE NVARCHAR(450) NOT NULL,
+    SKU NVARCHAR(100) NULL,
+    URL NVARCHAR(2000) NULL,
+    TITULO NVARCHAR(1000) NOT NULL,
+    URL_IMG NVARCHAR(2000) NULL,
+    HASH CHAR(32) NOT NULL,
+    PRIMERA_VEZ DATETIME2(0) NOT NULL,
+    ULTIMA_VEZ DATETIME2(0) NOT NULL,
+    CONSTRAINT PK_PRODUCTO PRIMARY KEY CLUSTERED (ID_PRODUCTO),
+    CONSTRAINT UX_PRODUCTO_TIENDA_CLAVE UNIQUE (TIENDA, CLAVE)
+);
+GO
+CREATE TABLE PRECIO_T (
+    ID_PRODUCTO INT NOT NULL,
+    FECHA DATETIME2(0) NOT NULL,
+    PRECIO DECIMAL(18, 2) NOT NULL,
+    CONSTRAINT FK_PRECIO_PRODUCTO FOREIGN KEY (ID_PRODUCTO) REFERENCES PRODUCTO_T (ID_PRODUCTO)
+);
+-- El historial de un producto se lee siempre por producto y rango de fechas
+CREATE CLUSTERED INDEX CX_PRECIO_PRODUCTO_FECHA ON PRECIO_T (ID_PRODUCTO, FECHA);
+GO
+CREATE TABLE PRECIO_ACTUAL_T (
+    ID_PRODUCTO INT NOT NULL,
+    TIENDA NVARCHAR(100) NOT NULL,
+    PRECIO DECIMAL(18, 2) NOT NULL,
+    FECHA_CAMBIO DATETIME2(0) NOT NULL,
+    ULTIMA_VEZ DATETIME2(0) NOT NULL,
+    CONSTRAINT PK_PRECIO_ACTUAL PRIMARY KEY CLUSTERED (ID_PRODUCTO),
+    CONSTRAINT FK_PRECIO_ACTUAL_PRODUCTO FOREIGN KEY (ID_PRODUCTO) REFERENCES PRODUCTO_T (ID_PRODUCTO)
+);
+-- Índices para el dashboard: lo más reciente primero, en general y por tienda.
+-- Con TOP/keyset sobre estos índices la lectura cuesta lo que mide la página.
+CREATE INDEX IX_PRECIO_ACTUAL_ULTIMA_VEZ
+    ON PRECIO_ACTUAL_T (ULTIMA_VEZ DESC, ID_PRODUCTO DESC) INCLUDE (TIENDA, PRECIO);
+CREATE INDEX IX_PRECIO_ACTUAL_TIENDA_ULTIMA_VEZ
+    ON PRECIO_ACTUAL_T (TIENDA, ULTIMA_VEZ DESC, ID_PRODUCTO DESC) INCLUDE (PRECIO);
+CREATE INDEX IX_PRECIO_ACTUAL_PRECIO
+    ON PRECIO_ACTUAL_T (PRECIO) INCLUDE (TIENDA, ULTIMA_VEZ);
+GO
+-- Carga inicial desde PRODUCTOS_T. Las filas viejas sin CLAVE_PROD se identifican por título.
+WITH origen AS (
+    SELECT
+        TIENDA_PROD AS TIENDA,
+        COALESCE(CLAVE_PROD, LEFT(TITULOS_PROD, 450)) AS CLAVE,
+        TITULOS_PROD, PRECIO_PROD, URL_IMG_PROD, HASH_PROD,
+        FECHA_SCRAPING_PROD,
+        COALESCE(ULTIMA_VEZ_PROD, FECHA_SCRAPING_PROD) AS ULTIMA_VEZ
+    FROM PRODUCTOS_T
+    WHERE TIENDA_PROD IS NOT NULL AND TITULOS_PROD IS NOT NULL AND PRECIO_PROD IS NOT NULL
+),
+ordenado AS (
+    SELECT *,
+        ROW_NUMBER() OVER (PARTITION BY TIENDA, CLAVE ORDER BY ULTIMA_VEZ DESC) AS rn,
+        MIN(FECHA_SCRAPING_PROD) OVER (PARTITION BY TIENDA, CLAVE) AS PRIMERA_VEZ
+    FROM origen
+)
+INSERT INTO PRODUCTO_T (TIENDA, CLAVE, TITULO, URL_IMG, HASH, PRIMERA_VEZ, ULTIMA_VEZ)
+SELECT TIENDA, CLAVE, TITULOS_PROD, URL_IMG_PROD,
+       COALESCE(HASH_PROD, REPLICATE('0', 32)), PRIMERA_VEZ, ULTIMA_VEZ
+FROM ordenado
+WHERE rn = 1;
+GO
+-- Historial: cada cambio de precio de PRODUCTOS_T como un hecho
+WITH origen AS (
+    SELECT p.ID_PRODUCTO, v.FECHA_SCRAPING_PROD AS FECHA, v.PRECIO_PROD AS PRECIO,
+           LAG(v.PRECIO_PROD) OVER (PARTITION BY p.ID_PRODUCTO ORDER BY v.FECHA_SCRAPING_PROD) AS ANTERIOR
+    FROM PRODUCTOS_T v
+    JOIN PRODUCTO_T p
+      ON p.TIENDA = v.TIENDA_PROD AND p.CLAVE = COALESCE(v.CLAVE_PROD, LEFT(v.TITULOS_PROD, 450))
+    WHERE v.PRECIO_PROD IS NOT NULL
+)
+INSERT INTO PRECIO_T (ID_PRODUCTO, FECHA, PRECIO)
+SELECT ID_PRODUCTO, FECHA, PRECIO
+FROM origen
+WHERE ANTERIOR IS NULL OR ANTERIOR <> PRECIO;
+GO
+WITH ultimo AS (
+    SELECT ID_PRODUCTO, FECHA, PRECIO,
+           ROW_NUMBER() OVER (PARTITION BY ID_PRODUCTO ORDER BY FECHA DESC) AS rn
+    FROM PRECIO_T
+)
+INSERT INTO PRECIO_ACTUAL_T (ID_PRODUCTO, TIENDA, PRECIO, FECHA_CAMBIO, ULTIMA_VEZ)
+SELECT p.ID_PRODUCTO, p.TIENDA, u.PRECIO, u.FECHA, p.ULTIMA_VEZ
+FROM PRODUCTO_T p
+JOIN ultimo u ON u.ID_PRODUCTO = p.ID_PRODUCTO AND u.rn = 1;
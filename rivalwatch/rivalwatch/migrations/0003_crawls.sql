@@ -0,0 +1,25 @@
+-- Registro de crawls, para no repetir una búsqueda que se hizo hace poco:
+--   CRAWL_T           un renglón por crawl terminado: tienda, búsqueda normalizada, cuándo y cuántos items
+--   CRAWL_PRODUCTO_T  qué productos devolvió cada crawl (para responder sin volver a crawlear)
+CREATE TABLE CRAWL_T (
+    ID_CRAWL CHAR(32) NOT NULL,
+    TIENDA NVARCHAR(100) NOT NULL,
+    CONSULTA NVARCHAR(400) NOT NULL,
+    MAX_PRODUCTOS INT NULL,
+    INICIO DATETIME2(0) NOT NULL,
+    FIN DATETIME2(0) NOT NULL,
+    ITEMS INT NOT NULL,
+    RAZON NVARCHAR(100) NOT NULL,
+    CONSTRAINT PK_CRAWL PRIMARY KEY CLUSTERED (ID_CRAWL)
+);
+-- La consulta de frescura busca el último crawl de una (tienda, búsqueda)
+CREATE INDEX IX_CRAWL_TIENDA_CONSULTA_FIN
+    ON CRAWL_T (TIENDA, CONSULTA, FIN DESC)
+    INCLUDE (MAX_PRODUCTOS, ITEMS, RAZON);
+GO
+CREATE TABLE CRAWL_PRODUCTO_T (
+    ID_CRAWL CHAR(32) NOT NULL,
+    ID_PRODUCTO INT NOT NULL,
+    CONSTRAINT PK_CRAWL_PRODUCTO PRIMARY KEY CLUSTERED (ID_CRAWL, ID_PRODUCTO),
+    CONSTRAINT FK_CRAWL_PRODUCTO_PRODUCTO FOREIGN KEY (ID_PRODUCTO) REFERENCES PRODUCTO_T (ID_PRODUCTO)
+);
@@ -0,0 +1,62 @@
+-- Rollups de precio por producto, mantenidos por el pipeline en cada lote:
+--   PRECIO_DIA_T     un renglón por (producto, día)
+--   PRECIO_SEMANA_T  un renglón por (producto, semana que empieza en lunes)
+-- Guardan mínimo, máximo, suma y conteo (promedio = SUMA / OBSERVACIONES) y el
+-- último precio visto en el bucket, así que se actualizan sin releer el historial.
+CREATE TABLE PRECIO_DIA_T (
+    ID_PRODUCTO INT NOT NULL,
+    DIA DATE NOT NULL,
+    TIENDA NVARCHAR(100) NOT NULL,
+    PRECIO_MIN DECIMAL(18, 2) NOT NULL,
+    PRECIO_MAX DECIMAL(18, 2) NOT NULL,
+    SUMA DECIMAL(28, 2) NOT NULL,
+    OBSERVACIONES INT NOT NULL,
+    PRECIO_ULTIMO DECIMAL(18, 2) NOT NULL,
+    ULTIMA_FECHA DATETIME2(0) NOT NULL,
+    CONSTRAINT PK_PRECIO_DIA PRIMARY KEY CLUSTERED (ID_PRODUCTO, DIA),
+    CONSTRAINT FK_PRECIO_DIA_PRODUCTO FOREIGN KEY (ID_PRODUCTO) REFERENCES PRODUCTO_T (ID_PRODUCTO)
+);
+GO
+CREATE TABLE PRECIO_SEMANA_T (
+    ID_PRODUCTO INT NOT NULL,
+    SEMANA DATE NOT NULL,
+    TIENDA NVARCHAR(100) NOT NULL,
+    PRECIO_MIN DECIMAL(18, 2) NOT NULL,
+    PRECIO_MAX DECIMAL(18, 2) NOT NULL,
+    SUMA DECIMAL(28, 2) NOT NULL,
+    OBSERVACIONES INT NOT NULL,
+    PRECIO_ULTIMO DECIMAL(18, 2) NOT NULL,
+    ULTIMA_FECHA DATETIME2(0) NOT NULL,
+    CONSTRAINT PK_PRECIO_SEMANA PRIMARY KEY CLUSTERED (ID_PRODUCTO, SEMANA),
+    CONSTRAINT FK_PRECIO_SEMANA_PRODUCTO FOREIGN KEY (ID_PRODUCTO) REFERENCES PRODUCTO_T (ID_PRODUCTO)
+);
+GO
+-- Carga inicial desde PRECIO_T. Ahí solo están los cambios de precio, así que el
+-- conteo de observaciones del pasado es aproximado; mínimo, máximo y último son exactos.
+WITH origen AS (
+    SELECT o.ID_PRODUCTO, p.TIENDA, CAST(o.FECHA AS DATE) AS DIA, o.FECHA, o.PRECIO,
+           ROW_NUMBER() OVER (PARTITION BY o.ID_PRODUCTO, CAST(o.FECHA AS DATE) ORDER BY o.FECHA DESC) AS rn
+    FROM PRECIO_T o
+    JOIN PRODUCTO_T p ON p.ID_PRODUCTO = o.ID_PRODUCTO
+)
+INSERT INTO PRECIO_DIA_T (ID_PRODUCTO, DIA, TIENDA, PRECIO_MIN, PRECIO_MAX, SUMA, OBSERVACIONES, PRECIO_ULTIMO, ULTIMA_FECHA)
+SELECT ID_PRODUCTO, DIA, MIN(TIENDA), MIN(PRECIO), MAX(PRECIO), SUM(PRECIO), COUNT(*),
+       MAX(CASE WHEN rn = 1 THEN PRECIO END), MAX(FECHA)
+FROM origen
+GROUP BY ID_PRODUCTO, DIA;
+GO
+-- 1900-01-01 fue lunes: restar (días desde esa fecha) % 7 da el lunes de la semana
+WITH origen AS (
+    SELECT ID_PRODUCTO, TIENDA, DATEADD(DAY, -(DATEDIFF(DAY, '19000101', DIA) % 7), DIA) AS SEMANA,
+           DIA, PRECIO_MIN, PRECIO_MAX, SUMA, OBSERVACIONES, PRECIO_ULTIMO, ULTIMA_FECHA
+    FROM PRECIO_DIA_T
+),
+ordenado AS (
+    SELECT *, ROW_NUMBER() OVER (PARTITION BY ID_PRODUCTO, SEMANA ORDER BY ULTIMA_FECHA DESC) AS rn
+    FROM origen
+)
+INSERT INTO PRECIO_SEMANA_T (ID_PRODUCTO, SEMANA, TIENDA, PRECIO_MIN, PRECIO_MAX, SUMA, OBSERVACIONES, PRECIO_ULTIMO, ULTIMA_FECHA)
+SELECT ID_PRODUCTO, SEMANA, MIN(TIENDA), MIN(PRECIO_MIN), MAX(PRECIO_MAX), SUM(SUMA), SUM(OBSERVACIONES),
+       MAX(CASE WHEN rn = 1 THEN PRECIO_ULTIMO END), MAX(ULTIMA_FECHA)
+FROM ordenado
+GROUP BY ID_PRODUCTO, SEMANA;
@@ -0,0 +1,45 @@
+-- Matching entre tiendas (ver rivalwatch/matching.py):
+--   PRODUCTO_INDICE_T  firma normalizada de cada producto (tokens, unidad, marca) y el hash del título indexado
+--   PRODUCTO_TOKEN_T   índice invertido token -> productos; los candidatos salen de aquí, no de comparar todo contra todo
+--   GRUPO_T            un grupo = el mismo producto en distintas tiendas
+--   GRUPO_PRODUCTO_T   a qué grupo pertenece cada producto (a lo más uno por tienda en cada grupo)
+CREATE TABLE PRODUCTO_INDICE_T (
+    ID_PRODUCTO INT NOT NULL,
+    TIENDA NVARCHAR(100) NOT NULL,
+    HASH CHAR(32) NOT NULL,
+    TOKENS NVARCHAR(1000) NOT NULL,
+    UNIDAD NVARCHAR(50) NULL,
+    MARCA NVARCHAR(100) NULL,
+    INDEXADO DATETIME2(0) NOT NULL,
+    CONSTRAINT PK_PRODUCTO_INDICE PRIMARY KEY CLUSTERED (ID_PRODUCTO),
+    CONSTRAINT FK_PRODUCTO_INDICE_PRODUCTO FOREIGN KEY (ID_PRODUCTO) REFERENCES PRODUCTO_T (ID_PRODUCTO)
+);
+GO
+CREATE TABLE PRODUCTO_TOKEN_T (
+    TOKEN NVARCHAR(100) NOT NULL,
+    ID_PRODUCTO INT NOT NULL,
+    TIENDA NVARCHAR(100) NOT NULL,
+    -- Clustered por token: cada lista de postings es un rango contiguo
+    CONSTRAINT PK_PRODUCTO_TOKEN PRIMARY KEY CLUSTERED (TOKEN, ID_PRODUCTO)
+);
+CREATE INDEX IX_PRODUCTO_TOKEN_PRODUCTO ON PRODUCTO_TOKEN_T (ID_PRODUCTO);
+GO
+CREATE TABLE GRUPO_T (
+    ID_GRUPO INT IDENTITY(1, 1) NOT NULL,
+    NOMBRE NVARCHAR(1000) NOT NULL,
+    UNIDAD NVARCHAR(50) NULL,
+    CREADO DATETIME2(0) NOT NULL,
+    CONSTRAINT PK_GRUPO PRIMARY KEY CLUSTERED (ID_GRUPO)
+);
+GO
+CREATE TABLE GRUPO_PRODUCTO_T (
+    ID_PRODUCTO INT NOT NULL,
+    ID_GRUPO INT NOT NULL,
+    TIENDA NVARCHAR(100) NOT NULL,
+    SCORE DECIMAL(5, 4) NOT NULL,
+    ASIGNADO DATETIME2(0) NOT NULL,
+    CONSTRAINT PK_GRUPO_PRODUCTO PRIMARY KEY CLUSTERED (ID_PRODUCTO),
+    CONSTRAINT FK_GRUPO_PRODUCTO_GRUPO FOREIGN KEY (ID_GRUPO) REFERENCES GRUPO_T (ID_GRUPO),
+    CONSTRAINT FK_GRUPO_PRODUCTO_PRODUCTO FOREIGN KEY (ID_PRODUCTO) REFERENCES PRODUCTO_T (ID_PRODUCTO)
+);
+CREATE UNIQUE INDEX UX_GRUPO_PRODUCTO_GRUPO_TIENDA ON GRUPO_PRODUCTO_T (ID_GRUPO, TIENDA);
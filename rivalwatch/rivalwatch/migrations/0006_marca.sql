@@ -0,0 +1,3 @@
+-- Marca que reporta la tienda (VTEX y Walmart la traen en sus datos del producto).
+-- El matching la prefiere a la que adivina del título; NULL si la tienda no la da.
+ALTER TABLE PRODUCTO_T ADD MARCA NVARCHAR(100) NULL;
@@ -0,0 +1,9 @@
+-- /api/productos pagina por ID_PRODUCTO (el keyset sobre ULTIMA_VEZ se saltaba productos
+-- que se volvían a crawlear a media paginación). Sin filtro de tienda basta el índice
+-- clustered; con tienda, este índice da la página sin recorrer las demás tiendas.
+-- Los índices por ULTIMA_VEZ de la migración 0002 ya no los usa ninguna consulta.
+DROP INDEX IX_PRECIO_ACTUAL_ULTIMA_VEZ ON PRECIO_ACTUAL_T;
+DROP INDEX IX_PRECIO_ACTUAL_TIENDA_ULTIMA_VEZ ON PRECIO_ACTUAL_T;
+GO
+CREATE INDEX IX_PRECIO_ACTUAL_TIENDA_ID
+    ON PRECIO_ACTUAL_T (TIENDA, ID_PRODUCTO DESC) INCLUDE (PRECIO, ULTIMA_VEZ);
@@ -0,0 +1,77 @@
+# migrations — esquema versionado de BASE_SCRAPY
+#
+# Cada archivo NNNN_nombre.sql es una versión. Los lotes se separan con GO
+# (como en SSMS) y cada versión se aplica en su propia transacción junto con
+# su registro en SCHEMA_VERSION_T, así que una migración queda completa o no queda.
+import os
+import re
+
+MIGRATIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_FILE_RE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+_GO_RE = re.compile(r"^\s*GO\s*;?\s*$", re.I | re.M)
+
+VERSION_TABLE_QUERY = """
+    IF OBJECT_ID('SCHEMA_VERSION_T') IS NULL
+        CREATE TABLE SCHEMA_VERSION_T (
+            VERSION INT NOT NULL PRIMARY KEY,
+            NOMBRE NVARCHAR(200) NOT NULL,
+            APLICADA DATETIME2(0) NOT NULL DEFAULT SYSDATETIME()
+        );
+"""
+
+
+def available():
+    """Migraciones disponibles como (versión, nombre, ruta), en orden."""
+    found = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        m = _FILE_RE.match(filename)
+        if m:
+            found.append((int(m.group(1)), m.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return sorted(found)
+
+
+def latest_version():
+    migrations = available()
+    return migrations[-1][0] if migrations else 0
+
+
+def split_batches(sql):
+    return [batch.strip() for batch in _GO_RE.split(sql) if batch.strip()]
+
+
+def current_version(cursor):
+    row = cursor.execute(
+        "SELECT CASE WHEN OBJECT_ID('SCHEMA_VERSION_T') IS NULL THEN 0"
+        " ELSE (SELECT ISNULL(MAX(VERSION), 0) FROM SCHEMA_VERSION_T) END"
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def migrate(connection, target=None, log=print):
+    """Aplica las migraciones pendientes hasta ``target`` (o la última). Devuelve las versiones aplicadas."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(VERSION_TABLE_QUERY)
+        connection.commit()
+        applied = {row[0] for row in cursor.execute("SELECT VERSION FROM SCHEMA_VERSION_T").fetchall()}
+
+        done = []
+        for version, name, path in available():
+            if version in applied or (target is not None and version > target):
+                continue
+            with open(path, encoding="utf-8") as f:
+                batches = split_batches(f.read())
+            log(f"Aplicando migración {version:04d} ({name}): {len(batches)} lotes")
+            try:
+                for batch in batches:
+                    cursor.execute(batch)
+                cursor.execute("INSERT INTO SCHEMA_VERSION_T (VERSION, NOMBRE) VALUES (?, ?)", version, name)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            done.append(version)
+        return done
+    finally:
+        cursor.close()
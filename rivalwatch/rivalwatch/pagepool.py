@@ -0,0 +1,181 @@
+# pagepool.py — páginas de Playwright reutilizables, un contexto persistente por tienda
+import asyncio
+import logging
+import time
+import weakref
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+
+from rivalwatch.matching import store_of
+
+logger = logging.getLogger(__name__)
+
+
+class PagePool:
+    """Hasta ``size`` páginas abiertas de un contexto; las libres se reutilizan
+    (la última devuelta primero, que es la más "caliente")."""
+
+    def __init__(self, size):
+        self.size = max(1, int(size))
+        self.free = []
+        self.count = 0
+        self.cond = asyncio.Condition()
+
+    async def acquire(self):
+        """Una página libre, o ``None`` si hay lugar para crear otra (ya reservado)."""
+        async with self.cond:
+            while True:
+                if self.free:
+                    return self.free.pop()
+                if self.count < self.size:
+                    self.count += 1
+                    return None
+                await self.cond.wait()
+
+    async def release(self, page):
+        async with self.cond:
+            self.free.append(page)
+            self.cond.notify()
+
+    async def discard(self):
+        async with self.cond:
+            self.count -= 1
+            self.cond.notify()
+
+
+class PagePoolMiddleware:
+    """Reutiliza páginas de Playwright entre peticiones de la misma tienda.
+
+    Cada tienda (``store_of(spider.name)``) usa su propio contexto con nombre,
+    creado con ``PLAYWRIGHT_CONTEXT_ARGS``: las cookies y los
+    ``playwright_init_scripts`` del spider se registran una vez por contexto, no
+    por página. Las páginas se crean al pedirlas (hasta ``PAGE_POOL_SIZE``, por
+    default ``CONCURRENT_REQUESTS_PER_DOMAIN``), se limpian con ``about:blank``
+    al terminar cada petición y se prestan a la siguiente.
+
+    Stats ``pagepool/*``: páginas creadas y reutilizadas, y los segundos que
+    costó crearlas y limpiarlas. Las peticiones que traen su propia página o
+    piden ``playwright_include_page`` (o ``meta["page_pool"] = False``) no se tocan.
+    """
+
+    def __init__(self, crawler, size, context_args=None):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.size = size
+        self.context_args = dict(context_args or {})
+        self.pools = {}
+        self.init_scripts = ()
+        self.contexts_ready = weakref.WeakSet()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("PAGE_POOL_ENABLED", True):
+            raise NotConfigured
+        size = settings.getint("PAGE_POOL_SIZE") or settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN", 8)
+        middleware = cls(crawler, size, settings.getdict("PLAYWRIGHT_CONTEXT_ARGS"))
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider):
+        self.init_scripts = tuple(getattr(spider, "playwright_init_scripts", ()))
+
+    def spider_closed(self, spider):
+        # Los contextos (y sus páginas) los cierra el download handler
+        self.pools.clear()
+
+    def _pool(self, name):
+        pool = self.pools.get(name)
+        if pool is None:
+            pool = self.pools[name] = PagePool(self.size)
+            self.stats.max_value("pagepool/size", pool.size)
+        return pool
+
+    async def process_request(self, request, spider):
+        meta = request.meta
+        if not meta.get("playwright") or "page_pool_context" in meta or meta.get("page_pool") is False:
+            return None
+        if meta.get("playwright_page") is not None or meta.get("playwright_include_page"):
+            return None
+
+        name = meta.setdefault("playwright_context", store_of(spider.name))
+        meta.setdefault("playwright_context_kwargs", self.context_args)
+        if meta.get("playwright_page_init_callback") != self.init_page:
+            meta["page_pool_init_callback"] = meta.get("playwright_page_init_callback")
+            meta["playwright_page_init_callback"] = self.init_page
+
+        pool = self._pool(name)
+        page = await pool.acquire()
+        if page is None:
+            try:
+                page = await self._new_page(request, spider)
+            except Exception:
+                await pool.discard()
+                raise
+        else:
+            self.stats.inc_value("pagepool/page_reused")
+        meta["page_pool_context"] = name
+        meta["playwright_page"] = page
+        # Así scrapy-playwright no cierra la página al terminar
+        meta["playwright_include_page"] = True
+        return None
+
+    async def process_response(self, request, response, spider):
+        await self._give_back(request)
+        return response
+
+    async def process_exception(self, request, exception, spider):
+        await self._give_back(request)
+        return None
+
+    async def init_page(self, page, request):
+        """Corre antes de cada navegación: lo del contexto una sola vez, luego el
+        ``playwright_page_init_callback`` que traía la petición."""
+        context = page.context
+        if context not in self.contexts_ready:
+            self.contexts_ready.add(context)
+            for script in self.init_scripts:
+                await context.add_init_script(script)
+        inner = request.meta.get("page_pool_init_callback")
+        if inner is not None:
+            await inner(page, request)
+
+    async def _new_page(self, request, spider):
+        # El handler crea el contexto si hace falta y lleva sus stats playwright/*;
+        # su _create_page es lo mismo que haría al bajar sin "playwright_page"
+        handler = self.crawler.engine.downloader.handlers._get_handler(urlparse_cached(request).scheme)
+        started = time.monotonic()
+        page = await handler._create_page(request=request, spider=spider)
+        self.stats.inc_value("pagepool/page_created")
+        self.stats.inc_value("pagepool/page_create_time", time.monotonic() - started)
+        return page
+
+    async def _give_back(self, request):
+        meta = request.meta
+        name = meta.pop("page_pool_context", None)
+        if name is None:
+            return
+        page = meta.pop("playwright_page", None)
+        meta.pop("playwright_include_page", None)
+        pool = self._pool(name)
+        if page is None or page.is_closed():
+            self.stats.inc_value("pagepool/page_discarded")
+            await pool.discard()
+            return
+        started = time.monotonic()
+        try:
+            # Sin el DOM ni los timers de la página anterior; cookies y caché quedan en el contexto
+            await page.goto("about:blank")
+        except Exception as e:
+            logger.debug(f"No se pudo limpiar la página, se descarta: {e}")
+            self.stats.inc_value("pagepool/page_discarded")
+            try:
+                await page.close()
+            finally:
+                await pool.discard()
+            return
+        self.stats.inc_value("pagepool/page_reset_time", time.monotonic() - started)
+        await pool.release(page)
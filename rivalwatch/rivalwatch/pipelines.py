@@ -1,17 +1,317 @@
-import pyodbc
+import datetime as dt
+import hashlib
+import uuid
+
+from scrapy import signals
 from scrapy.exceptions import DropItem # Importamos la excepción especial para descartar items
 
+from rivalwatch import crawls, matching, migrations
+from rivalwatch.cache import notify_invalidation
+from rivalwatch.db import get_pool
+from rivalwatch.hashstore import HashStore
+from rivalwatch.spool import Spool
+from rivalwatch.writer import SqlServerWriter
+
+
+def item_key(item):
+    # Identidad del producto dentro de la tienda: SKU si lo hay, si no la URL
+    key = item.get('sku') or item.get('url') or item.get('titulo')
+    return str(key).strip()[:450]
+
+
+def _text(value, size):
+    # Recortamos al ancho de la columna para que un valor largo no tumbe el lote completo
+    return str(value).strip()[:size] if value else None
+
+
+def content_hash(titulo, precio, url_imagen):
+    try:
+        precio = f"{float(precio):.2f}"
+    except (TypeError, ValueError):
+        precio = str(precio)
+    content = "\x1f".join((str(titulo).strip(), precio, str(url_imagen).strip()))
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# Rollup de precios (ver migración 0004) actualizado con las filas del lote; el
+# staging ya viene sin claves repetidas, así que hay a lo más una fila por bucket.
+# SUMA y OBSERVACIONES no se pueden aplicar dos veces: solo cuenta la primera vez
+# que un crawl ve el producto (#CRAWL_NUEVOS, lo que este lote agregó a
+# CRAWL_PRODUCTO_T), así que un lote que se vuelve a cargar del spool no suma nada.
+# Las filas sin crawl (spool de antes del registro de crawls) no entran al rollup.
+_ROLLUP_MERGE = """
+        MERGE {tabla} WITH (HOLDLOCK) AS t
+        USING (
+            SELECT p.ID_PRODUCTO, s.TIENDA, {bucket} AS BUCKET, s.PRECIO, s.FECHA
+            FROM #STAGING_PRODUCTOS s
+            JOIN PRODUCTO_T p ON p.TIENDA = s.TIENDA AND p.CLAVE = s.CLAVE
+            JOIN #CRAWL_NUEVOS n ON n.ID_CRAWL = s.CRAWL AND n.ID_PRODUCTO = p.ID_PRODUCTO
+            WHERE s.PRECIO IS NOT NULL
+        ) AS s
+            ON t.ID_PRODUCTO = s.ID_PRODUCTO AND t.{columna} = s.BUCKET
+        WHEN MATCHED THEN
+            UPDATE SET PRECIO_MIN = CASE WHEN s.PRECIO < t.PRECIO_MIN THEN s.PRECIO ELSE t.PRECIO_MIN END,
+                       PRECIO_MAX = CASE WHEN s.PRECIO > t.PRECIO_MAX THEN s.PRECIO ELSE t.PRECIO_MAX END,
+                       SUMA = t.SUMA + s.PRECIO,
+                       OBSERVACIONES = t.OBSERVACIONES + 1,
+                       PRECIO_ULTIMO = CASE WHEN s.FECHA >= t.ULTIMA_FECHA THEN s.PRECIO ELSE t.PRECIO_ULTIMO END,
+                       ULTIMA_FECHA = CASE WHEN s.FECHA >= t.ULTIMA_FECHA THEN s.FECHA ELSE t.ULTIMA_FECHA END
+        WHEN NOT MATCHED BY TARGET THEN
+            INSERT (ID_PRODUCTO, {columna}, TIENDA, PRECIO_MIN, PRECIO_MAX, SUMA, OBSERVACIONES, PRECIO_ULTIMO, ULTIMA_FECHA)
+            VALUES (s.ID_PRODUCTO, s.BUCKET, s.TIENDA, s.PRECIO, s.PRECIO, s.PRECIO, 1, s.PRECIO, s.FECHA);
+"""
+
+
 class SqlServerPipeline:
-    def __init__(self):
-        # --- CONFIGURA TU CONEXIÓN AQUÍ ---
-        self.connection = pyodbc.connect(
-            'DRIVER={ODBC Driver 17 for SQL Server};'
-            'SERVER=host.docker.internal;'
-            'DATABASE=BASE_SCRAPY;' # El nombre de tu DB
-            'UID=sa;'
-            'PWD=prointernet;'
+    # Versión mínima del esquema (ver rivalwatch/migrations)
+    SCHEMA_VERSION = 6
+    # Formato de las filas que se escriben al spool (ver decode_spooled):
+    #   1  titulo, precio, url_imagen, tienda, fecha
+    #   2  tienda, clave, titulo, precio, url_imagen, hash, fecha
+    #   3  tienda, clave, sku, url, titulo, precio, url_imagen, hash, fecha
+    #   4  tienda, clave, sku, url, titulo, precio, url_imagen, hash, fecha, crawl
+    #   5  tienda, clave, sku, url, titulo, precio, url_imagen, hash, fecha, crawl, marca
+    SPOOL_VERSION = 5
+
+    STAGING_QUERY = """
+        IF OBJECT_ID('tempdb..#STAGING_PRODUCTOS') IS NULL
+            CREATE TABLE #STAGING_PRODUCTOS (
+                TIENDA NVARCHAR(100) NOT NULL,
+                CLAVE NVARCHAR(450) NOT NULL,
+                SKU NVARCHAR(100),
+                URL NVARCHAR(2000),
+                TITULO NVARCHAR(1000),
+                PRECIO DECIMAL(18, 2),
+                URL_IMG NVARCHAR(2000),
+                HASH CHAR(32) NOT NULL,
+                FECHA DATETIME2(0) NOT NULL,
+                CRAWL CHAR(32) NULL,
+                MARCA NVARCHAR(100) NULL
+            );
+        ELSE
+            TRUNCATE TABLE #STAGING_PRODUCTOS;
+
+        IF OBJECT_ID('tempdb..#CRAWL_NUEVOS') IS NULL
+            CREATE TABLE #CRAWL_NUEVOS (
+                ID_CRAWL CHAR(32) NOT NULL,
+                ID_PRODUCTO INT NOT NULL
+            );
+        ELSE
+            TRUNCATE TABLE #CRAWL_NUEVOS;
+    """
+
+    STAGE_QUERY = """
+        INSERT INTO #STAGING_PRODUCTOS (TIENDA, CLAVE, SKU, URL, TITULO, PRECIO, URL_IMG, HASH, FECHA, CRAWL, MARCA)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+
+    # Todo el lote en un solo batch de SQL, en orden:
+    #   1. dimensión: lo que no cambió solo actualiza ULTIMA_VEZ, lo que cambió se reescribe
+    #      (las filas sin TITULO son de productos sin cambios, ver SQLSERVER_TOUCH_UNCHANGED);
+    #      la marca no entra en el hash, así que se completa aunque lo demás no cambie
+    #   2. hechos: una observación solo si el precio cambió respecto a la anterior en el tiempo
+    #   3. snapshot: último precio por producto, actualizado incrementalmente
+    # Un replay del spool trae filas más viejas que lo que ya escribieron crawls posteriores:
+    # la dimensión y el snapshot solo se actualizan con filas al menos tan nuevas como ULTIMA_VEZ,
+    # y un hecho viejo se intercala en PRECIO_T (quitando el siguiente si deja de ser un cambio)
+    #   4. qué productos trajo este crawl (para responder búsquedas recientes sin crawlear)
+    #   5. rollups diario y semanal para el historial de precios, solo con los pares
+    #      (crawl, producto) que el paso 4 agregó: todo el lote es idempotente
+    APPLY_QUERY = """
+        MERGE PRODUCTO_T WITH (HOLDLOCK) AS t
+        USING #STAGING_PRODUCTOS AS s
+            ON t.TIENDA = s.TIENDA AND t.CLAVE = s.CLAVE
+        WHEN MATCHED AND s.FECHA >= t.ULTIMA_VEZ AND (t.HASH = s.HASH OR s.TITULO IS NULL) THEN
+            UPDATE SET MARCA = COALESCE(s.MARCA, t.MARCA), ULTIMA_VEZ = s.FECHA
+        WHEN MATCHED AND s.FECHA >= t.ULTIMA_VEZ THEN
+            UPDATE SET SKU = COALESCE(s.SKU, t.SKU), URL = COALESCE(s.URL, t.URL), TITULO = s.TITULO,
+                       URL_IMG = s.URL_IMG, MARCA = COALESCE(s.MARCA, t.MARCA), HASH = s.HASH,
+                       ULTIMA_VEZ = s.FECHA
+        WHEN NOT MATCHED BY TARGET AND s.TITULO IS NOT NULL THEN
+            INSERT (TIENDA, CLAVE, SKU, URL, TITULO, URL_IMG, MARCA, HASH, PRIMERA_VEZ, ULTIMA_VEZ)
+            VALUES (s.TIENDA, s.CLAVE, s.SKU, s.URL, s.TITULO, s.URL_IMG, s.MARCA, s.HASH, s.FECHA, s.FECHA);
+
+        INSERT INTO PRECIO_T (ID_PRODUCTO, FECHA, PRECIO)
+        SELECT p.ID_PRODUCTO, s.FECHA, s.PRECIO
+        FROM #STAGING_PRODUCTOS s
+        JOIN PRODUCTO_T p ON p.TIENDA = s.TIENDA AND p.CLAVE = s.CLAVE
+        OUTER APPLY (SELECT TOP (1) f.PRECIO FROM PRECIO_T f
+                     WHERE f.ID_PRODUCTO = p.ID_PRODUCTO AND f.FECHA <= s.FECHA
+                     ORDER BY f.FECHA DESC) AS anterior
+        WHERE anterior.PRECIO IS NULL OR anterior.PRECIO <> s.PRECIO;
+
+        DELETE n
+        FROM #STAGING_PRODUCTOS s
+        JOIN PRODUCTO_T p ON p.TIENDA = s.TIENDA AND p.CLAVE = s.CLAVE
+        CROSS APPLY (SELECT TOP (1) f.FECHA, f.PRECIO FROM PRECIO_T f
+                     WHERE f.ID_PRODUCTO = p.ID_PRODUCTO AND f.FECHA > s.FECHA
+                     ORDER BY f.FECHA) AS siguiente
+        JOIN PRECIO_T n ON n.ID_PRODUCTO = p.ID_PRODUCTO AND n.FECHA = siguiente.FECHA
+        WHERE siguiente.PRECIO = s.PRECIO;
+
+        MERGE PRECIO_ACTUAL_T WITH (HOLDLOCK) AS t
+        USING (
+            SELECT p.ID_PRODUCTO, s.TIENDA, s.PRECIO, s.FECHA
+            FROM #STAGING_PRODUCTOS s
+            JOIN PRODUCTO_T p ON p.TIENDA = s.TIENDA AND p.CLAVE = s.CLAVE
+        ) AS s
+            ON t.ID_PRODUCTO = s.ID_PRODUCTO
+        WHEN MATCHED AND s.FECHA >= t.ULTIMA_VEZ AND t.PRECIO <> s.PRECIO THEN
+            UPDATE SET PRECIO = s.PRECIO, FECHA_CAMBIO = s.FECHA, ULTIMA_VEZ = s.FECHA
+        WHEN MATCHED AND s.FECHA >= t.ULTIMA_VEZ THEN
+            UPDATE SET ULTIMA_VEZ = s.FECHA
+        WHEN NOT MATCHED BY TARGET THEN
+            INSERT (ID_PRODUCTO, TIENDA, PRECIO, FECHA_CAMBIO, ULTIMA_VEZ)
+            VALUES (s.ID_PRODUCTO, s.TIENDA, s.PRECIO, s.FECHA, s.FECHA);
+
+        INSERT INTO CRAWL_PRODUCTO_T (ID_CRAWL, ID_PRODUCTO)
+        OUTPUT inserted.ID_CRAWL, inserted.ID_PRODUCTO INTO #CRAWL_NUEVOS (ID_CRAWL, ID_PRODUCTO)
+        SELECT DISTINCT s.CRAWL, p.ID_PRODUCTO
+        FROM #STAGING_PRODUCTOS s
+        JOIN PRODUCTO_T p ON p.TIENDA = s.TIENDA AND p.CLAVE = s.CLAVE
+        WHERE s.CRAWL IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM CRAWL_PRODUCTO_T c
+                          WHERE c.ID_CRAWL = s.CRAWL AND c.ID_PRODUCTO = p.ID_PRODUCTO);
+    """ + _ROLLUP_MERGE.format(
+        tabla="PRECIO_DIA_T", columna="DIA", bucket="CAST(s.FECHA AS DATE)",
+    ) + _ROLLUP_MERGE.format(
+        # Lunes de la semana: 1900-01-01 fue lunes
+        tabla="PRECIO_SEMANA_T", columna="SEMANA",
+        bucket="DATEADD(DAY, -(DATEDIFF(DAY, '19000101', s.FECHA) % 7), CAST(s.FECHA AS DATE))",
+    )
+
+    def __init__(self, connection_string, pool_size=2, batch_size=500, flush_interval=5.0, max_pending=2000,
+                 spool_dir=None, spool_timeout=10.0, retry_interval=30.0,
+                 hash_store_path=None, touch_unchanged=True, api_url=None, matching_threshold=None,
+                 stats=None):
+        self.connection_string = connection_string
+        self.pool_size = pool_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.spool_dir = spool_dir
+        self.spool_timeout = spool_timeout
+        self.retry_interval = retry_interval
+        self.hashes = HashStore(hash_store_path) if hash_store_path else None
+        self.touch_unchanged = touch_unchanged
+        self.api_url = api_url
+        # None: el matching no corre al cerrar el crawl
+        self.matching_threshold = matching_threshold
+        self.stats = stats
+        self.writer = None
+        self.rows_written = 0
+        # Filas que no llegaron a la base, perdidas o en el spool (el writer reporta cada una una vez)
+        self.rows_lost = 0
+        self.write_seconds = 0.0
+        # Identidad de este crawl: va en cada fila y en CRAWL_T al terminar
+        self.crawl_id = uuid.uuid4().hex
+        self.crawl_started = None
+        self.items_seen = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        pipeline = cls(
+            connection_string=settings.get("SQLSERVER_CONNECTION_STRING"),
+            pool_size=settings.getint("SQLSERVER_POOL_SIZE", 2),
+            batch_size=settings.getint("SQLSERVER_BATCH_SIZE", 500),
+            flush_interval=settings.getfloat("SQLSERVER_FLUSH_INTERVAL", 5.0),
+            max_pending=settings.getint("SQLSERVER_MAX_PENDING", 2000),
+            spool_dir=settings.get("SPOOL_DIR") if settings.getbool("SPOOL_ENABLED", True) else None,
+            spool_timeout=settings.getfloat("SQLSERVER_SPOOL_TIMEOUT", 10.0),
+            retry_interval=settings.getfloat("SQLSERVER_RETRY_INTERVAL", 30.0),
+            hash_store_path=settings.get("HASH_STORE_PATH"),
+            touch_unchanged=settings.getbool("SQLSERVER_TOUCH_UNCHANGED", True),
+            api_url=settings.get("RIVALWATCH_API_URL"),
+            matching_threshold=(settings.getfloat("MATCHING_THRESHOLD", 0.55)
+                                if settings.getbool("MATCHING_ENABLED", True) else None),
+            stats=crawler.stats,
+        )
+        # spider_closed llega después de close_spider y trae la razón del cierre
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    @classmethod
+    def prepare(cls, cursor):
+        # Si la base no está migrada fallamos al conectar: el writer manda los lotes al spool
+        version = migrations.current_version(cursor)
+        if version < cls.SCHEMA_VERSION:
+            raise RuntimeError(
+                f"La base está en la versión {version} del esquema y el pipeline necesita "
+                f"la {cls.SCHEMA_VERSION}; ejecuta 'scrapy migrate'"
+            )
+
+    @classmethod
+    def write_rows(cls, cursor, rows):
+        # MERGE falla si la misma clave viene dos veces en el origen: nos quedamos con la más nueva
+        latest = {}
+        for row in rows:
+            key = (row[0], row[1])
+            if key not in latest or row[8] >= latest[key][8]:
+                latest[key] = row
+        cursor.execute(cls.STAGING_QUERY)
+        cursor.executemany(cls.STAGE_QUERY, list(latest.values()))
+        cursor.execute(cls.APPLY_QUERY)
+
+    @classmethod
+    def decode_spooled(cls, line):
+        """Línea del spool -> fila en el formato ``SPOOL_VERSION``; ``ValueError`` si no se reconoce.
+
+        Las filas versionadas vienen como ``{"v": N, "fila": [...]}``; las de antes de
+        versionar son una lista y su versión se deduce del número de columnas.
+        """
+        if isinstance(line, dict):
+            version, values = line.get("v"), line.get("fila")
+        elif not isinstance(line, list):
+            raise ValueError("fila de spool no reconocida")
+        else:
+            version, values = {5: 1, 7: 2, 9: 3, 10: 4}.get(len(line)), line
+        if not isinstance(values, list) or len(values) != {1: 5, 2: 7, 3: 9, 4: 10, 5: 11}.get(version):
+            raise ValueError(f"fila de spool no reconocida (versión {version!r})")
+        values = list(values)
+
+        if version == 1:
+            titulo, precio, url_imagen, tienda, fecha = values
+            # Sin SKU ni URL: la clave es el título, igual que en la migración 0002
+            values = [tienda, _text(titulo, 450), None, None, titulo, precio, url_imagen,
+                      content_hash(titulo, precio, url_imagen), fecha]
+        elif version == 2:
+            tienda, clave, titulo, precio, url_imagen, digest, fecha = values
+            values = [tienda, clave, None, None, titulo, precio, url_imagen, digest, fecha]
+        if len(values) == 9:
+            # Anteriores al registro de crawls
+            values.append(None)
+        if len(values) == 10:
+            # Anteriores a la marca
+            values.append(None)
+        # La fecha se guardó como texto ISO
+        values[8] = dt.datetime.fromisoformat(values[8])
+        return tuple(values)
+
+    def open_spider(self, spider):
+        self.crawl_started = dt.datetime.now()
+        if self.hashes:
+            self.hashes.load(spider.name)
+
+        # La conexión se abre en el hilo del writer con el primer lote, no aquí:
+        # si SQL Server no responde, el crawl arranca igual y escribe al spool.
+        spool = Spool(self.spool_dir, spider.name, version=self.SPOOL_VERSION) if self.spool_dir else None
+        # Pool compartido del proceso: si varios crawls corren juntos reutilizan conexiones
+        self.writer = SqlServerWriter(
+            pool=get_pool(self.connection_string, size=self.pool_size),
+            write=self.write_rows,
+            prepare=self.prepare,
+            batch_size=self.batch_size,
+            flush_interval=self.flush_interval,
+            max_pending=self.max_pending,
+            on_batch=self.batch_written,
+            on_error=self.batch_failed,
+            spool=spool,
+            spool_timeout=self.spool_timeout,
+            retry_interval=self.retry_interval,
+            on_spool=self.batch_spooled,
         )
-        self.cursor = self.connection.cursor()
+        self.writer.start()
 
     def process_item(self, item, spider):
         # --- PASO DE VALIDACIÓN ---
@@ -19,28 +319,121 @@ class SqlServerPipeline:
         if not item.get('titulo') or not item.get('precio') or not item.get('url_imagen'):
             # Si falta algún dato, lanzamos DropItem.
             # Scrapy lo captura, detiene el procesamiento de este item y lo registra.
-            raise DropItem(f"Item descartado por datos incompletos: {item['titulo']}")
+            raise DropItem(f"Item descartado por datos incompletos: {item.get('titulo')}")
+        self.items_seen += 1
+
+        # Solo se escribe lo que cambió desde la última vez que vimos el producto
+        clave = item_key(item)
+        digest = content_hash(item['titulo'], item['precio'], item['url_imagen'])
+        # Sin SQLSERVER_TOUCH_UNCHANGED, lo que no cambió va en una fila mínima (sin
+        # título, URL ni imagen): basta para marcar ULTIMA_VEZ y el crawl que lo vio
+        touch_only = False
+        if self.hashes:
+            if self.hashes.get(clave) == digest:
+                if self.stats:
+                    self.stats.inc_value("sqlserver/items_unchanged")
+                touch_only = not self.touch_unchanged
+            elif self.stats:
+                self.stats.inc_value("sqlserver/items_changed")
+
+        # Un item que salió del caché HTTP trae la hora en que se bajó la página
+        # (rivalwatch.httpcache); el crawl cuenta desde la observación más vieja
+        fecha = item.get('observado') or dt.datetime.now()
+        if fecha < self.crawl_started:
+            self.crawl_started = fecha
+
+        # El item se encola para el writer. El Deferred queda pendiente
+        # mientras la cola esté llena (backpressure).
+        d = self.writer.put((
+            spider.name,
+            clave,
+            None if touch_only else _text(item.get('sku'), 100),
+            None if touch_only else _text(item.get('url'), 2000),
+            None if touch_only else _text(item['titulo'], 1000),
+            item['precio'],
+            None if touch_only else _text(item['url_imagen'], 2000),
+            digest,
+            fecha,
+            self.crawl_id,
+            None if touch_only else _text(item.get('marca'), 100),
+        ))
+        d.addCallback(lambda _: item) # Es importante retornar el item si se procesó correctamente
+        return d
 
-        # Si la validación pasa, continuamos con el proceso de inserción.
+    def batch_written(self, rows, seconds):
+        # El hash solo se recuerda cuando la fila ya está en la base: si el lote
+        # falla o se va al spool, el siguiente crawl la vuelve a escribir
+        if self.hashes:
+            for row in rows:
+                self.hashes.set(row[1], row[7])
+        self.rows_written += len(rows)
+        self.write_seconds += seconds
+        if self.stats:
+            self.stats.inc_value("sqlserver/batches")
+            self.stats.inc_value("sqlserver/rows_written", len(rows))
+            if self.write_seconds > 0:
+                self.stats.set_value(
+                    "sqlserver/rows_per_sec",
+                    round(self.rows_written / self.write_seconds, 1),
+                )
+
+    def batch_failed(self, rows):
+        self.rows_lost += rows
+        if self.stats:
+            self.stats.inc_value("sqlserver/rows_failed", rows)
+
+    def batch_spooled(self, rows):
+        self.rows_lost += rows
+        if self.stats:
+            self.stats.inc_value("sqlserver/rows_spooled", rows)
+
+    def close_spider(self, spider):
+        # El writer escribe lo que quede en la cola antes de cerrar la conexión
+        d = self.writer.close()
+        if self.hashes:
+            d.addCallback(lambda _: self.hashes.save())
+        return d
+
+    def spider_closed(self, spider, reason):
+        # Primero queda registrado el crawl, luego se agrupan los productos nuevos
+        # y al final se avisa al API
+        from twisted.internet import threads
+        d = threads.deferToThread(self.record_crawl, spider, reason)
+        d.addCallback(lambda _: threads.deferToThread(self.update_matches, spider))
+        d.addCallback(lambda _: self.invalidate_api_cache(spider))
+        return d
+
+    def record_crawl(self, spider, reason):
+        # Un crawl con filas fuera de la base (spool o error) no sirve para responder
+        # búsquedas: sus resultados están incompletos hasta el replay
+        if self.rows_lost:
+            return
         try:
-            query = """
-                INSERT INTO PRODUCTOS_T (TITULOS_PROD, PRECIO_PROD, URL_IMG_PROD, TIENDA_PROD)
-                VALUES (?, ?, ?, ?)
-            """
-            self.cursor.execute(
-                query,
-                item['titulo'],
-                item['precio'],
-                item['url_imagen'],
-                spider.name
-            )
-            self.connection.commit()
+            with get_pool(self.connection_string).connection() as connection:
+                cursor = connection.cursor()
+                crawls.record_crawl(
+                    cursor, self.crawl_id, spider.name, crawls.spider_query(spider) or "",
+                    getattr(spider, "max_products", None) or None,
+                    (dt.datetime.now() - self.crawl_started).total_seconds(), self.items_seen, reason,
+                )
+                connection.commit()
+                cursor.close()
         except Exception as e:
-            self.connection.rollback()
-            spider.logger.error(f"Error al guardar en la base de datos: {e}")
-        
-        return item # Es importante retornar el item si se procesó correctamente
+            spider.logger.warning(f"No se pudo registrar el crawl {self.crawl_id}: {e}")
 
-    def close_spider(self, spider):
-        self.cursor.close()
-        self.connection.close()
\ No newline at end of file
+    def update_matches(self, spider):
+        if self.matching_threshold is None or not self.rows_written:
+            return
+        try:
+            with get_pool(self.connection_string).connection() as connection:
+                matching.update_matches(connection, threshold=self.matching_threshold)
+        except Exception as e:
+            # Lo que no se alcanzó a agrupar queda pendiente para el siguiente crawl o `scrapy match`
+            spider.logger.warning(f"No se pudo actualizar el matching entre tiendas: {e}")
+
+    def invalidate_api_cache(self, spider):
+        # Solo si llegó algo a la base; lo que quedó en el spool invalida al cargarse
+        if not self.api_url or not self.rows_written:
+            return None
+        from twisted.internet import threads
+        return threads.deferToThread(notify_invalidation, self.api_url, spider.name)
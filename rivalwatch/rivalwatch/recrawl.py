@@ -0,0 +1,128 @@
+# recrawl.py — plan de re-crawl por SKU: lo que cambia de precio seguido se visita seguido
+import json
+import os
+
+# Historial por producto de una tienda, con el reloj de SQL Server (ver crawls.py):
+#   CAMBIOS     cambios de precio en la ventana (PRECIO_T sin la primera observación)
+#   DIAS_VISTO  días de la ventana en que se vio el producto (PRECIO_DIA_T)
+#   PRECIO_MAX  el precio más alto de la ventana, para reconocer una promoción
+HISTORY_QUERY = """
+    SELECT p.CLAVE, p.SKU, p.URL, p.TITULO, a.PRECIO,
+           DATEDIFF(SECOND, p.ULTIMA_VEZ, SYSDATETIME()) / 86400.0 AS DIAS_SIN_VER,
+           COALESCE(c.CAMBIOS, 0) AS CAMBIOS,
+           COALESCE(d.DIAS_VISTO, 0) AS DIAS_VISTO,
+           d.PRECIO_MAX
+    FROM PRODUCTO_T p
+    JOIN PRECIO_ACTUAL_T a ON a.ID_PRODUCTO = p.ID_PRODUCTO
+    OUTER APPLY (
+        SELECT COUNT(*) AS CAMBIOS
+        FROM PRECIO_T f
+        WHERE f.ID_PRODUCTO = p.ID_PRODUCTO AND f.FECHA > p.PRIMERA_VEZ
+          AND f.FECHA >= DATEADD(DAY, -?, SYSDATETIME())
+    ) c
+    OUTER APPLY (
+        SELECT COUNT(*) AS DIAS_VISTO, MAX(x.PRECIO_MAX) AS PRECIO_MAX
+        FROM PRECIO_DIA_T x
+        WHERE x.ID_PRODUCTO = p.ID_PRODUCTO AND x.DIA >= CAST(DATEADD(DAY, -?, SYSDATETIME()) AS DATE)
+    ) d
+    WHERE p.TIENDA = ?
+"""
+
+STORES_QUERY = "SELECT DISTINCT TIENDA FROM PRODUCTO_T ORDER BY TIENDA"
+
+# Lo que se supone de un producto sin historia: un cambio cada 10 días
+PRIOR_CHANGES = 1.0
+PRIOR_DAYS = 10.0
+
+
+def load_history(cursor, tienda, window_days=30):
+    """Historial de cada producto de ``tienda`` (ver ``HISTORY_QUERY``) como lista de dicts."""
+    rows = cursor.execute(HISTORY_QUERY, (int(window_days), int(window_days), tienda)).fetchall()
+    return [
+        {
+            "clave": clave,
+            "sku": sku,
+            "url": url,
+            "titulo": titulo,
+            "precio": float(precio) if precio is not None else None,
+            "dias_sin_ver": float(dias_sin_ver or 0),
+            "cambios": int(cambios),
+            "dias_visto": int(dias_visto),
+            "precio_max": float(precio_max) if precio_max is not None else None,
+        }
+        for clave, sku, url, titulo, precio, dias_sin_ver, cambios, dias_visto, precio_max in rows
+    ]
+
+
+def change_rate(cambios, dias_visto):
+    """Probabilidad de que el precio cambie en un día, suavizada con ``PRIOR_*``: un producto
+    con pocos días de historia no pasa por estable (ni por volátil) con dos observaciones."""
+    return min(1.0, (cambios + PRIOR_CHANGES) / (dias_visto + PRIOR_DAYS))
+
+
+def is_promotion(product, promo_drop=0.05):
+    """El precio actual está al menos ``promo_drop`` por debajo del más alto de la ventana."""
+    precio, maximo = product.get("precio"), product.get("precio_max")
+    return bool(precio and maximo and precio < maximo * (1 - promo_drop))
+
+
+def score(product, promo_drop=0.05, promo_boost=2.0):
+    """Probabilidad de que el precio ya no sea el que tenemos: ``1 - (1 - tasa) ** días sin ver``.
+
+    Un producto volátil la alcanza en horas y uno estable en semanas, así que
+    los básicos también vuelven al plan, solo que menos seguido. Las promociones
+    (que terminan) pesan ``promo_boost`` veces más.
+    """
+    rate = change_rate(product["cambios"], product["dias_visto"])
+    value = 1.0 - (1.0 - rate) ** max(0.0, product["dias_sin_ver"])
+    if is_promotion(product, promo_drop):
+        value *= promo_boost
+    return value
+
+
+def build_plan(products, budget, promo_drop=0.05, promo_boost=2.0):
+    """Los ``budget`` productos con más ``score``, del más urgente al menos; a igual
+    puntaje, el que lleva más tiempo sin verse."""
+    ranked = []
+    for product in products:
+        if not (product.get("url") or product.get("sku")):
+            continue
+        entry = dict(product)
+        entry["tasa"] = round(change_rate(product["cambios"], product["dias_visto"]), 4)
+        entry["promocion"] = is_promotion(product, promo_drop)
+        entry["score"] = round(score(product, promo_drop, promo_boost), 4)
+        ranked.append(entry)
+    ranked.sort(key=lambda e: (e["score"], e["dias_sin_ver"]), reverse=True)
+    return ranked[:max(0, int(budget))]
+
+
+def write_plan(path, entries):
+    """Plan como JSON lines, en orden de prioridad (se escribe a un temporal y se renombra)."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+
+
+def read_plan(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def plan_entries(spider):
+    """Las entradas del plan que trae el spider con ``-a plan=<archivo>``, o ``None`` si no trae.
+
+    Los spiders las convierten en sus peticiones de arranque con
+    ``priority=len(entries) - n`` (el scheduler respeta el orden del plan) y
+    ``httpcache_ttl = 0``: si el plan dice que toca, no vale la copia del caché.
+    """
+    path = getattr(spider, "plan", None)
+    if not path:
+        return None
+    entries = read_plan(path)
+    spider.logger.info(f"Plan de re-crawl {path}: {len(entries)} productos")
+    return entries
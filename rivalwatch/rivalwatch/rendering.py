@@ -0,0 +1,176 @@
+# rendering.py — HTTP primero y navegador solo cuando la página llega incompleta
+import json
+import logging
+import os
+import re
+from urllib.parse import urlparse
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+logger = logging.getLogger(__name__)
+
+
+def url_pattern(url):
+    """Forma de la URL sin lo que cambia de una página a otra.
+
+    ``https://www.soriana.com/harina-selecta-1kg/123456.html`` ->
+    ``www.soriana.com/*/#.html``; los segmentos cortos sin dígitos
+    (``/buscar``, ``/despensa``) se conservan.
+    """
+    parsed = urlparse(url)
+    partes = []
+    for segmento in parsed.path.strip("/").split("/"):
+        if not segmento:
+            continue
+        nombre, punto, extension = segmento.rpartition(".")
+        if not punto or not re.fullmatch(r"[A-Za-z0-9]{1,5}", extension):
+            nombre, extension = segmento, ""
+        if nombre.isdigit():
+            forma = "#"
+        elif re.search(r"\d", nombre) or "-" in nombre or len(nombre) > 30:
+            forma = "*"
+        else:
+            forma = nombre.lower()
+        partes.append(f"{forma}.{extension.lower()}" if extension else forma)
+    return "/".join([parsed.netloc.lower(), *partes])
+
+
+class RenderMemory:
+    """Por patrón de URL: cuántas veces bastó HTTP y cuántas hizo falta el navegador.
+
+    Se guarda en un JSON entre crawls. Los conteos se reducen a la mitad al
+    llegar a ``max_count`` para que un cambio en el sitio se note pronto.
+    """
+
+    def __init__(self, path=None, min_samples=3, browser_ratio=0.5, max_count=100):
+        self.path = path
+        self.min_samples = int(min_samples)
+        self.browser_ratio = float(browser_ratio)
+        self.max_count = int(max_count)
+        self.patterns = {}
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.patterns = {k: list(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudo leer la memoria de render {self.path}: {e}")
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.patterns, f, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def record(self, pattern, needed_browser):
+        counts = self.patterns.setdefault(pattern, [0, 0])
+        counts[1 if needed_browser else 0] += 1
+        if sum(counts) > self.max_count:
+            counts[0], counts[1] = counts[0] // 2, counts[1] // 2
+
+    def needs_browser(self, pattern):
+        http_ok, browser = self.patterns.get(pattern, (0, 0))
+        total = http_ok + browser
+        return total >= self.min_samples and browser / total >= self.browser_ratio
+
+
+class HybridRenderMiddleware:
+    """Baja las páginas con HTTP simple y solo las renderiza con Playwright si no
+    pasan la regla de "página completa" de su spider.
+
+    Las reglas van en ``spider.render_rules``: nombre del callback -> lista de
+    selectores CSS (completa si alguno encuentra algo) o nombre de un método del
+    spider que recibe la respuesta y devuelve bool. Solo se manejan las
+    peticiones cuyo callback tiene regla (y sin ``meta["hybrid"] = False``); al
+    escalar se usa el ``playwright_page_methods`` que la petición ya trae.
+
+    Si un patrón de URL casi siempre necesita navegador, las siguientes
+    peticiones van directo a Playwright; una de cada ``reprobe`` vuelve a probar
+    HTTP por si el sitio cambió.
+    """
+
+    def __init__(self, stats, memory, reprobe=50):
+        self.stats = stats
+        self.memory = memory
+        self.reprobe = int(reprobe)
+        self.direct = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("HYBRID_RENDER_ENABLED", True):
+            raise NotConfigured
+        memory = RenderMemory(
+            settings.get("HYBRID_RENDER_STATE_PATH"),
+            min_samples=settings.getint("HYBRID_RENDER_MIN_SAMPLES", 3),
+            browser_ratio=settings.getfloat("HYBRID_RENDER_BROWSER_RATIO", 0.5),
+        )
+        middleware = cls(crawler.stats, memory, reprobe=settings.getint("HYBRID_RENDER_REPROBE", 50))
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider):
+        self.memory.load()
+
+    def spider_closed(self, spider):
+        try:
+            self.memory.save()
+        except OSError as e:
+            spider.logger.warning(f"No se pudo guardar la memoria de render: {e}")
+
+    def _rule(self, request, spider):
+        if request.meta.get("hybrid") is False:
+            return None
+        name = getattr(request.callback, "__name__", None) or "parse"
+        return (getattr(spider, "render_rules", None) or {}).get(name)
+
+    def process_request(self, request, spider):
+        if "hybrid_mode" in request.meta or self._rule(request, spider) is None:
+            return None
+        pattern = url_pattern(request.url)
+        if self.memory.needs_browser(pattern):
+            seen = self.direct[pattern] = self.direct.get(pattern, 0) + 1
+            if seen % self.reprobe:
+                self.stats.inc_value("hybrid/browser_direct")
+                request.meta["hybrid_mode"] = "browser"
+                request.meta["playwright"] = True
+                return None
+        request.meta["hybrid_mode"] = "http"
+        request.meta["playwright"] = False
+        return None
+
+    def process_response(self, request, response, spider):
+        mode = request.meta.get("hybrid_mode")
+        # Errores y redirecciones los manejan los middlewares de siempre
+        if mode is None or response.status != 200:
+            return response
+        rule = self._rule(request, spider)
+        complete = rule is None or self._complete(rule, response, spider)
+        pattern = url_pattern(request.url)
+        if mode == "browser":
+            if not complete:
+                self.stats.inc_value("hybrid/browser_incomplete")
+            return response
+        self.memory.record(pattern, needed_browser=not complete)
+        if complete:
+            self.stats.inc_value("hybrid/http_complete")
+            return response
+        self.stats.inc_value("hybrid/escalated")
+        spider.logger.debug(f"Página incompleta por HTTP, se renderiza: {request.url}")
+        meta = dict(request.meta, hybrid_mode="browser", playwright=True)
+        return request.replace(meta=meta, dont_filter=True)
+
+    @staticmethod
+    def _complete(rule, response, spider):
+        if not hasattr(response, "css"):
+            return False
+        if isinstance(rule, str):
+            return bool(getattr(spider, rule)(response))
+        return any(response.css(selector).get() for selector in rule)
@@ -2,6 +2,7 @@
 BOT_NAME = "rivalwatch"
 SPIDER_MODULES = ["rivalwatch.spiders"]
 NEWSPIDER_MODULE = "rivalwatch.spiders"
+COMMANDS_MODULE = "rivalwatch.commands"
 
 # --- Playwright via Download Handler ---
 DOWNLOAD_HANDLERS = {
@@ -9,6 +10,26 @@ DOWNLOAD_HANDLERS = {
     "https": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
 }
 
+# HTTP primero: las peticiones cuyo callback tiene regla en `spider.render_rules` se bajan
+# sin navegador y solo se renderizan si la página llega incompleta. Se recuerda por
+# patrón de URL cuándo hizo falta el navegador para ir directo la próxima vez
+DOWNLOADER_MIDDLEWARES = {
+    # Después de descomprimir (590) y seguir redirecciones (600)
+    "rivalwatch.rendering.HybridRenderMiddleware": 580,
+    # Después del anterior, que decide qué peticiones van con Playwright
+    "rivalwatch.blocker.ResourceBlockerMiddleware": 585,
+    # Caché HTTP (rivalwatch.httpcache) en el lugar del de Scrapy
+    "scrapy.downloadermiddlewares.httpcache.HttpCacheMiddleware": None,
+    "rivalwatch.httpcache.CacheMiddleware": 900,
+    # Después del caché: lo que sale del caché no ocupa página. Al volver corre antes que
+    # redirecciones (600), para recuperar la página de toda respuesta
+    "rivalwatch.pagepool.PagePoolMiddleware": 950,
+}
+HYBRID_RENDER_STATE_PATH = "state/render_patterns.json"
+HYBRID_RENDER_MIN_SAMPLES = 3      # páginas vistas antes de decidir por patrón
+HYBRID_RENDER_BROWSER_RATIO = 0.5  # fracción que necesitó navegador para ir directo a Playwright
+HYBRID_RENDER_REPROBE = 50         # una de cada N vuelve a probar HTTP
+
 # Reactor asyncio estándar
 TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
 
@@ -17,6 +38,45 @@ PLAYWRIGHT_BROWSER_TYPE = "chromium"
 PLAYWRIGHT_LAUNCH_OPTIONS = {"headless": True}
 PLAYWRIGHT_DEFAULT_NAVIGATION_TIMEOUT = 60000  # Aumentado para más estabilidad
 
+# Recursos que las páginas renderizadas no bajan (rivalwatch.blocker). Tipos de Playwright:
+# image, media, font, stylesheet, script, ping (beacons), xhr, fetch, ... Los hosts incluyen
+# subdominios. Cada spider puede permitir más con `blocker_allow_hosts` / `blocker_allow_types`.
+# Las stats blocker/* dicen cuánto se bloqueó y los bytes (estimados) que se ahorraron
+RESOURCE_BLOCKER_ENABLED = True
+RESOURCE_BLOCKER_TYPES = ["image", "media", "font", "ping"]  # + "stylesheet" si el sitio no depende del CSS para cargar
+RESOURCE_BLOCKER_HOSTS = [
+    "doubleclick.net",
+    "googletagmanager.com",
+    "google-analytics.com",
+    "googlesyndication.com",
+    "facebook.net",
+    "hotjar.com",
+]
+RESOURCE_BLOCKER_ALLOW_HOSTS = []
+
+# Páginas de Playwright reutilizables (rivalwatch.pagepool): un contexto por tienda con
+# PLAYWRIGHT_CONTEXT_ARGS y hasta PAGE_POOL_SIZE páginas abiertas (0 = CONCURRENT_REQUESTS_PER_DOMAIN)
+PAGE_POOL_ENABLED = True
+PAGE_POOL_SIZE = 0
+
+# Caché HTTP local (rivalwatch.httpcache): un SQLite por spider en .scrapy/HTTPCACHE_DIR con
+# los cuerpos comprimidos. Una respuesta más nueva que HTTPCACHE_TTL segundos (cada spider
+# pone el suyo en custom_settings; meta["httpcache_ttl"] por petición) no sale a la red;
+# pasado el TTL se revalida con If-None-Match / If-Modified-Since y un 304 reusa la guardada.
+# Las páginas de Playwright se guardan por URL + page methods y se vuelven a renderizar al vencer
+HTTPCACHE_ENABLED = True
+HTTPCACHE_STORAGE = "rivalwatch.httpcache.SqliteCacheStorage"
+HTTPCACHE_POLICY = "rivalwatch.httpcache.CachePolicy"
+HTTPCACHE_DIR = "httpcache"
+HTTPCACHE_TTL = 0                   # 0 = siempre revalidar
+HTTPCACHE_EXPIRATION_SECS = 7 * 24 * 3600  # se borran entradas sin usar por una semana
+HTTPCACHE_COMPRESSION_LEVEL = 6
+# Los items que salen de una respuesta del caché llevan la hora en que se bajó ("observado"):
+# la pipeline escribe esa fecha, no la del crawl. `forzar` en el API corre con HTTPCACHE_TTL = 0
+SPIDER_MIDDLEWARES = {
+    "rivalwatch.httpcache.CachedObservationMiddleware": 950,
+}
+
 # Ética / estabilidad
 ROBOTSTXT_OBEY = True
 AUTOTHROTTLE_ENABLED = True
@@ -41,6 +101,71 @@ ITEM_PIPELINES = {
    'rivalwatch.pipelines.SqlServerPipeline': 300,
 }
 
+SQLSERVER_CONNECTION_STRING = (
+    'DRIVER={ODBC Driver 17 for SQL Server};'
+    'SERVER=host.docker.internal;'
+    'DATABASE=BASE_SCRAPY;'
+    'UID=sa;'
+    'PWD=prointernet;'
+)
+
+SQLSERVER_POOL_SIZE = 2
+
+# Escritura por lotes: un INSERT multi-fila y un commit cada N items o cada T segundos
+SQLSERVER_BATCH_SIZE = 500
+SQLSERVER_FLUSH_INTERVAL = 5.0
+# Filas en vuelo hacia el hilo escritor; al llenarse, los items esperan (backpressure)
+SQLSERVER_MAX_PENDING = 2000
+
+# Spool local: si SQL Server falla o va lento, las filas se guardan aquí
+# y después se cargan con `scrapy replay_spool`
+SPOOL_ENABLED = True
+SPOOL_DIR = "spool"
+SQLSERVER_SPOOL_TIMEOUT = 10.0   # segundos que un item espera lugar en la cola antes de ir al spool
+SQLSERVER_RETRY_INTERVAL = 30.0  # tras un fallo, tiempo sin intentar la base (todo va al spool)
+
+# Escrituras solo de cambios: hash del contenido por (tienda, sku/url) guardado localmente.
+# Los productos sin cambios solo actualizan ULTIMA_VEZ; con False ni siquiera se manda
+# su título, URL ni imagen, solo clave, precio y hora (menos tráfico hacia la base)
+HASH_STORE_PATH = "state/hashes.sqlite3"
+SQLSERVER_TOUCH_UNCHANGED = True
+
+# API del dashboard: al terminar de escribir, el pipeline le pide invalidar su caché
+RIVALWATCH_API_URL = "http://host.docker.internal:5000"
+
+# Daemon de crawls (`scrapy crawld`): reactor residente y Chromium pre-lanzados a los
+# que cada crawl se conecta por CDP en vez de abrir su propio navegador
+CRAWL_DAEMON_HOST = "127.0.0.1"
+CRAWL_DAEMON_PORT = 6810
+CRAWL_DAEMON_BROWSERS = 2
+CRAWL_DAEMON_CDP_PORT = 9222   # el navegador N escucha en CRAWL_DAEMON_CDP_PORT + N
+
+
+# Avance del crawl (items, descartados, páginas, errores y productos nuevos) como
+# eventos JSON; el API los reenvía al dashboard por SSE
+EXTENSIONS = {
+    "rivalwatch.extensions.CrawlProgress": 500,
+}
+PROGRESS_INTERVAL = 1.0
+PROGRESS_STDOUT = True   # líneas "@@progreso {json}" que lee el API cuando el crawl corre en Docker
+
+# Matching entre tiendas: al cerrar cada crawl se indexan los productos nuevos o con
+# título distinto y se agrupan con su equivalente en las otras tiendas (ver `scrapy match`)
+MATCHING_ENABLED = True
+MATCHING_THRESHOLD = 0.55
+
+# Re-crawl por volatilidad (`scrapy recrawl_plan`): con el historial de cada producto
+# (cambios de precio y días vistos en RECRAWL_WINDOW_DAYS, última vez visto) se arma por tienda
+# la lista de lo que más probablemente ya cambió, hasta RECRAWL_BUDGET peticiones. Un precio
+# RECRAWL_PROMO_DROP debajo del máximo de la ventana es promoción y pesa RECRAWL_PROMO_BOOST veces.
+# Cada spider la recibe con `-a plan=state/recrawl/<tienda>.jsonl`
+RECRAWL_PLAN_DIR = "state/recrawl"
+RECRAWL_BUDGET = 500
+RECRAWL_BUDGETS = {}   # por tienda, p.ej. {"soriana": 200}
+RECRAWL_WINDOW_DAYS = 30
+RECRAWL_PROMO_DROP = 0.05
+RECRAWL_PROMO_BOOST = 2.0
+
 
 # ... (tus otras configuraciones)
 
@@ -1,11 +1,13 @@
 # soriana.py
-import json
 import re
 from decimal import Decimal, InvalidOperation
 from urllib.parse import urlparse, quote_plus
 import scrapy
 from scrapy_playwright.page import PageMethod
 
+from rivalwatch.recrawl import plan_entries
+from rivalwatch.structured import structured
+
 
 def _to_float(x: str) -> float | None:
     if not x:
@@ -27,23 +29,7 @@ def _extract_currency(response) -> str | None:
     cur = response.css('input#clevertap-currency::attr(value)').get()
     if cur:
         return cur.strip()
-    cur = response.css('meta[property="product:price:currency"]::attr(content)').get()
-    if cur:
-        return cur.strip()
-    for txt in response.css('script[type="application/ld+json"]::text').getall():
-        try:
-            data = json.loads(txt)
-            nodes = data if isinstance(data, list) else [data]
-            for n in nodes:
-                if isinstance(n, dict):
-                    offers = n.get("offers")
-                    if isinstance(offers, dict):
-                        cc = offers.get("priceCurrency")
-                        if cc:
-                            return str(cc).strip()
-        except Exception:
-            pass
-    return None
+    return structured(response).currency
 
 
 def _extract_sku(response, url: str) -> str | None:
@@ -56,17 +42,9 @@ def _extract_sku(response, url: str) -> str | None:
         return sku
 
     # 2) JSON-LD
-    for txt in response.css('script[type="application/ld+json"]::text').getall():
-        try:
-            data = json.loads(txt)
-            nodes = data if isinstance(data, list) else [data]
-            for n in nodes:
-                if isinstance(n, dict):
-                    pid = n.get("sku") or n.get("productID") or n.get("mpn")
-                    if pid:
-                        return str(pid).strip()
-        except Exception:
-            pass
+    sku = structured(response).sku
+    if sku:
+        return sku
 
     # 3) fallback: dígitos del final de la URL (VTEX suele tener .../1234567.html)
     path = urlparse(url).path or ""
@@ -76,6 +54,16 @@ def _extract_sku(response, url: str) -> str | None:
     return None
 
 
+def _extract_price(response) -> float | None:
+    # Precio desde input oculto
+    price = _to_float(response.css('input#clevertap-price::attr(value)').get())
+    if price is not None:
+        return price
+
+    # Fallback JSON-LD si no hay input
+    return structured(response).price
+
+
 def _title_contains_all_terms(title: str, terms: list[str]) -> bool:
     t = title.lower()
     return all(term.lower() in t for term in terms if term)
@@ -90,6 +78,11 @@ class SorianaSpider(scrapy.Spider):
         "https://www.soriana.com/despensa/",
     ]
 
+    # Página completa = trae precio (ver rivalwatch.rendering)
+    render_rules = {
+        "parse_product": "_has_price",
+    }
+
     custom_settings = {
         "PLAYWRIGHT_BROWSER_TYPE": "chromium",
         "PLAYWRIGHT_DEFAULT_NAVIGATION_TIMEOUT": 45_000,
@@ -99,6 +92,8 @@ class SorianaSpider(scrapy.Spider):
         "DOWNLOAD_DELAY": 0.5,
         "RETRY_TIMES": 3,
         "ROBOTSTXT_OBEY": True,
+        # Render caro: un producto renderizado vale por 6 h (rivalwatch.httpcache)
+        "HTTPCACHE_TTL": 6 * 3600,
     }
 
     # -------- ARRANQUE --------
@@ -107,10 +102,19 @@ class SorianaSpider(scrapy.Spider):
         self.max_pages = int(getattr(self, "max_pages", 0)) or None
         self.require_terms = str(getattr(self, "require_terms", "false")).lower() in ("1", "true", "yes")
 
+        # -a plan=state/recrawl/soriana.jsonl (scrapy recrawl_plan): solo esas fichas, en orden
+        entries = plan_entries(self)
+        if entries is not None:
+            for n, entry in enumerate(entries):
+                if entry.get("url"):
+                    yield self._product_request(entry["url"], priority=len(entries) - n,
+                                                meta={"httpcache_ttl": 0})
+            return
+
         product_urls = getattr(self, "product_urls", None)
         if product_urls:
             for url in [u.strip() for u in product_urls.split(",") if u.strip()]:
-                yield scrapy.Request(url, callback=self.parse_product, meta={"playwright": False})
+                yield self._product_request(url)
             return
 
         query = getattr(self, "query", None)
@@ -124,7 +128,6 @@ class SorianaSpider(scrapy.Spider):
                     meta={
                         "playwright": True,
                         "playwright_page_methods": [
-                            PageMethod("route", "**/*", self._route_block_noise),
                             PageMethod("wait_for_load_state", "domcontentloaded"),
                             PageMethod("wait_for_load_state", "networkidle"),
                             PageMethod(
@@ -146,7 +149,6 @@ class SorianaSpider(scrapy.Spider):
                 meta={
                     "playwright": True,
                     "playwright_page_methods": [
-                        PageMethod("route", "**/*", self._route_block_noise),
                         PageMethod("wait_for_load_state", "domcontentloaded"),
                         PageMethod("wait_for_load_state", "networkidle"),
                         PageMethod("wait_for_timeout", 1200),
@@ -165,7 +167,7 @@ class SorianaSpider(scrapy.Spider):
                 ).strip()
                 if card_title and not _title_contains_all_terms(card_title, query_terms):
                     continue
-            yield scrapy.Request(url, callback=self.parse_product, meta={"playwright": False})
+            yield self._product_request(url)
             yielded += 1
             if self.max_products and yielded >= self.max_products:
                 break
@@ -182,7 +184,6 @@ class SorianaSpider(scrapy.Spider):
                         "playwright": True,
                         "page_no": response.meta.get("page_no", 1) + 1,
                         "playwright_page_methods": [
-                            PageMethod("route", "**/*", self._route_block_noise),
                             PageMethod("wait_for_load_state", "domcontentloaded"),
                             PageMethod("wait_for_load_state", "networkidle"),
                             PageMethod("wait_for_timeout", 1000),
@@ -194,7 +195,7 @@ class SorianaSpider(scrapy.Spider):
     def parse_category(self, response):
         yielded = 0
         for url in self._iter_product_links(response):
-            yield scrapy.Request(url, callback=self.parse_product, meta={"playwright": False})
+            yield self._product_request(url)
             yielded += 1
             if self.max_products and yielded >= self.max_products:
                 break
@@ -209,7 +210,6 @@ class SorianaSpider(scrapy.Spider):
                         "playwright": True,
                         "page_no": response.meta.get("page_no", 1) + 1,
                         "playwright_page_methods": [
-                            PageMethod("route", "**/*", self._route_block_noise),
                             PageMethod("wait_for_load_state", "domcontentloaded"),
                             PageMethod("wait_for_load_state", "networkidle"),
                             PageMethod("wait_for_timeout", 1000),
@@ -218,51 +218,25 @@ class SorianaSpider(scrapy.Spider):
                 )
 
     # -------- FICHA DE PRODUCTO --------
+    def _product_request(self, url, priority=0, meta=None):
+        # Primero por HTTP; rivalwatch.rendering lo renderiza con estos pasos si llega sin precio
+        return scrapy.Request(url, callback=self.parse_product, priority=priority, meta={
+            "playwright_page_methods": [
+                PageMethod("wait_for_load_state", "domcontentloaded"),
+                PageMethod("wait_for_load_state", "networkidle"),
+                PageMethod("wait_for_selector", "#clevertap-price", timeout=20_000),
+            ],
+            **(meta or {}),
+        })
+
+    def _has_price(self, response):
+        return _extract_price(response) is not None
+
     def parse_product(self, response):
-        # Precio desde input oculto
-        price_raw = response.css('input#clevertap-price::attr(value)').get()
-        price = _to_float(price_raw)
-
-        # Fallback JSON-LD si no hay input
-        if price is None:
-            for txt in response.css('script[type="application/ld+json"]::text').getall():
-                try:
-                    data = json.loads(txt)
-                    nodes = data if isinstance(data, list) else [data]
-                    for n in nodes:
-                        if isinstance(n, dict):
-                            offers = n.get("offers")
-                            if isinstance(offers, dict):
-                                p = offers.get("price")
-                                if p:
-                                    price = _to_float(str(p))
-                                    if price is not None:
-                                        break
-                    if price is not None:
-                        break
-                except Exception:
-                    pass
-
-        # Reintento único con JS si sigue sin precio
-        tried_js = response.meta.get("tried_js")
-        if price is None and not tried_js:
-            yield response.request.replace(
-                meta={
-                    "playwright": True,
-                    "tried_js": True,
-                    "playwright_page_methods": [
-                        PageMethod("route", "**/*", self._route_block_noise),
-                        PageMethod("wait_for_load_state", "domcontentloaded"),
-                        PageMethod("wait_for_load_state", "networkidle"),
-                        PageMethod("wait_for_selector", "#clevertap-price", timeout=20_000),
-                    ],
-                },
-                dont_filter=True,
-            )
-            return
-        
+        price = _extract_price(response)
+
         # === AÑADIDO: EXTRAER IMAGEN ===
-        image_url = response.css('meta[property="og:image"]::attr(content)').get()
+        image_url = structured(response).meta.get("og:image")
 
         currency = _extract_currency(response) or "MXN"
         title = (response.css("h1::text").get() or "").strip()
@@ -323,13 +297,3 @@ class SorianaSpider(scrapy.Spider):
             cur = int(m.group(1))
             return re.sub(r'(?:[?&])page=\d+', f'?page={cur+1}', response.url)
         return None
-
-    # -------- Playwright: bloquear ruido --------
-    async def _route_block_noise(self, route, request):
-        rtype = request.resource_type
-        if rtype in ("image", "font", "media"):
-            return await route.abort()
-        url = request.url
-        if any(d in url for d in ("google-analytics.com", "googletagmanager.com", "facebook.net", "doubleclick.net")):
-            return await route.abort()
-        return await route.continue_()
\ No newline at end of file
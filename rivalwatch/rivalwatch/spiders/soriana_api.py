@@ -0,0 +1,14 @@
+# soriana_api.py — búsqueda en Soriana por el API de catálogo de VTEX, sin navegador
+from rivalwatch.vtex import VtexSearchSpider
+
+
+class SorianaApiSpider(VtexSearchSpider):
+    """Mismos productos que ``soriana`` (que recorre el sitio con Playwright), en JSON.
+
+    Sin ``segment_token`` VTEX usa el canal de venta por defecto de la tienda;
+    para precios de una sucursal se pasa su segmento con ``-a segment_token=...``.
+    """
+
+    name = "soriana_api"
+    allowed_domains = ["soriana.com"]
+    base_url = "https://www.soriana.com"
@@ -1,5 +1,4 @@
 # rivalwatch/spiders/walmart.py
-import json
 import re
 from urllib.parse import urlencode, urljoin, urlparse, quote_plus
 
@@ -7,6 +6,10 @@ import scrapy
 from scrapy import Request
 from scrapy_playwright.page import PageMethod
 
+from rivalwatch.extraction import find_price, iter_product_links, looks_like_bot_wall, stock_hint
+from rivalwatch.recrawl import plan_entries
+from rivalwatch.structured import structured
+
 
 class WalmartMxSpider(scrapy.Spider):
     name = "walmart_mx"
@@ -47,11 +50,18 @@ class WalmartMxSpider(scrapy.Spider):
         "CONCURRENT_REQUESTS_PER_DOMAIN": 4,
         "DOWNLOAD_DELAY": 0.5,
         "RETRY_TIMES": 3,
+        # Render caro: una página renderizada vale por 6 h (rivalwatch.httpcache)
+        "HTTPCACHE_TTL": 6 * 3600,
 
         # Export
         "FEED_EXPORT_ENCODING": "utf-8",
     }
 
+    # Una vez por contexto (rivalwatch.pagepool), antes de cualquier navegación
+    playwright_init_scripts = [
+        "Object.defineProperty(navigator,'webdriver',{get:()=>undefined});",
+    ]
+
     def add_options(self, parser):
         parser.add_argument("-a", "--query", help="Texto a buscar (p.ej. Harina)")
         parser.add_argument(
@@ -65,32 +75,15 @@ class WalmartMxSpider(scrapy.Spider):
         self._seen = set()
         self._emitted = 0
 
-    # ---- Playwright helpers -------------------------------------------------
+    def httpcache_reject(self, response):
+        # Un muro anti-bots llega como 200: no se guarda en el caché HTTP (rivalwatch.httpcache)
+        return looks_like_bot_wall(response.text)
 
-    async def _route_block_noise(self, route):
-        req = route.request
-        rtype = req.resource_type
-        url = req.url
-        if rtype in ("image", "media", "font"):
-            return await route.abort()
-        if any(s in url for s in (
-            "doubleclick.net",
-            "googletagmanager.com",
-            "google-analytics.com",
-            "facebook.net",
-            "hotjar.com",
-        )):
-            return await route.abort()
-        return await route.continue_()
+    # ---- Playwright helpers -------------------------------------------------
 
     def _playwright_methods(self):
         """Esperas genéricas + auto-scroll para disparar contenido perezoso."""
         return [
-            PageMethod(
-                "add_init_script",
-                "Object.defineProperty(navigator,'webdriver',{get:()=>undefined});",
-            ),
-            PageMethod("route", "**/*", self._route_block_noise),
             PageMethod("wait_for_load_state", "domcontentloaded"),
             PageMethod("wait_for_load_state", "networkidle"),
             # Auto-scroll simple
@@ -109,7 +102,30 @@ class WalmartMxSpider(scrapy.Spider):
 
     # ---- Crawl flow ---------------------------------------------------------
 
+    def _product_request(self, url, priority=0, meta=None):
+        return Request(
+            url,
+            callback=self.parse_product,
+            meta={
+                "playwright": True,
+                "playwright_page_methods": self._playwright_methods(),
+                **(meta or {}),
+            },
+            headers={"Accept": "text/html,application/xhtml+xml"},
+            priority=priority,
+            dont_filter=True,
+        )
+
     def start_requests(self):
+        # -a plan=state/recrawl/walmart_mx.jsonl (scrapy recrawl_plan): solo esas fichas, en orden
+        entries = plan_entries(self)
+        if entries is not None:
+            for n, entry in enumerate(entries):
+                if entry.get("url"):
+                    yield self._product_request(entry["url"], priority=len(entries) - n,
+                                                meta={"httpcache_ttl": 0})
+            return
+
         if not self.query:
             self.logger.warning("No se proporcionó -a query='...'  (p.ej. Harina)")
             return
@@ -135,62 +151,24 @@ class WalmartMxSpider(scrapy.Spider):
         page_no = response.meta.get("page_no", 1)
 
         # Posible muro anti-bots: HTML 200 pero sin grid
-        if any(s in response.text.lower() for s in ("captcha", "verify you are human", "acceso denegado")):
+        if looks_like_bot_wall(response.text):
             self.logger.warning(f"[P{page_no}] Posible bot wall en {response.url}. Considera usar proxy residencial.")
             return
 
-        product_urls = set()
-
-        # 1) Anchors que terminan en /p
-        for href in response.css('a[href$="/p"]::attr(href)').getall():
-            product_urls.add(urljoin(response.url, href))
-
-        # 2) __NEXT_DATA__ (Next.js)
-        next_data = response.css('script#__NEXT_DATA__::text').get()
-        if next_data:
-            try:
-                data = json.loads(next_data)
-
-                def walk(obj):
-                    if isinstance(obj, dict):
-                        for k, v in obj.items():
-                            if k in ("link", "url") and isinstance(v, str) and v.endswith("/p"):
-                                product_urls.add(urljoin(response.url, v))
-                            else:
-                                walk(v)
-                    elif isinstance(obj, list):
-                        for it in obj:
-                            walk(it)
-
-                walk(data)
-            except Exception:
-                pass
-
-        # 3) Fallback: regex "/algo/p"
-        if not product_urls:
-            for m in re.finditer(r'"/([^"]+?/p)"', response.text):
-                product_urls.add(urljoin(response.url, m.group(1)))
-
-        if not product_urls:
-            self.logger.warning(f"[P{page_no}] No se encontraron productos en {response.url}")
-
-        # Encola detalle de producto
-        for url in product_urls:
+        # Una pasada sobre el HTML: anchors /p, llaves link/url del __NEXT_DATA__ y,
+        # si no hubo ninguno, rutas "/.../p" sueltas (ver rivalwatch.extraction)
+        found = False
+        for url in iter_product_links(response.text, response.url):
+            found = True
             if self._emitted >= self.max_products:
                 break
             if url in self._seen:
                 continue
             self._seen.add(url)
-            yield Request(
-                url,
-                callback=self.parse_product,
-                meta={
-                    "playwright": True,
-                    "playwright_page_methods": self._playwright_methods(),
-                },
-                headers={"Accept": "text/html,application/xhtml+xml"},
-                dont_filter=True,
-            )
+            yield self._product_request(url)
+
+        if not found:
+            self.logger.warning(f"[P{page_no}] No se encontraron productos en {response.url}")
 
         # Paginación robusta
         if self._emitted < self.max_products:
@@ -239,32 +217,22 @@ class WalmartMxSpider(scrapy.Spider):
         """Extrae datos del detalle de producto."""
         url = response.url
 
-        # Preferimos JSON-LD si existe
-        data = self._collect_jsonld(response)
+        # Preferimos JSON-LD (y meta tags) si existen
+        data = structured(response)
 
         title = self._first_nonempty(
-            data.get("name"),
+            data.product.get("name"),
             response.css("h1::text").get(),
-            response.css('meta[property="og:title"]::attr(content)').get(),
-            response.css('meta[name="twitter:title"]::attr(content)').get(),
+            data.meta.get("og:title"),
+            data.meta.get("twitter:title"),
         )
 
-        price_raw = None
-        currency = "MXN"
-        in_stock = None
-
-        offers = data.get("offers") or {}
-        if isinstance(offers, dict):
-            price_raw = offers.get("price") or (offers.get("priceSpecification") or {}).get("price")
-            currency = offers.get("priceCurrency", currency)
-            availability = (offers.get("availability") or "").lower()
-            if "instock" in availability:
-                in_stock = True
-            elif "outofstock" in availability:
-                in_stock = False
+        price_raw = data.price_raw
+        currency = data.currency or "MXN"
+        in_stock = data.availability
 
         if price_raw is None:
-            price_raw = self._find_price_in_html(response.text)
+            price_raw = find_price(response.text)
 
         price = None
         if price_raw is not None:
@@ -273,21 +241,22 @@ class WalmartMxSpider(scrapy.Spider):
             except Exception:
                 price = None
 
-        sku = data.get("sku") or self._sku_from_url(url)
+        sku = data.sku or self._sku_from_url(url)
 
         if in_stock is None:
-            txt = response.text.lower()
-            if "agotado" in txt or "sin existencias" in txt:
-                in_stock = False
-            elif "agregar al carrito" in txt or "añadir al carrito" in txt:
-                in_stock = True
+            in_stock = stock_hint(response.text)
 
+        image_url = data.image
+
+        # Mismos nombres de campo que los demás spiders (los que usa la pipeline)
         item = {
-            "store": "walmart",
-            "url": url,
-            "title": (title or "").strip(),
+            "titulo": (title or "").strip(),
+            "precio": price,
+            "url_imagen": urljoin(url, image_url) if image_url else None,
             "sku": sku,
-            "price": price,
+            "url": url,
+            "marca": data.brand,
+            "store": "walmart",
             "price_raw": price_raw,
             "currency": currency or "MXN",
             "in_stock": bool(in_stock) if in_stock is not None else None,
@@ -298,32 +267,6 @@ class WalmartMxSpider(scrapy.Spider):
 
     # ---- Utilities ----------------------------------------------------------
 
-    def _collect_jsonld(self, response):
-        scripts = response.css('script[type="application/ld+json"]::text').getall()
-        for s in scripts:
-            s = s.strip()
-            if not s:
-                continue
-            try:
-                data = json.loads(s)
-            except Exception:
-                try:
-                    s_fixed = "[" + ",".join(part for part in re.split(r"}\s*{", s.replace("\n", " ")) if part) + "]"
-                    data = json.loads(s_fixed)
-                except Exception:
-                    continue
-
-            candidates = data if isinstance(data, list) else [data]
-            for obj in candidates:
-                if not isinstance(obj, dict):
-                    continue
-                typ = (obj.get("@type") or obj.get("type") or "")
-                if isinstance(typ, list):
-                    typ = " ".join(typ)
-                if "Product" in str(typ):
-                    return obj
-        return {}
-
     def _sku_from_url(self, url: str):
         try:
             path = urlparse(url).path.rstrip("/")
@@ -342,23 +285,3 @@ class WalmartMxSpider(scrapy.Spider):
                 if v:
                     return v
         return None
-
-    def _find_price_in_html(self, html: str):
-        snippets = []
-        for kw in ("price", "Precio", "precio", "sales", "offer", "Oferta", "oferta"):
-            for m in re.finditer(r".{0,80}" + re.escape(kw) + r".{0,80}", html, flags=re.I | re.S):
-                snippets.append(m.group(0))
-        if not snippets:
-            snippets = [html[:50000]]
-
-        price_re = re.compile(
-            r"\$?\s*([0-9]{1,3}(?:[.,][0-9]{3})*(?:[.,][0-9]{2})|[0-9]+(?:[.,][0-9]{2})?)",
-            flags=re.M,
-        )
-        for chunk in snippets:
-            for m in price_re.finditer(chunk):
-                raw = m.group(1)
-                if raw.count(",") > 1 and "." not in raw:
-                    raw = raw.replace(".", "").replace(",", ".")
-                return raw
-        return None
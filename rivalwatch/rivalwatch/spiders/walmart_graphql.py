@@ -1,9 +1,11 @@
 import json
 import time
-from urllib.parse import urlencode
+from urllib.parse import urlencode, urljoin
 
 import scrapy
 
+from rivalwatch.recrawl import plan_entries
+
 
 def _now_ms():
     return int(time.time() * 1000)
@@ -17,6 +19,8 @@ class WalmartGraphQLSpider(scrapy.Spider):
         "CONCURRENT_REQUESTS": 8,
         "CONCURRENT_REQUESTS_PER_DOMAIN": 4,
         "DOWNLOAD_DELAY": 0.3,
+        # El POST no trae ETag: una respuesta vale por 1 h (rivalwatch.httpcache)
+        "HTTPCACHE_TTL": 3600,
         "DEFAULT_REQUEST_HEADERS": {
             # Headers realistas para parecer navegador
             "Accept": "*/*",
@@ -34,12 +38,28 @@ class WalmartGraphQLSpider(scrapy.Spider):
         "AUTOTHROTTLE_ENABLED": True,
     }
 
+    # Modos de detalle:
+    #   batch  -> un POST por cada batch_size productos (aliases i0, i1, ... en un solo documento);
+    #             con el default (24 = tamaño de página de búsqueda) es un POST por página
+    #   detail -> un POST ItemById por producto (el modo original)
+    #   search -> sin detalle: el item sale del hit de búsqueda (sin marca, precio de lista ni SEO)
+    MODES = ("batch", "detail", "search")
+    # Productos por POST con -a plan=... (el batch_size por default)
+    plan_batch_size = 24
+
     # parámetros CLI
     # scrapy crawl walmart_mx_graphql -O out.jsonl -a query="Harina" -a max_products=50
-    def __init__(self, query: str, max_products: int = 100, *args, **kwargs):
+    # scrapy crawl walmart_mx_graphql -a query="Harina" -a mode=search
+    # scrapy crawl walmart_mx_graphql -a plan=state/recrawl/walmart_mx_graphql.jsonl
+    def __init__(self, query: str = None, max_products: int = 100, mode: str = "batch", batch_size: int = 24,
+                 *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.search_query = query
         self.max_products = int(max_products)
+        if mode not in self.MODES:
+            raise ValueError(f"mode debe ser uno de {', '.join(self.MODES)} (se recibió {mode!r})")
+        self.mode = mode
+        self.batch_size = max(1, int(batch_size))
 
         # ====== GraphQL strings ======
         # 1) Query de búsqueda: trae resultados con campos básicos (id, nombre, precios, url)
@@ -94,11 +114,53 @@ class WalmartGraphQLSpider(scrapy.Spider):
         }
         """.strip()
 
+        # 3) Los mismos campos como fragmentos, para el documento por lotes (items_query)
+        self.ITEM_FRAGMENTS = """
+        fragment ItemFields on Product {
+          id
+          usItemId
+          name
+          canonicalUrl
+          imageInfo { thumbnailUrl allImages { id url } }
+          availabilityStatus
+          priceInfo {
+            currentPrice { price priceString }
+            listPrice    { price priceString }
+            wasPrice     { price priceString }
+          }
+          brand
+          sellerName
+        }
+        fragment SeoFields on SeoItemMetaData {
+          metaTitle
+          metaDescription
+          canonicalURL
+        }
+        """.strip()
+
+    def items_query(self, count):
+        """Documento ``ItemsById`` con ``count`` productos: ``i<n>``/``s<n>`` por cada ``$i<n>``."""
+        # Solo se declaran variables que se usan (GraphQL rechaza las que sobran)
+        params = ", ".join(f"$i{n}: String!" for n in range(count))
+        fields = "\n".join(
+            f"  i{n}: product(itemId: $i{n}, selected: true) {{ ...ItemFields }}\n"
+            f"  s{n}: seoItemMetaData(id: $i{n}) {{ ...SeoFields }}"
+            for n in range(count)
+        )
+        return (f"query ItemsById({params}) {{\n"
+                f"{fields}\n}}\n{self.ITEM_FRAGMENTS}")
+
     # endpoints
     SEARCH_ENDPOINT = "https://super.walmart.com.mx/api/graphql"
     ITEM_ENDPOINT_TMPL = "https://super.walmart.com.mx/orchestra/graphql/ip/{item_id}"
 
     def start_requests(self):
+        # Con plan (scrapy recrawl_plan) no hay búsqueda: los ids del plan van directo al detalle
+        entries = plan_entries(self)
+        if entries is not None:
+            yield from self.plan_requests(entries)
+            return
+
         # Paginamos en chunks de 24 (o el tamaño que prefieras)
         page_size = 24
         fetched = 0
@@ -147,40 +209,101 @@ class WalmartGraphQLSpider(scrapy.Spider):
                                 self.search_query, from_, size)
             return
 
-        # Para cada producto, emitimos request de detalle (ItemById)
-        for p in products:
-            us_item_id = p.get("usItemId")
-            if not us_item_id:
-                continue
-
-            # Variables mínimas para ItemById (tenant MX y page type global)
-            variables = {
-                "iId": str(us_item_id),
-                "pageType": "ItemPageGlobal",
-                "tenant": "WALMART-MX",
-                # Dejar defaults para 'version' y 'postProcessingVersion'
-            }
-
-            payload = {
-                "operationName": "ItemById",
-                "query": self.ITEM_BY_ID_QUERY,
-                "variables": variables,
-            }
-
-            url = self.ITEM_ENDPOINT_TMPL.format(item_id=us_item_id)
-            yield scrapy.Request(
-                url=url,
-                method="POST",
-                body=json.dumps(payload),
-                headers={"Content-Type": "application/json"},
-                callback=self.parse_item,
-                cb_kwargs={"search_hit": p},
-            )
+        hits = [p for p in products if p.get("usItemId")]
+        if self.mode == "search":
+            for p in hits:
+                yield self.build_item(p)
+        elif self.mode == "batch":
+            for start in range(0, len(hits), self.batch_size):
+                yield self.batch_request(hits[start:start + self.batch_size])
+        else:
+            for p in hits:
+                yield self.item_request(p)
 
         # Si el total real es menor a lo solicitado, no seguimos paginando
         if from_ + size >= total:
             return
 
+    def plan_requests(self, entries):
+        # La entrada hace de hit de búsqueda: si el detalle falla, el item sale con lo que ya sabíamos
+        hits = [
+            {"usItemId": str(entry["sku"]), "name": entry.get("titulo"), "canonicalUrl": entry.get("url")}
+            for entry in entries if entry.get("sku")
+        ]
+        if self.mode == "detail":
+            requests = [self.item_request(hit, priority=len(hits) - n) for n, hit in enumerate(hits)]
+        else:
+            batches = [hits[n:n + self.batch_size] for n in range(0, len(hits), self.batch_size)]
+            requests = [self.batch_request(batch, priority=len(batches) - n) for n, batch in enumerate(batches)]
+        for request in requests:
+            # Si el plan dice que toca, no vale la copia del caché (HTTPCACHE_TTL)
+            request.meta["httpcache_ttl"] = 0
+            yield request
+
+    def item_request(self, p, priority=0):
+        us_item_id = p["usItemId"]
+        # Variables mínimas para ItemById (tenant MX y page type global)
+        variables = {
+            "iId": str(us_item_id),
+            "pageType": "ItemPageGlobal",
+            "tenant": "WALMART-MX",
+            # Dejar defaults para 'version' y 'postProcessingVersion'
+        }
+
+        payload = {
+            "operationName": "ItemById",
+            "query": self.ITEM_BY_ID_QUERY,
+            "variables": variables,
+        }
+
+        url = self.ITEM_ENDPOINT_TMPL.format(item_id=us_item_id)
+        return scrapy.Request(
+            url=url,
+            method="POST",
+            body=json.dumps(payload),
+            headers={"Content-Type": "application/json"},
+            callback=self.parse_item,
+            cb_kwargs={"search_hit": p},
+            priority=priority,
+        )
+
+    def batch_request(self, hits, priority=0):
+        variables = {f"i{n}": str(p["usItemId"]) for n, p in enumerate(hits)}
+
+        payload = {
+            "operationName": "ItemsById",
+            "query": self.items_query(len(hits)),
+            "variables": variables,
+        }
+
+        # El endpoint de item acepta cualquier documento; se usa el del primer producto del lote
+        url = self.ITEM_ENDPOINT_TMPL.format(item_id=hits[0]["usItemId"])
+        return scrapy.Request(
+            url=url,
+            method="POST",
+            body=json.dumps(payload),
+            headers={"Content-Type": "application/json"},
+            callback=self.parse_batch,
+            cb_kwargs={"search_hits": hits},
+            priority=priority,
+            dont_filter=True,
+        )
+
+    def parse_batch(self, response, search_hits):
+        try:
+            data = response.json().get("data") or {}
+        except Exception:
+            # Un lote perdido son batch_size productos: se emiten con lo que trajo la búsqueda
+            self.logger.warning("Detalle por lote no-JSON (%s productos): %s", len(search_hits), response.text[:200])
+            data = {}
+
+        for n, hit in enumerate(search_hits):
+            # Un producto con error en GraphQL llega como null sin tumbar el resto del lote
+            prod = data.get(f"i{n}") or {}
+            if not prod:
+                self.logger.debug("Sin detalle para %s; se usa el hit de búsqueda", hit.get("usItemId"))
+            yield self.build_item(hit, prod, data.get(f"s{n}") or {})
+
     def parse_item(self, response, search_hit):
         try:
             data = response.json()
@@ -190,29 +313,38 @@ class WalmartGraphQLSpider(scrapy.Spider):
 
         prod = ((data.get("data") or {}).get("product")) or {}
         seo = ((data.get("data") or {}).get("seoItemMetaData")) or {}
+        yield self.build_item(search_hit, prod, seo)
+
+    def build_item(self, search_hit, prod=None, seo=None):
+        prod = prod or {}
+        seo = seo or {}
+        price_info = prod.get("priceInfo") or search_hit.get("priceInfo") or {}
 
-        # Campos de salida unificados (mezcla de hit de búsqueda + detalle)
-        yield {
+        canonical_url = (
+            (prod.get("canonicalUrl"))
+            or (seo.get("canonicalURL"))
+            or search_hit.get("canonicalUrl")
+        )
+
+        # Campos de salida unificados (mezcla de hit de búsqueda + detalle), con los
+        # mismos nombres que los demás spiders: titulo, precio, url_imagen, sku, url, marca
+        return {
+            "titulo": prod.get("name") or search_hit.get("name"),
+            "precio": (price_info.get("currentPrice") or {}).get("price"),
+            "url_imagen": (
+                ((prod.get("imageInfo") or {}).get("thumbnailUrl"))
+                or ((search_hit.get("imageInfo") or {}).get("thumbnailUrl"))
+            ),
+            "sku": prod.get("usItemId") or search_hit.get("usItemId"),
+            "url": urljoin("https://super.walmart.com.mx/", canonical_url) if canonical_url else None,
+            "marca": prod.get("brand"),
             "source": "walmart_mx",
             "query": self.search_query,
-            "us_item_id": prod.get("usItemId") or search_hit.get("usItemId"),
-            "name": prod.get("name") or search_hit.get("name"),
-            "brand": prod.get("brand"),
-            "price": (prod.get("priceInfo") or {}).get("currentPrice", {}).get("price"),
-            "price_string": (prod.get("priceInfo") or {}).get("currentPrice", {}).get("priceString"),
-            "list_price": (prod.get("priceInfo") or {}).get("listPrice", {}).get("price"),
-            "was_price": (prod.get("priceInfo") or {}).get("wasPrice", {}).get("price"),
+            "price_string": (price_info.get("currentPrice") or {}).get("priceString"),
+            "list_price": (price_info.get("listPrice") or {}).get("price"),
+            "was_price": (price_info.get("wasPrice") or {}).get("price"),
             "availability": prod.get("availabilityStatus") or search_hit.get("availabilityStatus"),
             "seller": prod.get("sellerName") or search_hit.get("sellerName"),
-            "canonical_url": (
-                (prod.get("canonicalUrl"))
-                or (seo.get("canonicalURL"))
-                or search_hit.get("canonicalUrl")
-            ),
-            "thumbnail": (
-                ((prod.get("imageInfo") or {}).get("thumbnailUrl"))
-                or ((search_hit.get("imageInfo") or {}).get("thumbnailUrl"))
-            ),
             "images": ((prod.get("imageInfo") or {}).get("allImages")) or [],
             "seo_title": seo.get("metaTitle"),
             "seo_description": seo.get("metaDescription"),
@@ -0,0 +1,148 @@
+# spool.py — respaldo local (append-only) para filas que no llegaron a SQL Server
+import datetime as dt
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(value):
+    if isinstance(value, (dt.datetime, dt.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Tipo no serializable en el spool: {type(value).__name__}")
+
+
+class Spool:
+    """Archivo JSONL al que solo se le agregan líneas, una fila por línea.
+
+    Mientras el crawl escribe, el archivo se llama ``*.jsonl.part``; al cerrar
+    se renombra a ``*.jsonl`` y queda listo para ``replay_spool``. Cada escritura
+    hace fsync, así que lo que entró al spool sobrevive a una caída del proceso.
+
+    Con ``version`` cada línea es ``{"v": version, "fila": [...]}``, para que el
+    replay sepa qué columnas trae aunque el formato de la fila cambie después.
+    """
+
+    def __init__(self, directory, prefix, version=None):
+        self.directory = directory
+        self.version = version
+        stamp = time.strftime("%Y%m%dT%H%M%S")
+        self.path = os.path.join(directory, f"{prefix}-{stamp}-{os.getpid()}.jsonl")
+        self.lock = threading.Lock()
+        self.file = None
+        self.rows = 0
+
+    def write(self, rows):
+        lines = "".join(json.dumps(self._line(r), default=_encode, ensure_ascii=False) + "\n" for r in rows)
+        with self.lock:
+            if self.file is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self.file = open(self.path + ".part", "a", encoding="utf-8")
+            self.file.write(lines)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.rows += len(rows)
+
+    def _line(self, row):
+        if self.version is None:
+            return list(row)
+        return {"v": self.version, "fila": list(row)}
+
+    def close(self):
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.close()
+            self.file = None
+            os.replace(self.path + ".part", self.path)
+        logger.warning(f"{self.rows} filas quedaron en el spool {self.path}; cárgalas con 'scrapy replay_spool'")
+
+
+def pending_files(directory, include_partial=False):
+    """Archivos listos para cargar, incluyendo los que quedaron a medias en un replay anterior."""
+    patterns = ["*.jsonl", "*.jsonl.replaying"]
+    if include_partial:
+        # .part de crawls que murieron sin cerrar el spool; no usar con crawls corriendo
+        patterns.append("*.jsonl.part")
+    files = []
+    for pattern in patterns:
+        files.extend(glob.glob(os.path.join(directory, pattern)))
+    return sorted(files)
+
+
+def replay_file(path, connect, write, prepare=None, decode=tuple, batch_size=1000):
+    """Carga un archivo del spool en lotes, con un commit por lote.
+
+    El archivo se renombra a ``.replaying`` antes de empezar y el número de
+    líneas ya confirmadas se guarda en ``.done``; si el replay se corta, la
+    siguiente corrida sigue donde se quedó sin duplicar filas. Las líneas que
+    ``decode`` no reconoce (``ValueError``) no se pierden: se apartan tal cual en
+    ``<archivo>.jsonl.rejected``, que ``pending_files`` no vuelve a tomar.
+    """
+    if not path.endswith(".replaying"):
+        base = path[:-len(".part")] if path.endswith(".part") else path
+        claimed = base + ".replaying"
+        os.replace(path, claimed)
+        path = claimed
+    done_path = path + ".done"
+    rejected_path = path[:-len(".replaying")] + ".rejected"
+
+    done = 0
+    if os.path.exists(done_path):
+        with open(done_path, encoding="utf-8") as f:
+            done = int(f.read().strip() or 0)
+
+    connection = connect()
+    cursor = connection.cursor()
+    cursor.fast_executemany = True
+    loaded = 0
+    try:
+        if prepare:
+            prepare(cursor)
+            connection.commit()
+        with open(path, encoding="utf-8") as f:
+            batch = []
+            for lineno, line in enumerate(f, start=1):
+                if lineno <= done or not line.strip():
+                    continue
+                try:
+                    batch.append(decode(json.loads(line)))
+                except ValueError as e:
+                    # Línea truncada por una caída, o de un formato que ya no se sabe cargar
+                    logger.warning(f"Línea {lineno} de {path} no se puede cargar ({e}); se aparta en {rejected_path}")
+                    with open(rejected_path, "a", encoding="utf-8") as rejected:
+                        rejected.write(line if line.endswith("\n") else line + "\n")
+                    continue
+                if len(batch) >= batch_size:
+                    _load_batch(connection, cursor, write, batch, done_path, lineno)
+                    loaded += len(batch)
+                    batch = []
+            if batch:
+                _load_batch(connection, cursor, write, batch, done_path, lineno)
+                loaded += len(batch)
+    finally:
+        cursor.close()
+        connection.close()
+
+    os.remove(path)
+    if os.path.exists(done_path):
+        os.remove(done_path)
+    return loaded
+
+
+def _load_batch(connection, cursor, write, batch, done_path, lineno):
+    try:
+        write(cursor, batch)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    with open(done_path, "w", encoding="utf-8") as f:
+        f.write(str(lineno))
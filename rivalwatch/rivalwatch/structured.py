@@ -0,0 +1,282 @@
+# structured.py — JSON-LD, meta tags y estado embebido de una respuesta, parseados una sola vez
+import json
+import re
+import weakref
+from functools import cached_property
+
+# Estado de la app embebido en el HTML, por nombre
+EMBEDDED_STATE = {
+    "next": "script#__NEXT_DATA__::text",
+    "vtex": 'template[data-varname="__STATE__"] script::text',
+}
+
+_CDATA_RE = re.compile(r"^\s*(?://\s*)?<!\[CDATA\[|(?://\s*)?\]\]>\s*$|^\s*<!--|-->\s*$")
+_CONCAT_RE = re.compile(r"}\s*{")
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+_DECIMAL_COMMA_RE = re.compile(r",\d{1,2}$")
+
+_cache = weakref.WeakKeyDictionary()
+
+
+def structured(response):
+    """El ``StructuredData`` de ``response``; el mismo objeto para todos los que lo pidan
+    (middlewares, reglas de render y callbacks), así que nada se parsea dos veces."""
+    data = _cache.get(response)
+    if data is None:
+        data = _cache[response] = StructuredData(response)
+    return data
+
+
+def parse_json_ld(text):
+    """Un bloque ``application/ld+json`` -> objeto, reparando lo que los sitios suelen romper.
+
+    En orden: comentarios/CDATA alrededor, saltos de línea dentro de strings,
+    varios objetos pegados (``}{``) y comas finales. ``None`` si aun así no es JSON.
+    """
+    text = _CDATA_RE.sub("", text.strip())
+    if not text:
+        return None
+    attempts = (
+        lambda t: json.loads(t),
+        lambda t: json.loads(t, strict=False),
+        lambda t: json.loads("[" + _CONCAT_RE.sub("},{", t) + "]", strict=False),
+        lambda t: json.loads("[" + _TRAILING_COMMA_RE.sub(r"\1", _CONCAT_RE.sub("},{", t)) + "]", strict=False),
+    )
+    for attempt in attempts:
+        try:
+            return attempt(text)
+        except ValueError:
+            continue
+    return None
+
+
+def _to_float(text):
+    # Con punto y coma, el que va al último es el decimal ("1,234.50", "1.234,50"); con
+    # solo comas, es decimal si le siguen uno o dos dígitos al final ("25,50", no "1,500")
+    if "," in text and "." in text:
+        if text.rfind(",") > text.rfind("."):
+            text = text.replace(".", "").replace(",", ".")
+        else:
+            text = text.replace(",", "")
+    elif "," in text:
+        if _DECIMAL_COMMA_RE.search(text):
+            head, _, tail = text.rpartition(",")
+            text = head.replace(",", "") + "." + tail
+        else:
+            text = text.replace(",", "")
+    elif text.count(".") > 1:
+        # "1.234.567": solo separadores de miles
+        text = text.replace(".", "")
+    return float(text)
+
+
+def to_number(value):
+    """``25``, ``"25.50"``, ``"$1,234.50"``, ``"1.234,50"`` -> float; ``None`` si no hay número."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip().replace("\xa0", " ")
+    try:
+        return _to_float(text)
+    except ValueError:
+        pass
+    match = _NUMBER_RE.search(text)
+    if not match:
+        return None
+    try:
+        return _to_float(match.group(0))
+    except ValueError:
+        return None
+
+
+def _types(node):
+    typ = node.get("@type") or node.get("type") or ""
+    if isinstance(typ, list):
+        typ = " ".join(str(t) for t in typ)
+    return str(typ)
+
+
+def _first_text(*values):
+    for value in values:
+        if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+            value = str(value).strip()
+            if value:
+                return value
+    return None
+
+
+class StructuredData:
+    """Vista perezosa de los datos estructurados de una respuesta.
+
+    Cada fuente se extrae la primera vez que se pide y queda guardada: los
+    bloques JSON-LD (aplanados, con ``@graph`` expandido), las meta tags
+    (``property``/``name``/``itemprop`` en minúsculas -> ``content``) y el estado
+    de la app (``__NEXT_DATA__``, ``__STATE__`` de VTEX). Los accesores
+    (``product``, ``offers``, ``price``, ``currency``, ``sku``,
+    ``availability``, ...) leen de ahí, primero el JSON-LD y luego las meta tags.
+    """
+
+    def __init__(self, response):
+        self.response = response
+        self._embedded = {}
+
+    # ---- Fuentes ------------------------------------------------------------
+
+    @cached_property
+    def json_ld(self):
+        """Todos los nodos JSON-LD de la página, como lista plana de dicts."""
+        nodes = []
+        for text in self.response.css('script[type="application/ld+json"]::text').getall():
+            pending = [parse_json_ld(text)]
+            while pending:
+                obj = pending.pop(0)
+                if isinstance(obj, list):
+                    pending[:0] = obj
+                elif isinstance(obj, dict):
+                    nodes.append(obj)
+                    graph = obj.get("@graph")
+                    if isinstance(graph, list):
+                        pending[:0] = graph
+        return nodes
+
+    @cached_property
+    def meta(self):
+        tags = {}
+        for tag in self.response.xpath("//meta[@content]"):
+            attrib = tag.attrib
+            key = attrib.get("property") or attrib.get("name") or attrib.get("itemprop")
+            if key:
+                tags.setdefault(key.strip().lower(), attrib["content"].strip())
+        return tags
+
+    def embedded(self, name):
+        """Estado embebido ``name`` (ver ``EMBEDDED_STATE``) ya parseado, o ``None``."""
+        if name not in self._embedded:
+            text = self.response.css(EMBEDDED_STATE[name]).get()
+            value = None
+            if text:
+                try:
+                    value = json.loads(text)
+                except ValueError:
+                    value = None
+            self._embedded[name] = value
+        return self._embedded[name]
+
+    @cached_property
+    def app_state(self):
+        """El primer estado embebido que tenga la página."""
+        for name in EMBEDDED_STATE:
+            state = self.embedded(name)
+            if state is not None:
+                return state
+        return None
+
+    # ---- Accesores ----------------------------------------------------------
+
+    @cached_property
+    def product(self):
+        """El primer nodo JSON-LD de tipo Product (o ProductGroup, ...); ``{}`` si no hay."""
+        return next((node for node in self.json_ld if "Product" in _types(node)), {})
+
+    @cached_property
+    def offers(self):
+        """Ofertas del producto; las de un AggregateOffer se expanden."""
+        offers = self.product.get("offers")
+        if offers is None:
+            # Algunos sitios publican la oferta como nodo aparte
+            offers = [node for node in self.json_ld if "Offer" in _types(node)]
+        offers = offers if isinstance(offers, list) else [offers]
+        result = []
+        for offer in offers:
+            if not isinstance(offer, dict):
+                continue
+            result.append(offer)
+            inner = offer.get("offers")
+            if isinstance(inner, list):
+                result.extend(o for o in inner if isinstance(o, dict))
+            elif isinstance(inner, dict):
+                result.append(inner)
+        return result
+
+    @property
+    def offer(self):
+        return self.offers[0] if self.offers else {}
+
+    @cached_property
+    def price_raw(self):
+        """El precio tal como viene (número o texto), sin convertir."""
+        for offer in self.offers:
+            spec = offer.get("priceSpecification")
+            if isinstance(spec, list):
+                spec = spec[0] if spec else None
+            for value in (offer.get("price"), (spec or {}).get("price") if isinstance(spec, dict) else None,
+                          offer.get("lowPrice")):
+                if value not in (None, ""):
+                    return value
+        return self.meta.get("product:price:amount") or self.meta.get("og:price:amount")
+
+    @cached_property
+    def price(self):
+        return to_number(self.price_raw)
+
+    @cached_property
+    def currency(self):
+        for offer in self.offers:
+            spec = offer.get("priceSpecification")
+            value = _first_text(offer.get("priceCurrency"),
+                                spec.get("priceCurrency") if isinstance(spec, dict) else None)
+            if value:
+                return value
+        return _first_text(self.meta.get("product:price:currency"), self.meta.get("og:price:currency"))
+
+    @cached_property
+    def availability(self):
+        """``True`` en existencia, ``False`` agotado, ``None`` si la página no lo dice."""
+        values = [str(offer.get("availability") or "") for offer in self.offers]
+        values.append(self.meta.get("product:availability") or self.meta.get("og:availability") or "")
+        for value in values:
+            value = value.lower().replace(" ", "")
+            if not value:
+                continue
+            if any(s in value for s in ("outofstock", "soldout", "discontinued", "oos")):
+                return False
+            if "instock" in value or "limitedavailability" in value:
+                return True
+        return None
+
+    @cached_property
+    def sku(self):
+        """SKU del producto; si no tiene, el de cualquier nodo JSON-LD que lo traiga."""
+        product = self.product
+        sku = _first_text(product.get("sku"), product.get("productID"), product.get("mpn"))
+        if sku:
+            return sku
+        for node in self.json_ld:
+            sku = _first_text(node.get("sku"), node.get("productID"), node.get("mpn"))
+            if sku:
+                return sku
+        return self.meta.get("sku") or self.meta.get("product:retailer_item_id")
+
+    @cached_property
+    def brand(self):
+        brand = self.product.get("brand")
+        if isinstance(brand, list):
+            brand = brand[0] if brand else None
+        if isinstance(brand, dict):
+            brand = brand.get("name")
+        return _first_text(brand, self.meta.get("product:brand"))
+
+    @cached_property
+    def title(self):
+        return _first_text(self.product.get("name"), self.meta.get("og:title"), self.meta.get("twitter:title"))
+
+    @cached_property
+    def image(self):
+        image = self.product.get("image")
+        if isinstance(image, list):
+            image = image[0] if image else None
+        if isinstance(image, dict):
+            image = image.get("url") or image.get("contentUrl")
+        return _first_text(image, self.meta.get("og:image"), self.meta.get("twitter:image"))
@@ -0,0 +1,169 @@
+# vtex.py — base para tiendas VTEX: búsqueda por el API de catálogo, solo JSON
+import json
+import re
+from urllib.parse import quote, quote_plus
+
+import scrapy
+
+from rivalwatch.recrawl import plan_entries
+
+# "resources: 0-49/1234" -> ventana pedida y total de resultados
+_RESOURCES_RE = re.compile(r"(\d+)-(\d+)/(\d+)")
+
+
+class VtexSearchSpider(scrapy.Spider):
+    """Spider de búsqueda sobre ``/api/catalog_system/pub/products/search``.
+
+    La primera ventana (``_from``/``_to``) trae en el header ``resources`` el
+    total de resultados; con él se piden todas las ventanas restantes de una
+    vez y Scrapy las baja en paralelo (hasta ``CONCURRENT_REQUESTS_PER_DOMAIN``)
+    en vez de esperar cada página para pedir la siguiente.
+
+    Con ``-a plan=<archivo>`` (``scrapy recrawl_plan``) no se busca: se piden
+    los SKUs del plan, ``plan_batch_size`` por petición (``fq=skuId:...``).
+
+    Las subclases definen ``name``, ``base_url`` y, si la tienda lo necesita,
+    ``segment_token`` (cookie ``vtex_segment`` con canal de venta y sucursal).
+    """
+
+    base_url = None
+    segment_token = None
+    # VTEX no devuelve más de 50 productos por ventana ni pasa de _from=2500
+    page_size = 50
+    max_results = 2500
+    # SKUs por petición con -a plan=...
+    plan_batch_size = 50
+
+    custom_settings = {
+        "ROBOTSTXT_OBEY": False,
+        # La API es barata: nada se usa sin revalidar (rivalwatch.httpcache)
+        "HTTPCACHE_TTL": 0,
+    }
+
+    def __init__(self, query=None, max_products=50, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.query = (query or "").strip()
+        self.max_products = int(max_products or 50)
+        self.emitted = 0
+
+    # ---- URLs y peticiones --------------------------------------------------
+
+    def search_url(self, _from, _to):
+        return (f"{self.base_url}/api/catalog_system/pub/products/search"
+                f"?ft={quote_plus(self.query)}&_from={_from}&_to={_to}")
+
+    def skus_url(self, skus):
+        filters = "&".join(f"fq=skuId:{quote(str(sku))}" for sku in skus)
+        return f"{self.base_url}/api/catalog_system/pub/products/search?{filters}&_from=0&_to={len(skus) - 1}"
+
+    def window_request(self, _from, first=False, sequential=False):
+        _to = min(_from + self.page_size, self.max_products, self.max_results) - 1
+        return self.api_request(self.search_url(_from, _to),
+                                cb_kwargs={"_from": _from, "first": first, "sequential": sequential})
+
+    def skus_request(self, skus, priority=0):
+        return self.api_request(self.skus_url(skus), priority=priority, meta={"httpcache_ttl": 0},
+                                cb_kwargs={"_from": 0, "first": False, "sequential": False, "skus": set(skus)})
+
+    def api_request(self, url, cb_kwargs, priority=0, meta=None):
+        return scrapy.Request(
+            url,
+            callback=self.parse_window,
+            errback=self.errback_window,
+            cookies={"vtex_segment": self.segment_token} if self.segment_token else None,
+            headers={"Accept": "application/json"},
+            cb_kwargs=cb_kwargs,
+            meta=meta,
+            priority=priority,
+            dont_filter=True,
+        )
+
+    def start_requests(self):
+        entries = plan_entries(self)
+        if entries is not None:
+            skus = [str(entry["sku"]) for entry in entries if entry.get("sku")]
+            self.max_products = len(skus)
+            batches = [skus[n:n + self.plan_batch_size] for n in range(0, len(skus), self.plan_batch_size)]
+            for n, batch in enumerate(batches):
+                yield self.skus_request(batch, priority=len(batches) - n)
+            return
+
+        if not self.query:
+            self.logger.error("No se proporcionó un término de búsqueda ('query'). Usa -a query='tu_busqueda'")
+            return
+        yield self.window_request(0, first=True)
+
+    # ---- Respuestas ---------------------------------------------------------
+
+    def parse_window(self, response, _from, first, sequential, skus=None):
+        # VTEX contesta 206 (Partial Content) cuando hay más resultados
+        if response.status not in (200, 206):
+            self.logger.error(f"El API devolvió {response.status} para _from={_from}: {response.text[:200]}")
+            return
+        try:
+            products = json.loads(response.text)
+        except json.JSONDecodeError:
+            self.logger.error(f"Respuesta no-JSON para _from={_from}: {response.text[:200]}")
+            return
+
+        for product in products:
+            if self.emitted >= self.max_products:
+                return
+            if skus is None:
+                item = self.product_item(product)
+                if item is not None:
+                    self.emitted += 1
+                    yield item
+                continue
+            # Plan: el SKU pedido, aunque no sea el primero del producto
+            for sku in product.get("items") or []:
+                if str(sku.get("itemId")) in skus:
+                    item = self.product_item(product, sku)
+                    if item is not None:
+                        self.emitted += 1
+                        yield item
+
+        limit = min(self.max_products, self.max_results)
+        match = _RESOURCES_RE.search((response.headers.get("resources") or b"").decode("latin-1"))
+        if first and match:
+            total = min(int(match.group(3)), limit)
+            self.logger.info(f"'{self.query}': {match.group(3)} resultados; se piden {total} "
+                             f"en {max(0, -(-total // self.page_size) - 1)} ventanas más")
+            for start in range(self.page_size, total, self.page_size):
+                yield self.window_request(start)
+        elif (first or sequential) and len(products) >= self.page_size and _from + self.page_size < limit:
+            # Sin header no se sabe el total: se sigue de una ventana a la vez
+            yield self.window_request(_from + self.page_size, sequential=True)
+
+    def errback_window(self, failure):
+        self.logger.error(f"Error al contactar el API de {self.name}: {failure.value}")
+
+    # ---- Items --------------------------------------------------------------
+
+    def product_item(self, product, sku=None):
+        """Producto VTEX -> item con los campos de la pipeline (de ``sku``, por default el
+        primero); None si no tiene SKU o vendedor."""
+        if sku is None:
+            skus = product.get("items") or []
+            if not skus:
+                return None
+            sku = skus[0]
+        sellers = sku.get("sellers") or []
+        if not sellers:
+            return None
+        # El primer vendedor con existencias; si ninguno tiene, el primero
+        seller = next((s for s in sellers if (s.get("commertialOffer") or {}).get("AvailableQuantity")),
+                      sellers[0])
+        offer = seller.get("commertialOffer") or {}
+        images = sku.get("images") or []
+        return {
+            "titulo": product.get("productName"),
+            "precio": offer.get("Price"),
+            "url_imagen": images[0].get("imageUrl") if images else None,
+            "sku": sku.get("itemId") or product.get("productId"),
+            "url": product.get("link"),
+            "marca": product.get("brand"),
+            "precio_lista": offer.get("ListPrice"),
+            "disponible": bool(offer.get("AvailableQuantity")),
+            "vendedor": seller.get("sellerName"),
+        }
@@ -0,0 +1,204 @@
+# writer.py — escritor de SQL Server en un hilo dedicado
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+from twisted.internet import defer, threads
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class SqlServerWriter:
+    """Escribe lotes en SQL Server desde un hilo propio para no bloquear el reactor.
+
+    ``put()`` se llama desde el reactor y devuelve un Deferred que se dispara
+    cuando la fila entra a la cola. Si la cola está llena el Deferred queda
+    pendiente, así que el item no termina de procesarse y el engine frena
+    solo (backpressure) en vez de congelar el event loop.
+
+    Con un ``spool`` configurado nunca se pierden filas: los lotes que fallan,
+    los que llegan mientras la base está caída y las filas que esperan más de
+    ``spool_timeout`` segundos por lugar en la cola se van al archivo local.
+    """
+
+    def __init__(self, pool, write, prepare=None, batch_size=500, flush_interval=5.0,
+                 max_pending=2000, on_batch=None, on_error=None,
+                 spool=None, spool_timeout=10.0, retry_interval=30.0, on_spool=None):
+        # write(cursor, rows) escribe un lote; prepare(cursor) se valida una vez antes del primero.
+        # on_batch(rows, segundos) recibe las filas que quedaron en la base; on_spool, cuántas
+        # se fueron al spool, y on_error, cuántas no quedaron en ningún lado. Cada fila
+        # se reporta en uno solo de los tres.
+        self.pool = pool
+        self.write = write
+        self.prepare = prepare
+        self.prepared = prepare is None
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = float(flush_interval)
+        self.on_batch = on_batch
+        self.on_error = on_error
+        self.spool = spool
+        self.spool_timeout = float(spool_timeout)
+        self.retry_interval = float(retry_interval)
+        self.on_spool = on_spool
+
+        self.queue = queue.Queue(maxsize=max(1, int(max_pending)))
+        # Filas que no cupieron en la cola; solo se tocan desde el reactor
+        self.waiting = deque()
+        self.spill_call = None
+        self.thread = None
+        # Tras un fallo no se reintenta la base hasta esta marca (monotonic)
+        self.retry_at = 0.0
+
+    # ---- Lado del reactor ---------------------------------------------------
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="sqlserver-writer", daemon=True)
+        self.thread.start()
+
+    def put(self, row):
+        if not self.waiting:
+            try:
+                self.queue.put_nowait(row)
+                return defer.succeed(None)
+            except queue.Full:
+                pass
+        d = defer.Deferred()
+        self.waiting.append((row, d, time.monotonic()))
+        self._schedule_spill()
+        return d
+
+    def close(self):
+        # Para este punto el scraper ya no tiene items activos, así que no hay
+        # filas esperando; solo falta vaciar la cola y escribir el último lote.
+        if self.spill_call is not None and self.spill_call.active():
+            self.spill_call.cancel()
+        self.spill_call = None
+        return threads.deferToThread(self._stop)
+
+    def _release_waiting(self):
+        while self.waiting:
+            row, d, _ = self.waiting[0]
+            try:
+                self.queue.put_nowait(row)
+            except queue.Full:
+                return
+            self.waiting.popleft()
+            d.callback(None)
+
+    def _schedule_spill(self):
+        if self.spool is None or self.spill_call is not None or not self.waiting:
+            return
+        from twisted.internet import reactor
+        delay = self.waiting[0][2] + self.spool_timeout - time.monotonic()
+        self.spill_call = reactor.callLater(max(0.0, delay), self._spill_stale)
+
+    def _spill_stale(self):
+        # La base va lenta: las filas que llevan demasiado esperando se van al spool
+        self.spill_call = None
+        limit = time.monotonic() - self.spool_timeout
+        stale = []
+        while self.waiting and self.waiting[0][2] <= limit:
+            stale.append(self.waiting.popleft())
+        self._schedule_spill()
+        if not stale:
+            return
+
+        def release(result):
+            for row, d, since in stale:
+                d.callback(None)
+
+        rows = [row for row, d, since in stale]
+        threads.deferToThread(self._to_spool, rows).addCallback(release)
+
+    def _call_in_reactor(self, func, *args):
+        from twisted.internet import reactor
+        reactor.callFromThread(func, *args)
+
+    # ---- Lado del hilo escritor ---------------------------------------------
+
+    def _stop(self):
+        self.queue.put(_STOP)
+        self.thread.join()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        stopping = False
+        while not stopping:
+            timeout = None
+            if deadline is not None:
+                timeout = max(0.0, deadline - time.monotonic())
+            try:
+                row = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                row = None
+
+            if row is _STOP:
+                stopping = True
+            elif row is not None:
+                batch.append(row)
+                if deadline is None and self.flush_interval > 0:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if self.waiting:
+                self._call_in_reactor(self._release_waiting)
+
+            expired = deadline is not None and time.monotonic() >= deadline
+            if batch and (stopping or expired or len(batch) >= self.batch_size):
+                self._write(batch)
+                batch = []
+                deadline = None
+
+        if self.spool is not None:
+            self.spool.close()
+
+    def _write(self, rows):
+        started = time.monotonic()
+        if self.spool is not None and started < self.retry_at:
+            # La base falló hace poco; no esperamos otro timeout de conexión
+            self._to_spool(rows)
+            return
+        try:
+            # Si la conexión falla, el pool la descarta y el siguiente lote abre otra
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                # Con fast_executemany el driver manda todo el lote en un solo viaje
+                cursor.fast_executemany = True
+                try:
+                    if not self.prepared:
+                        self.prepare(cursor)
+                        self.prepared = True
+                    self.write(cursor, rows)
+                    connection.commit()
+                finally:
+                    cursor.close()
+        except Exception as e:
+            logger.error(f"Error al guardar un lote de {len(rows)} filas en la base de datos: {e}")
+            if self.spool is None:
+                self._failed(rows)
+            else:
+                # En el spool no se pierden: solo cuentan como fallidas si tampoco entran ahí
+                self.retry_at = time.monotonic() + self.retry_interval
+                self._to_spool(rows)
+            return
+
+        if self.on_batch:
+            self._call_in_reactor(self.on_batch, rows, time.monotonic() - started)
+
+    def _to_spool(self, rows):
+        try:
+            self.spool.write(rows)
+        except Exception as e:
+            logger.error(f"No se pudieron guardar {len(rows)} filas en el spool {self.spool.path}: {e}")
+            self._failed(rows)
+            return
+        if self.on_spool:
+            self._call_in_reactor(self.on_spool, len(rows))
+
+    def _failed(self, rows):
+        if self.on_error:
+            self._call_in_reactor(self.on_error, len(rows))
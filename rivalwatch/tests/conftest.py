@@ -0,0 +1,5 @@
+# conftest.py — el mismo reactor que usa el proyecto (settings.TWISTED_REACTOR), instalado
+# antes de que algún módulo importe el de default
+from scrapy.utils.reactor import install_reactor
+
+install_reactor("twisted.internet.asyncioreactor.AsyncioSelectorReactor")
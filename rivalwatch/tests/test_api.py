@@ -0,0 +1,48 @@
+# test_api.py — agrupación de buckets del historial de precios
+import datetime as dt
+from decimal import Decimal
+
+from api import reducir_serie
+
+
+def bucket(dia, minimo, maximo, suma, observaciones, ultimo):
+    return (dt.date(2026, 1, dia), Decimal(minimo), Decimal(maximo), Decimal(suma), observaciones, Decimal(ultimo))
+
+
+BUCKETS = [
+    bucket(1, "10", "12", "22", 2, "12"),
+    bucket(2, "9", "11", "30", 3, "9"),
+    bucket(3, "11", "11", "11", 1, "11"),
+    bucket(4, "8", "10", "18", 2, "8"),
+    bucket(5, "7", "13", "40", 4, "13"),
+]
+
+
+def test_fewer_buckets_than_points_are_kept():
+    serie = reducir_serie(BUCKETS, 10)
+    assert [p["Fecha"] for p in serie] == [f"2026-01-0{n}" for n in range(1, 6)]
+    assert serie[0] == {"Fecha": "2026-01-01", "Min": 10.0, "Max": 12.0, "Promedio": 11.0, "Ultimo": 12.0,
+                        "Observaciones": 2}
+
+
+def test_groups_keep_real_min_max_and_weighted_average():
+    serie = reducir_serie(BUCKETS, 2)
+    # 5 buckets en a lo más 2 puntos: grupos de 3 y 2
+    assert len(serie) == 2
+    primero, segundo = serie
+    assert primero == {"Fecha": "2026-01-01", "Min": 9.0, "Max": 12.0, "Promedio": round(63 / 6, 2),
+                       "Ultimo": 11.0, "Observaciones": 6}
+    assert segundo == {"Fecha": "2026-01-04", "Min": 7.0, "Max": 13.0, "Promedio": round(58 / 6, 2),
+                       "Ultimo": 13.0, "Observaciones": 6}
+
+
+def test_never_more_points_than_asked():
+    for puntos in range(1, 7):
+        assert len(reducir_serie(BUCKETS, puntos)) <= puntos
+    assert len(reducir_serie(BUCKETS, 1)) == 1
+
+
+def test_empty_and_without_observations():
+    assert reducir_serie([], 10) == []
+    serie = reducir_serie([bucket(1, "10", "10", "0", 0, "10")], 10)
+    assert serie[0]["Promedio"] is None
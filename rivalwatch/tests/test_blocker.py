@@ -0,0 +1,28 @@
+# test_blocker.py — coincidencia de hosts bloqueados
+from rivalwatch.blocker import host_matches
+
+HOSTS = frozenset(("doubleclick.net", "www.google-analytics.com", "hotjar.com"))
+
+
+def test_exact_host():
+    assert host_matches("doubleclick.net", HOSTS)
+    assert host_matches("www.google-analytics.com", HOSTS)
+
+
+def test_subdomains():
+    assert host_matches("stats.g.doubleclick.net", HOSTS)
+    assert host_matches("static.hotjar.com", HOSTS)
+
+
+def test_parent_of_listed_host_is_not_blocked():
+    assert not host_matches("google-analytics.com", HOSTS)
+
+
+def test_suffix_must_be_whole_labels():
+    assert not host_matches("notdoubleclick.net", HOSTS)
+    assert not host_matches("hotjar.com.mx", HOSTS)
+
+
+def test_empty():
+    assert not host_matches("", HOSTS)
+    assert not host_matches("super.walmart.com.mx", frozenset())
@@ -0,0 +1,201 @@
+# test_extraction.py — rivalwatch.extraction contra la extracción anterior de WalmartMxSpider
+import json
+import re
+from urllib.parse import urljoin
+
+from parsel import Selector
+
+from rivalwatch.extraction import find_price, iter_product_links, looks_like_bot_wall, stock_hint
+
+BASE_URL = "https://super.walmart.com.mx/search?q=harina"
+
+
+# ---- Copia congelada de la implementación anterior (no tocar) ----------------
+# rivalwatch.benchmarks.extraction tiene su propia copia para medir; esta es la
+# referencia de comportamiento y no debe cambiar junto con el código nuevo.
+
+def legacy_find_price(html):
+    snippets = []
+    for kw in ("price", "Precio", "precio", "sales", "offer", "Oferta", "oferta"):
+        for m in re.finditer(r".{0,80}" + re.escape(kw) + r".{0,80}", html, flags=re.I | re.S):
+            snippets.append(m.group(0))
+    if not snippets:
+        snippets = [html[:50000]]
+
+    price_re = re.compile(
+        r"\$?\s*([0-9]{1,3}(?:[.,][0-9]{3})*(?:[.,][0-9]{2})|[0-9]+(?:[.,][0-9]{2})?)",
+        flags=re.M,
+    )
+    for chunk in snippets:
+        for m in price_re.finditer(chunk):
+            raw = m.group(1)
+            if raw.count(",") > 1 and "." not in raw:
+                raw = raw.replace(".", "").replace(",", ".")
+            return raw
+    return None
+
+
+def legacy_product_links(html, base_url):
+    sel = Selector(text=html)
+    product_urls = set()
+    for href in sel.css('a[href$="/p"]::attr(href)').getall():
+        product_urls.add(urljoin(base_url, href))
+    next_data = sel.css('script#__NEXT_DATA__::text').get()
+    if next_data:
+        try:
+            data = json.loads(next_data)
+
+            def walk(obj):
+                if isinstance(obj, dict):
+                    for k, v in obj.items():
+                        if k in ("link", "url") and isinstance(v, str) and v.endswith("/p"):
+                            product_urls.add(urljoin(base_url, v))
+                        else:
+                            walk(v)
+                elif isinstance(obj, list):
+                    for it in obj:
+                        walk(it)
+
+            walk(data)
+        except Exception:
+            pass
+    if not product_urls:
+        for m in re.finditer(r'"/([^"]+?/p)"', html):
+            product_urls.add(urljoin(base_url, m.group(1)))
+    return product_urls
+
+
+def legacy_stock(html):
+    txt = html.lower()
+    if "agotado" in txt or "sin existencias" in txt:
+        return False
+    if "agregar al carrito" in txt or "añadir al carrito" in txt:
+        return True
+    return None
+
+
+def next_data(obj, raw=None):
+    return f'<script id="__NEXT_DATA__" type="application/json">{raw or json.dumps(obj)}</script>'
+
+
+# ---- find_price ---------------------------------------------------------------
+
+PRICE_PAGES = [
+    '<div class="price-box"><span>$1,234.50</span></div>',
+    '<p>PRECIO ESPECIAL</p><b>$ 89.90</b>',
+    '<span>Precio: 1.234,50</span>',
+    '<meta itemprop="price" content="129.00">',
+    '{"priceInfo":{"currentPrice":{"price":45.5}}}',
+    # Palabra clave sin número cerca y el número lejos: ninguno lo toma
+    '<span>oferta</span>' + "x" * 200 + '<span>$10.00</span>',
+    # Sin palabra clave: se busca en el inicio de la página
+    '<div><b>Total</b> 99.90</div>',
+    '<div>sin números</div>',
+    "",
+]
+
+
+def test_find_price_matches_legacy():
+    for page in PRICE_PAGES:
+        assert find_price(page) == legacy_find_price(page), page
+
+
+def test_find_price_values():
+    assert find_price('<span class="price">$1,234.50</span>') == "1,234.50"
+    assert find_price("<b>Precio</b> 1.234.567,50") == "1.234.567,50"
+    # Varias comas sin punto se normalizan igual que antes, aunque quede raro
+    assert find_price("precio 1,234,50") == legacy_find_price("precio 1,234,50") == "1.234.50"
+    assert find_price("<div>sin precio</div>") is None
+
+
+def test_find_price_fallback_is_limited():
+    page = "x" * 60_000 + " 12.50"
+    assert find_price(page) is None
+    assert find_price(page) == legacy_find_price(page)
+
+
+# ---- iter_product_links ---------------------------------------------------------
+
+LINK_PAGES = {
+    "href con comillas dobles": '<a href="/harina-selecta-1-kg/00750100000001/p">Harina</a>',
+    "href con comillas simples": "<a class='card' href='/harina-selecta-1-kg/00750100000001/p'>Harina</a>",
+    "href con entidades": '<a href="/aceite-1-2-1&amp;2-lt/00750100000002/p">Aceite</a>',
+    "href absoluto": '<a href="https://super.walmart.com.mx/arroz/00750100000003/p">Arroz</a>',
+    "next data": next_data({"props": {"items": [
+        {"link": "/frijol-1-kg/00750100000004/p"},
+        {"url": "/lenteja-500-g/00750100000005/p", "name": "Lenteja"},
+        {"canonical": "/otra-cosa/p"},
+    ]}}),
+    "next data con espacios": next_data(None, raw=(
+        '{"props": {"items": [{"link" : "/avena-1-kg/00750100000006/p"},'
+        ' {"url"  :  "/azucar-2-kg/00750100000007/p"}]}}'
+    )),
+    "next data escapado": next_data(None, raw='{"items":[{"url":"\\/cafe-200-g\\/00750100000008\\/p"}]}'),
+    "anchors y next data": (
+        '<a href="/harina-selecta-1-kg/00750100000001/p">Harina</a>'
+        + next_data({"items": [{"link": "/harina-selecta-1-kg/00750100000001/p"},
+                               {"link": "/sal-1-kg/00750100000009/p"}]})
+    ),
+    "ruta suelta": '<script>window.__STATE__ = {"x": ["/galletas-marias/00750100000010/p"]};</script>',
+    "ruta suelta ignorada": (
+        '<a href="/leche-1-l/00750100000011/p">Leche</a>'
+        '<script>var s = ["/galletas-marias/00750100000010/p"];</script>'
+    ),
+    "sin productos": '<a href="/categoria/despensa">Despensa</a><a href="/pagina/2">2</a>',
+}
+
+
+def test_iter_product_links_matches_legacy():
+    for name, page in LINK_PAGES.items():
+        assert set(iter_product_links(page, BASE_URL)) == legacy_product_links(page, BASE_URL), name
+
+
+def test_iter_product_links_cases():
+    links = list(iter_product_links(LINK_PAGES["href con entidades"], BASE_URL))
+    assert links == ["https://super.walmart.com.mx/aceite-1-2-1&2-lt/00750100000002/p"]
+    links = list(iter_product_links(LINK_PAGES["next data escapado"], BASE_URL))
+    assert links == ["https://super.walmart.com.mx/cafe-200-g/00750100000008/p"]
+    links = list(iter_product_links(LINK_PAGES["ruta suelta ignorada"], BASE_URL))
+    assert links == ["https://super.walmart.com.mx/leche-1-l/00750100000011/p"]
+    assert list(iter_product_links(LINK_PAGES["sin productos"], BASE_URL)) == []
+
+
+def test_iter_product_links_no_duplicates_in_order():
+    links = list(iter_product_links(LINK_PAGES["anchors y next data"], BASE_URL))
+    assert links == [
+        "https://super.walmart.com.mx/harina-selecta-1-kg/00750100000001/p",
+        "https://super.walmart.com.mx/sal-1-kg/00750100000009/p",
+    ]
+
+
+def test_iter_product_links_is_lazy():
+    page = "".join(f'<a href="/producto-{n}/p">{n}</a>' for n in range(1000))
+    links = iter_product_links(page, BASE_URL)
+    assert next(links) == "https://super.walmart.com.mx/producto-0/p"
+    assert next(links) == "https://super.walmart.com.mx/producto-1/p"
+
+
+# ---- stock_hint / looks_like_bot_wall -------------------------------------------
+
+STOCK_PAGES = [
+    '<button>Agregar al carrito</button>',
+    '<button>Añadir al carrito</button>',
+    '<span>AGOTADO</span><button>Agregar al carrito</button>',
+    '<span>Sin existencias</span>',
+    '<div>Harina</div>',
+]
+
+
+def test_stock_hint_matches_legacy():
+    for page in STOCK_PAGES:
+        assert stock_hint(page) == legacy_stock(page), page
+
+
+def test_out_of_stock_wins():
+    assert stock_hint('<span>Agotado</span><button>Agregar al carrito</button>') is False
+
+
+def test_looks_like_bot_wall():
+    assert looks_like_bot_wall("<title>Verify you are human</title>")
+    assert looks_like_bot_wall("<div id='CAPTCHA'></div>")
+    assert not looks_like_bot_wall('<a href="/harina/p">Harina</a>')
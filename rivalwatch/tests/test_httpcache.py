@@ -0,0 +1,173 @@
+# test_httpcache.py — caché HTTP: llaves de Playwright, TTL, revalidación con 304 y rechazo de entradas
+import time
+
+import pytest
+from scrapy import Spider
+from scrapy.http import HtmlResponse, Request, Response
+from scrapy.utils.test import get_crawler
+from scrapy_playwright.page import PageMethod
+
+from rivalwatch.httpcache import CacheMiddleware, observed_at, page_signature
+
+URL = "https://super.walmart.com.mx/harina/00750100000001/p"
+
+
+class CacheSpider(Spider):
+    name = "cache_prueba"
+
+    def httpcache_reject(self, response):
+        return b"captcha" in response.body
+
+
+@pytest.fixture
+def cache(tmp_path):
+    crawler = get_crawler(CacheSpider, {
+        "HTTPCACHE_ENABLED": True,
+        "HTTPCACHE_DIR": str(tmp_path),
+        "HTTPCACHE_STORAGE": "rivalwatch.httpcache.SqliteCacheStorage",
+        "HTTPCACHE_POLICY": "rivalwatch.httpcache.CachePolicy",
+        "HTTPCACHE_TTL": 3600,
+    })
+    spider = crawler._create_spider()
+    middleware = CacheMiddleware.from_crawler(crawler)
+    middleware.spider_opened(spider)
+    yield middleware, spider
+    middleware.spider_closed(spider)
+
+
+def page(request, body=b"<html>Harina $25.50</html>", status=200, **headers):
+    return HtmlResponse(request.url, status=status, body=body, headers=headers, request=request)
+
+
+def store(middleware, spider, request, response):
+    middleware.storage.store_response(spider, request, response)
+
+
+def age(middleware, request, seconds):
+    # La entrada se guardó hace ``seconds`` segundos
+    middleware.storage.db.execute("UPDATE respuestas SET guardado = ? WHERE clave = ?",
+                                  (time.time() - seconds, middleware.storage._key(request)))
+
+
+def saved_at(middleware, request):
+    row = middleware.storage.db.execute("SELECT guardado FROM respuestas WHERE clave = ?",
+                                        (middleware.storage._key(request),)).fetchone()
+    return row[0] if row else None
+
+
+def test_page_signature_depends_on_page_methods():
+    plain = Request(URL)
+    scroll = Request(URL, meta={"playwright": True, "playwright_page_methods": [
+        PageMethod("wait_for_selector", "div.grid"), PageMethod("evaluate", "window.scrollBy(0, 4000)")]})
+    wait = Request(URL, meta={"playwright": True, "playwright_page_methods": [
+        PageMethod("wait_for_selector", "div.grid")]})
+    same_wait = Request(URL, meta={"playwright": True, "playwright_page_methods": [
+        PageMethod("wait_for_selector", "div.grid")]})
+    assert page_signature(plain) == ""
+    assert page_signature(scroll) != page_signature(wait)
+    assert page_signature(wait) == page_signature(same_wait) != ""
+
+
+def test_page_methods_give_different_cache_keys(cache):
+    middleware, spider = cache
+    first = Request(URL, meta={"playwright": True, "playwright_page_methods": [PageMethod("wait_for_timeout", 500)]})
+    second = Request(URL, meta={"playwright": True, "playwright_page_methods": [PageMethod("wait_for_timeout", 900)]})
+    assert middleware.storage._key(first) != middleware.storage._key(second)
+    store(middleware, spider, first, page(first))
+    assert middleware.process_request(first, spider) is not None
+    assert middleware.process_request(second, spider) is None
+
+
+def test_fresh_entry_is_served_from_cache(cache):
+    middleware, spider = cache
+    request = Request(URL)
+    assert middleware.process_request(request, spider) is None
+    middleware.process_response(request, page(request, ETag='"v1"'), spider)
+
+    cached = middleware.process_request(Request(URL), spider)
+    assert cached is not None
+    assert "cached" in cached.flags
+    assert b"$25.50" in cached.body
+    # La hora de la observación es la del guardado, no la de ahora
+    assert abs(observed_at(cached).timestamp() - saved_at(middleware, request)) < 2
+
+
+def test_stale_entry_is_revalidated_and_touched_on_304(cache):
+    middleware, spider = cache
+    request = Request(URL)
+    store(middleware, spider, request, page(request, ETag='"v1"'))
+    age(middleware, request, 7200)
+
+    stale = Request(URL)
+    assert middleware.process_request(stale, spider) is None
+    assert stale.headers.get("If-None-Match") == b'"v1"'
+    assert "cached_response" in stale.meta
+
+    result = middleware.process_response(stale, Response(URL, status=304, request=stale), spider)
+    assert result.status == 200
+    assert b"$25.50" in result.body
+    # Vuelve a contar su TTL desde ahora y se observó ahora
+    assert time.time() - saved_at(middleware, request) < 5
+    assert time.time() - observed_at(result).timestamp() < 5
+    assert middleware.process_request(Request(URL), spider) is not None
+
+
+def test_playwright_requests_never_get_validators(cache):
+    middleware, spider = cache
+    request = Request(URL, meta={"playwright": True})
+    store(middleware, spider, request, page(request, **{"ETag": '"v1"', "Last-Modified": "Mon, 05 Jan 2026 10:00:00 GMT"}))
+    age(middleware, request, 7200)
+
+    stale = Request(URL, meta={"playwright": True})
+    assert middleware.process_request(stale, spider) is None
+    assert b"If-None-Match" not in stale.headers
+    assert b"If-Modified-Since" not in stale.headers
+
+
+def test_meta_ttl_zero_skips_fresh_entry(cache):
+    middleware, spider = cache
+    request = Request(URL)
+    store(middleware, spider, request, page(request))
+    assert middleware.process_request(Request(URL, meta={"httpcache_ttl": 0}), spider) is None
+
+
+def test_rejected_cached_entry_is_deleted_and_refetched(cache):
+    middleware, spider = cache
+    request = Request(URL)
+    store(middleware, spider, request, page(request, body=b"<html>captcha</html>"))
+
+    again = Request(URL)
+    assert middleware.process_request(again, spider) is None
+    assert saved_at(middleware, request) is None
+    assert "cached_response" not in again.meta
+    assert middleware.stats.get_value("httpcache/rejected") == 1
+
+
+def test_rejected_stale_entry_is_not_revalidated(cache):
+    middleware, spider = cache
+    request = Request(URL)
+    store(middleware, spider, request, page(request, body=b"<html>captcha</html>", ETag='"v1"'))
+    age(middleware, request, 7200)
+
+    again = Request(URL)
+    assert middleware.process_request(again, spider) is None
+    assert b"If-None-Match" not in again.headers
+    assert "cached_response" not in again.meta
+    assert saved_at(middleware, request) is None
+
+
+def test_rejected_network_response_is_not_stored(cache):
+    middleware, spider = cache
+    request = Request(URL)
+    middleware.process_request(request, spider)
+    wall = page(request, body=b"<html>captcha</html>")
+    assert middleware.process_response(request, wall, spider) is wall
+    assert saved_at(middleware, request) is None
+
+
+def test_httpcache_store_false_is_not_stored(cache):
+    middleware, spider = cache
+    request = Request(URL, meta={"httpcache_store": False})
+    middleware.process_request(request, spider)
+    middleware.process_response(request, page(request), spider)
+    assert saved_at(middleware, request) is None
@@ -0,0 +1,219 @@
+# test_jobs.py — JobQueue con un backend de prueba: fusión de pedidos, límite por tienda y cancelación
+import threading
+import time
+
+import pytest
+
+from rivalwatch import jobs
+from rivalwatch.jobs import CANCELADO, CORRIENDO, FALLIDO, PENDIENTE, TERMINADO, DockerBackend, Job, JobQueue
+
+
+class StubBackend:
+    """Cada job "corre" hasta que la prueba lo suelta o lo cancela."""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.started = []
+        self.cancelled = []
+        self.release = {}
+        self.lock = threading.Lock()
+
+    def run(self, job, on_event):
+        with self.lock:
+            done = self.release.setdefault(job.id, threading.Event())
+            self.started.append(job)
+        if job.spider in self.fail:
+            raise RuntimeError("no arrancó el contenedor")
+        on_event({"tipo": "progreso", "items": 3})
+        done.wait(5)
+        return 0
+
+    def cancel(self, job):
+        self.cancelled.append(job)
+        self.finish(job)
+
+    def finish(self, job):
+        with self.lock:
+            self.release.setdefault(job.id, threading.Event()).set()
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "no se llegó al estado esperado"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def make_queue():
+    queues = []
+
+    def make(backend, **kwargs):
+        queue = JobQueue(backend, **kwargs)
+        queues.append((queue, backend))
+        return queue
+
+    yield make
+    for queue, backend in queues:
+        for job in list(queue.jobs.values()):
+            backend.finish(job)
+        queue.close(timeout=5)
+
+
+def test_identical_pending_jobs_are_coalesced(make_queue):
+    backend = StubBackend()
+    queue = make_queue(backend, workers=1)
+    first, new = queue.submit("heb", {"busqueda": "harina"})
+    assert new
+    wait_until(lambda: first.estado == CORRIENDO)
+
+    # El que corre no se fusiona: sus resultados pueden ser de antes del pedido
+    second, new = queue.submit("heb", {"busqueda": "harina"})
+    assert new and second is not first
+    same, new = queue.submit("heb", {"busqueda": "harina"})
+    assert not new and same is second
+    assert second.pedidos == 2
+
+    other, new = queue.submit("heb", {"busqueda": "harina"}, settings={"HTTPCACHE_TTL": 0})
+    assert new and other is not second
+    assert queue.metrics()["pendientes"] == 2
+
+
+def test_settings_outside_job_settings_are_dropped():
+    job = Job("heb", {"busqueda": "harina"}, settings={"HTTPCACHE_TTL": 60, "DOWNLOAD_DELAY": 0})
+    assert job.settings == {"HTTPCACHE_TTL": 60}
+
+
+def test_per_store_limit(make_queue):
+    backend = StubBackend()
+    queue = make_queue(backend, workers=3, per_store=1)
+    heb_a, _ = queue.submit("heb", {"busqueda": "harina"})
+    heb_b, _ = queue.submit("heb", {"busqueda": "azucar"})
+    walmart, _ = queue.submit("walmart_mx", {"busqueda": "harina"})
+    graphql, _ = queue.submit("walmart_mx_graphql", {"busqueda": "azucar"})
+
+    wait_until(lambda: len(backend.started) == 2)
+    time.sleep(0.05)
+    # Un worker queda libre, pero las dos tiendas ya tienen su crawl
+    assert {job.id for job in backend.started} == {heb_a.id, walmart.id}
+    assert heb_b.estado == PENDIENTE and graphql.estado == PENDIENTE
+    assert queue.metrics()["por_tienda"] == {"heb": 1, "walmart": 1}
+
+    backend.finish(heb_a)
+    wait_until(lambda: heb_b.estado == CORRIENDO)
+    assert heb_a.estado == TERMINADO and heb_a.items == 3
+    assert graphql.estado == PENDIENTE
+
+    backend.finish(walmart)
+    wait_until(lambda: graphql.estado == CORRIENDO)
+
+
+def test_cancel_pending_job_never_runs(make_queue):
+    backend = StubBackend()
+    queue = make_queue(backend, workers=1)
+    running, _ = queue.submit("heb", {"busqueda": "harina"})
+    pending, _ = queue.submit("heb", {"busqueda": "azucar"})
+    wait_until(lambda: running.estado == CORRIENDO)
+
+    assert queue.cancel(pending.id) is pending
+    assert pending.estado == CANCELADO
+    backend.finish(running)
+    wait_until(lambda: running.estado == TERMINADO)
+    assert pending not in backend.started
+    assert backend.cancelled == []
+
+
+def test_cancel_running_job(make_queue):
+    backend = StubBackend()
+    queue = make_queue(backend, workers=1)
+    job, _ = queue.submit("heb", {"busqueda": "harina"})
+    wait_until(lambda: job.estado == CORRIENDO)
+
+    queue.cancel(job.id)
+    wait_until(lambda: job.estado in jobs.FINALES)
+    assert job.estado == CANCELADO
+    assert backend.cancelled == [job]
+    assert queue.metrics()["corriendo"] == 0
+
+
+def test_backend_error_marks_job_failed(make_queue):
+    backend = StubBackend(fail={"heb"})
+    queue = make_queue(backend, workers=1)
+    job, _ = queue.submit("heb", {"busqueda": "harina"})
+    wait_until(lambda: job.estado in jobs.FINALES)
+    assert job.estado == FALLIDO
+    assert job.error == "no arrancó el contenedor"
+    # El lugar de la tienda se libera
+    assert queue.metrics()["por_tienda"] == {}
+
+
+def test_closed_queue_rejects_jobs(make_queue):
+    queue = make_queue(StubBackend(), workers=1)
+    queue.close(timeout=1)
+    with pytest.raises(RuntimeError):
+        queue.submit("heb", {"busqueda": "harina"})
+
+
+class FakeProcess:
+    def __init__(self, lines=()):
+        self.stdout = iter(lines)
+        self.terminated = False
+
+    def terminate(self):
+        self.terminated = True
+
+    def wait(self):
+        return -15 if self.terminated else 0
+
+
+class FakeResult:
+    def __init__(self, returncode, stderr=""):
+        self.returncode = returncode
+        self.stderr = stderr
+
+
+def test_docker_cancel_while_starting_stops_the_client(monkeypatch):
+    job = Job("heb", {"busqueda": "harina; rm -rf /"})
+    process = FakeProcess()
+    commands = []
+
+    def popen(command, **kwargs):
+        commands.append(command)
+        # El cancel() llega mientras Popen arranca, antes de que haya handle
+        job.cancelar = True
+        return process
+
+    def run(command, **kwargs):
+        commands.append(command)
+        # El contenedor todavía no existe
+        return FakeResult(1, "Error: No such container: rivalwatch-" + job.id)
+
+    monkeypatch.setattr(jobs.subprocess, "Popen", popen)
+    monkeypatch.setattr(jobs.subprocess, "run", run)
+
+    code = DockerBackend(image="rivalwatch-app").run(job, lambda event: None)
+    assert commands[0][-3:] == ["heb", "-a", "busqueda=harina; rm -rf /"]
+    assert commands[1] == ["docker", "stop", f"rivalwatch-{job.id}"]
+    assert process.terminated
+    assert code == -15
+
+
+def test_docker_cancel_before_start_does_not_run(monkeypatch):
+    job = Job("heb", {"busqueda": "harina"})
+    job.cancelar = True
+    monkeypatch.setattr(jobs.subprocess, "Popen", lambda *a, **k: pytest.fail("no debía arrancar"))
+    assert DockerBackend().run(job, lambda event: None) is None
+
+
+def test_docker_run_reads_progress_and_item_count(monkeypatch):
+    job = Job("heb", {"busqueda": "harina"})
+    lines = [
+        '@@progreso {"tipo": "progreso", "items": 4}\n',
+        "@@progreso no es json\n",
+        " 'item_scraped_count': 12,\n",
+    ]
+    monkeypatch.setattr(jobs.subprocess, "Popen", lambda *a, **k: FakeProcess(lines))
+    events = []
+    assert DockerBackend().run(job, events.append) == 0
+    assert events == [{"tipo": "progreso", "items": 4}]
+    assert job.items == 12
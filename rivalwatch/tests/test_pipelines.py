@@ -0,0 +1,79 @@
+# test_pipelines.py — filas del spool de cualquier versión -> formato actual
+import datetime as dt
+
+import pytest
+
+from rivalwatch.pipelines import SqlServerPipeline, content_hash
+
+decode = SqlServerPipeline.decode_spooled
+
+FECHA = "2026-01-02T03:04:05"
+FECHA_DT = dt.datetime(2026, 1, 2, 3, 4, 5)
+
+
+def test_version_1():
+    # titulo, precio, url_imagen, tienda, fecha: sin SKU ni URL, la clave es el título
+    row = decode(["Harina 1 kg", 25.5, "https://img/1.jpg", "heb", FECHA])
+    assert row[:9] == ("heb", "Harina 1 kg", None, None, "Harina 1 kg", 25.5, "https://img/1.jpg",
+                       content_hash("Harina 1 kg", 25.5, "https://img/1.jpg"), FECHA_DT)
+    assert all(value is None for value in row[9:])
+
+
+def test_version_2():
+    row = decode(["heb", "sku-1", "Harina 1 kg", 25.5, "https://img/1.jpg", "h" * 32, FECHA])
+    assert row[:9] == ("heb", "sku-1", None, None, "Harina 1 kg", 25.5, "https://img/1.jpg", "h" * 32, FECHA_DT)
+    assert all(value is None for value in row[9:])
+
+
+def test_version_3():
+    row = decode(["heb", "sku-1", "sku-1", "https://heb/p", "Harina", 25.5, "https://img", "h" * 32, FECHA])
+    assert row[:9] == ("heb", "sku-1", "sku-1", "https://heb/p", "Harina", 25.5, "https://img", "h" * 32, FECHA_DT)
+    assert all(value is None for value in row[9:])
+
+
+def test_version_4_plain_and_versioned():
+    values = ["heb", "sku-1", "sku-1", "https://heb/p", "Harina", 25.5, "https://img", "h" * 32, FECHA, "c" * 32]
+    plain = decode(list(values))
+    assert plain[:10] == (*values[:8], FECHA_DT, "c" * 32)
+    assert decode({"v": 4, "fila": list(values)}) == plain
+
+
+def test_version_5():
+    values = ["heb", "sku-1", "sku-1", "https://heb/p", "Harina", 25.5, "https://img", "h" * 32, FECHA,
+              "c" * 32, "Selecta"]
+    assert decode({"v": 5, "fila": list(values)}) == (*values[:8], FECHA_DT, "c" * 32, "Selecta")
+    # Las de versiones anteriores llegan sin marca
+    assert decode(values[:10])[10] is None
+
+
+def test_all_versions_give_current_width():
+    lines = [
+        ["Harina", 25.5, "https://img", "heb", FECHA],
+        ["heb", "sku-1", "Harina", 25.5, "https://img", "h" * 32, FECHA],
+        ["heb", "sku-1", "sku-1", "https://heb/p", "Harina", 25.5, "https://img", "h" * 32, FECHA],
+        ["heb", "sku-1", "sku-1", "https://heb/p", "Harina", 25.5, "https://img", "h" * 32, FECHA, None],
+    ]
+    lines.append({"v": SqlServerPipeline.SPOOL_VERSION, "fila": lines[-1] + ["Selecta"]})
+    assert {len(decode(line)) for line in lines} == {11}
+
+
+def test_decode_does_not_modify_its_input():
+    line = ["heb", "sku-1", "sku-1", "https://heb/p", "Harina", 25.5, "https://img", "h" * 32, FECHA]
+    decode(line)
+    assert len(line) == 9 and line[8] == FECHA
+
+
+@pytest.mark.parametrize("line", [
+    [],
+    ["heb", "sku-1"],
+    {"v": 99, "fila": []},
+    {"v": 4, "fila": ["heb"]},
+    {"v": 5, "fila": ["heb", "sku-1", "sku-1", "https://heb/p", "Harina", 25.5, "https://img", "h" * 32, FECHA, None]},
+    {"fila": ["heb"]},
+    "heb",
+    None,
+    ["heb", "sku-1", "sku-1", "https://heb/p", "Harina", 25.5, "https://img", "h" * 32, "no es fecha"],
+])
+def test_unknown_lines_raise_value_error(line):
+    with pytest.raises(ValueError):
+        decode(line)
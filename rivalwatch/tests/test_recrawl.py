@@ -0,0 +1,60 @@
+# test_recrawl.py — puntaje y armado del plan de re-crawl
+from rivalwatch.recrawl import build_plan, change_rate, is_promotion, score
+
+
+def product(clave, cambios=0, dias_visto=30, dias_sin_ver=1.0, precio=100.0, precio_max=100.0, **extra):
+    return {
+        "clave": clave, "sku": clave, "url": f"https://tienda.mx/{clave}/p", "titulo": clave,
+        "precio": precio, "dias_sin_ver": dias_sin_ver, "cambios": cambios,
+        "dias_visto": dias_visto, "precio_max": precio_max, **extra,
+    }
+
+
+def test_change_rate_uses_prior():
+    # Sin historia: un cambio cada 10 días
+    assert change_rate(0, 0) == 0.1
+    assert change_rate(40, 0) == 1.0
+
+
+def test_score_grows_with_time_unseen():
+    assert score(product("a", dias_sin_ver=0)) == 0.0
+    assert score(product("a", dias_sin_ver=1)) < score(product("a", dias_sin_ver=5)) < 1.0
+
+
+def test_score_volatile_beats_stable():
+    assert score(product("volatil", cambios=20)) > score(product("estable", cambios=0))
+
+
+def test_promotion_boost():
+    normal = product("a", precio=100.0, precio_max=100.0)
+    promo = product("a", precio=80.0, precio_max=100.0)
+    assert not is_promotion(normal)
+    assert is_promotion(promo)
+    assert score(promo, promo_boost=2.0) == 2.0 * score(normal)
+    # Una baja menor que promo_drop no es promoción
+    assert not is_promotion(product("a", precio=97.0, precio_max=100.0), promo_drop=0.05)
+
+
+def test_build_plan_orders_and_limits():
+    products = [
+        product("estable", cambios=0, dias_sin_ver=1),
+        product("volatil", cambios=25, dias_sin_ver=1),
+        product("olvidado", cambios=0, dias_sin_ver=60),
+    ]
+    plan = build_plan(products, budget=2)
+    assert [e["clave"] for e in plan] == ["olvidado", "volatil"]
+    assert all({"tasa", "promocion", "score"} <= set(e) for e in plan)
+    assert plan[0]["score"] >= plan[1]["score"]
+
+
+def test_build_plan_ties_prefer_longest_unseen():
+    products = [product("a", cambios=200, dias_sin_ver=3), product("b", cambios=200, dias_sin_ver=9)]
+    # Tasa 1.0: los dos tienen puntaje 1
+    assert [e["clave"] for e in build_plan(products, budget=10)] == ["b", "a"]
+
+
+def test_build_plan_skips_products_without_url_or_sku():
+    products = [product("a", url=None, sku=None), product("b", url=None), product("c", sku=None)]
+    assert sorted(e["clave"] for e in build_plan(products, budget=10)) == ["b", "c"]
+    assert build_plan(products, budget=0) == []
+    assert build_plan(products, budget=-1) == []
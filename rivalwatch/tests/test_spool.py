@@ -0,0 +1,122 @@
+# test_spool.py — escritura del spool y replay reanudable
+import datetime as dt
+import json
+import os
+from decimal import Decimal
+
+import pytest
+
+from rivalwatch.spool import Spool, pending_files, replay_file
+
+
+class FakeConnection:
+    def __init__(self, loaded, fail_after=None):
+        self.loaded = loaded
+        self.fail_after = fail_after
+        self.pending = []
+        self.closed = False
+
+    def cursor(self):
+        return self
+
+    def close(self):
+        self.closed = True
+
+    def commit(self):
+        self.loaded.extend(self.pending)
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+
+def write(cursor, batch):
+    if cursor.fail_after is not None and len(cursor.loaded) + len(batch) > cursor.fail_after:
+        raise ConnectionError("se cayó la conexión")
+    cursor.pending.extend(batch)
+
+
+def decode(line):
+    if not isinstance(line, list):
+        raise ValueError("fila de spool no reconocida")
+    return tuple(line)
+
+
+def spool_file(directory, lines):
+    path = os.path.join(directory, "heb-20260101T000000-1.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(line + "\n")
+    return path
+
+
+def test_spool_writes_part_then_renames(tmp_path):
+    spool = Spool(str(tmp_path), "heb", version=5)
+    spool.write([("heb", "clave", Decimal("10.50"), dt.datetime(2026, 1, 1, 12, 0))])
+    assert os.path.exists(spool.path + ".part")
+    assert pending_files(str(tmp_path)) == []
+    spool.close()
+    assert pending_files(str(tmp_path)) == [spool.path]
+    with open(spool.path, encoding="utf-8") as f:
+        assert json.loads(f.readline()) == {"v": 5, "fila": ["heb", "clave", 10.5, "2026-01-01T12:00:00"]}
+
+
+def test_spool_without_rows_leaves_no_file(tmp_path):
+    spool = Spool(str(tmp_path), "heb")
+    spool.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_replay_loads_everything_and_cleans_up(tmp_path):
+    path = spool_file(str(tmp_path), [json.dumps(["heb", n]) for n in range(5)])
+    loaded = []
+    count = replay_file(path, lambda: FakeConnection(loaded), write, decode=decode, batch_size=2)
+    assert count == 5
+    assert loaded == [("heb", n) for n in range(5)]
+    assert os.listdir(tmp_path) == []
+
+
+def test_replay_sets_bad_lines_aside(tmp_path):
+    lines = [json.dumps(["heb", 0]), '{"v": 9, "fila": []}', '["heb", 1', json.dumps(["heb", 2])]
+    path = spool_file(str(tmp_path), lines)
+    loaded = []
+    count = replay_file(path, lambda: FakeConnection(loaded), write, decode=decode, batch_size=10)
+    assert count == 2
+    assert loaded == [("heb", 0), ("heb", 2)]
+    rejected = path + ".rejected"
+    assert os.listdir(tmp_path) == [os.path.basename(rejected)]
+    with open(rejected, encoding="utf-8") as f:
+        assert f.read().splitlines() == lines[1:3]
+    # Lo apartado no se vuelve a tomar
+    assert pending_files(str(tmp_path), include_partial=True) == []
+
+
+def test_replay_resumes_from_done(tmp_path):
+    path = spool_file(str(tmp_path), [json.dumps(["heb", n]) for n in range(5)])
+    loaded = []
+
+    # Se cae la base después del primer lote: queda .replaying con su .done
+    with pytest.raises(ConnectionError):
+        replay_file(path, lambda: FakeConnection(loaded, fail_after=2), write, decode=decode, batch_size=2)
+    replaying = path + ".replaying"
+    assert loaded == [("heb", 0), ("heb", 1)]
+    with open(replaying + ".done", encoding="utf-8") as f:
+        assert f.read() == "2"
+    assert pending_files(str(tmp_path)) == [replaying]
+
+    # La siguiente corrida sigue donde se quedó, sin repetir filas
+    count = replay_file(replaying, lambda: FakeConnection(loaded), write, decode=decode, batch_size=2)
+    assert count == 3
+    assert loaded == [("heb", n) for n in range(5)]
+    assert os.listdir(tmp_path) == []
+
+
+def test_replay_claims_partial_files(tmp_path):
+    path = spool_file(str(tmp_path), [json.dumps(["heb", 0])])
+    part = path + ".part"
+    os.replace(path, part)
+    assert pending_files(str(tmp_path)) == []
+    assert pending_files(str(tmp_path), include_partial=True) == [part]
+    loaded = []
+    assert replay_file(part, lambda: FakeConnection(loaded), write, decode=decode) == 1
+    assert os.listdir(tmp_path) == []
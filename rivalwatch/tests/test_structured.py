@@ -0,0 +1,67 @@
+# test_structured.py — parseo tolerante de bloques JSON-LD
+import pytest
+
+from rivalwatch.structured import parse_json_ld, to_number
+
+PRODUCT = {"@type": "Product", "name": "Harina", "offers": {"price": "25.50"}}
+
+
+def test_valid_json():
+    assert parse_json_ld('{"@type": "Product", "name": "Harina", "offers": {"price": "25.50"}}') == PRODUCT
+    assert parse_json_ld('[{"@type": "Product"}]') == [{"@type": "Product"}]
+
+
+def test_cdata_and_comments():
+    assert parse_json_ld('//<![CDATA[\n{"@type": "Product"}\n//]]>') == {"@type": "Product"}
+    assert parse_json_ld('<!-- {"@type": "Product"} -->') == {"@type": "Product"}
+
+
+def test_newline_inside_string():
+    assert parse_json_ld('{"name": "Harina\nde trigo"}') == {"name": "Harina\nde trigo"}
+
+
+def test_concatenated_objects():
+    assert parse_json_ld('{"@type": "Organization"}\n{"@type": "Product"}') == [
+        {"@type": "Organization"}, {"@type": "Product"},
+    ]
+
+
+def test_trailing_commas():
+    # Se reparan dentro de una lista, como los objetos pegados
+    assert parse_json_ld('{"@type": "Product", "offers": [{"price": 10},],}') == [
+        {"@type": "Product", "offers": [{"price": 10}]},
+    ]
+
+
+def test_unparseable():
+    assert parse_json_ld("") is None
+    assert parse_json_ld("   ") is None
+    assert parse_json_ld("{not json") is None
+
+
+@pytest.mark.parametrize("value, expected", [
+    (25, 25.0),
+    (25.5, 25.5),
+    ("25.50", 25.5),
+    ("1234.5", 1234.5),
+    ("$1,234.50", 1234.5),
+    ("1,234", 1234.0),
+    ("1,234,567", 1234567.0),
+    ("1,234,567.89", 1234567.89),
+    # Coma decimal
+    ("25,50", 25.5),
+    ("25,5", 25.5),
+    ("$ 25,50 MXN", 25.5),
+    ("1.234,50", 1234.5),
+    ("1.234.567,89", 1234567.89),
+    ("1.234.567", 1234567.0),
+    ("MXN\xa01.234,50", 1234.5),
+    ("Precio: 99", 99.0),
+])
+def test_to_number(value, expected):
+    assert to_number(value) == expected
+
+
+@pytest.mark.parametrize("value", [None, True, "", "gratis", "$"])
+def test_to_number_without_number(value):
+    assert to_number(value) is None
@@ -0,0 +1,222 @@
+# test_writer.py — SqlServerWriter con un pool falso: backpressure, spool y conteo de filas
+import time
+from contextlib import contextmanager
+
+import pytest
+from twisted.internet import defer
+
+from rivalwatch import writer as writer_module
+from rivalwatch.writer import SqlServerWriter
+
+
+class FakeCursor:
+    fast_executemany = False
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+class FakePool:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.checkouts = 0
+        self.connection_ = FakeConnection()
+
+    @contextmanager
+    def connection(self):
+        self.checkouts += 1
+        if self.fail:
+            raise ConnectionError("SQL Server no responde")
+        yield self.connection_
+
+
+class FakeSpool:
+    path = "spool/prueba.jsonl"
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.rows = []
+        self.closed = False
+
+    def write(self, rows):
+        if self.fail:
+            raise OSError("disco lleno")
+        self.rows.extend(rows)
+
+    def close(self):
+        self.closed = True
+
+
+class Calls:
+    """Callbacks del writer; las llamadas "al reactor" se hacen en el acto."""
+
+    def __init__(self):
+        self.written, self.errors, self.spooled = [], [], []
+
+    def attach(self, writer):
+        writer._call_in_reactor = lambda func, *args: func(*args)
+        writer.on_batch = lambda rows, seconds: self.written.append(list(rows))
+        writer.on_error = self.errors.append
+        writer.on_spool = self.spooled.append
+        return writer
+
+
+def rows(n, start=0):
+    return [("heb", f"clave-{i}", i) for i in range(start, start + n)]
+
+
+def write_rows(cursor, batch):
+    cursor.connection.batches = getattr(cursor.connection, "batches", []) + [list(batch)]
+
+
+@pytest.fixture
+def sync_threads(monkeypatch):
+    # deferToThread sin hilos: lo que se manda al spool ocurre antes de seguir
+    monkeypatch.setattr(writer_module.threads, "deferToThread",
+                        lambda func, *args: defer.maybeDeferred(func, *args))
+
+
+def make_writer(calls, pool=None, spool=None, **kwargs):
+    return calls.attach(SqlServerWriter(pool or FakePool(), write_rows, spool=spool, **kwargs))
+
+
+def test_put_backpressure_when_queue_is_full():
+    writer = make_writer(Calls(), max_pending=2)
+    first = [writer.put(row) for row in rows(2)]
+    assert all(d.called for d in first)
+
+    blocked = writer.put(rows(1, start=2)[0])
+    assert not blocked.called
+    assert len(writer.waiting) == 1
+
+    # El hilo escritor saca una fila: la que esperaba entra a la cola
+    writer.queue.get_nowait()
+    writer._release_waiting()
+    assert blocked.called
+    assert not writer.waiting
+    assert writer.queue.qsize() == 2
+
+
+def test_put_keeps_order_while_rows_wait():
+    writer = make_writer(Calls(), max_pending=1)
+    writer.put(rows(1)[0])
+    waiting = [writer.put(row) for row in rows(2, start=1)]
+    writer.queue.get_nowait()
+    writer._release_waiting()
+    # Solo cabe una: la primera que esperaba, no la última
+    assert writer.queue.get_nowait() == rows(1, start=1)[0]
+    assert waiting[0].called and not waiting[1].called
+
+
+def test_spill_stale_moves_waiting_rows_to_spool(sync_threads):
+    calls, spool = Calls(), FakeSpool()
+    writer = make_writer(calls, spool=spool, max_pending=1, spool_timeout=0)
+    writer.put(rows(1)[0])
+    waiting = [writer.put(row) for row in rows(2, start=1)]
+    try:
+        writer._spill_stale()
+        assert spool.rows == rows(2, start=1)
+        assert all(d.called for d in waiting)
+        assert not writer.waiting
+        assert calls.spooled == [2]
+        assert calls.errors == []
+    finally:
+        if writer.spill_call is not None and writer.spill_call.active():
+            writer.spill_call.cancel()
+
+
+def test_spill_stale_keeps_rows_that_have_not_waited_enough(sync_threads):
+    spool = FakeSpool()
+    writer = make_writer(Calls(), spool=spool, max_pending=1, spool_timeout=60)
+    writer.put(rows(1)[0])
+    d = writer.put(rows(1, start=1)[0])
+    try:
+        writer._spill_stale()
+        assert spool.rows == []
+        assert not d.called
+        assert writer.spill_call is not None
+    finally:
+        if writer.spill_call is not None and writer.spill_call.active():
+            writer.spill_call.cancel()
+
+
+def test_write_success_reports_the_rows():
+    calls, pool = Calls(), FakePool()
+    writer = make_writer(calls, pool=pool)
+    writer._write(rows(3))
+    assert pool.connection_.commits == 1
+    assert pool.connection_.batches == [rows(3)]
+    assert calls.written == [rows(3)]
+    assert calls.errors == [] and calls.spooled == []
+
+
+def test_failed_write_goes_to_spool_and_is_not_counted_as_failed():
+    calls, pool, spool = Calls(), FakePool(fail=True), FakeSpool()
+    writer = make_writer(calls, pool=pool, spool=spool, retry_interval=30)
+    writer._write(rows(2))
+    assert spool.rows == rows(2)
+    assert calls.spooled == [2]
+    assert calls.errors == []
+    assert calls.written == []
+
+    # Mientras no pase retry_interval ni se intenta la base
+    writer._write(rows(1, start=2))
+    assert pool.checkouts == 1
+    assert spool.rows == rows(3)
+    assert calls.spooled == [2, 1]
+
+
+def test_failed_write_without_spool_is_counted_as_failed():
+    calls = Calls()
+    writer = make_writer(calls, pool=FakePool(fail=True))
+    writer._write(rows(2))
+    assert calls.errors == [2]
+    assert calls.spooled == []
+
+
+def test_failed_write_and_failed_spool_is_counted_once():
+    calls = Calls()
+    writer = make_writer(calls, pool=FakePool(fail=True), spool=FakeSpool(fail=True))
+    writer._write(rows(2))
+    assert calls.errors == [2]
+    assert calls.spooled == []
+
+
+def test_thread_writes_batches_and_closes_spool():
+    calls, pool, spool = Calls(), FakePool(), FakeSpool()
+    writer = make_writer(calls, pool=pool, spool=spool, batch_size=2, flush_interval=0)
+    writer.start()
+    for row in rows(5):
+        writer.queue.put(row)
+    writer._stop()
+    assert pool.connection_.batches == [rows(2), rows(2, start=2), rows(1, start=4)]
+    assert sum(len(batch) for batch in calls.written) == 5
+    assert spool.closed
+
+
+def test_flush_interval_writes_partial_batch():
+    calls, pool = Calls(), FakePool()
+    writer = make_writer(calls, pool=pool, batch_size=100, flush_interval=0.05)
+    writer.start()
+    try:
+        writer.queue.put(rows(1)[0])
+        deadline = time.monotonic() + 5
+        while not calls.written and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert calls.written == [rows(1)]
+    finally:
+        writer._stop()